@@ -0,0 +1,208 @@
+# app/admission.py
+# Admission control in front of the upstream provider.
+#
+# A request about to call the provider first takes a slot in its persona's lane
+# (DUNSEL_ADMIT_LIMIT[_<PERSONA>] concurrent calls). When the lane is full it waits in
+# a priority queue: interactive chat ahead of bulk news opining, FIFO within a class.
+# Each request has a deadline for that wait (its deadline_ms, else the class default).
+# If the lane's expected wait (queue position / lane limit * the recent average time a
+# slot is held) is already past the deadline, or the queue is full, the request is
+# refused at once with Overloaded (-> 503 + Retry-After) rather than queueing into an
+# upstream timeout; a request still queued when its deadline passes is refused then.
+#
+# Lanes are per process, like the in-flight cap in llm.py, which still bounds all lanes
+# together. DUNSEL_UPSTREAM_RPM (0 = off) is host-wide: every admitted upstream call
+# counts against a per-minute window in the shared store (shared_state.py), so N
+# workers together stay under the provider's rate limit; past it, requests are refused
+# with reason "rate_limit" and a Retry-After of the rest of the window. A micro-batch
+# (batcher.py) is one upstream call: it takes one slot and counts once.
+
+from __future__ import annotations
+import asyncio, heapq, itertools, math, os, time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import metrics
+import shared_state
+
+INTERACTIVE, BULK = 0, 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+ADMIT_ENABLED = os.getenv("DUNSEL_ADMIT", "1") not in ("0", "false", "off")
+ADMIT_LIMIT = int(os.getenv("DUNSEL_ADMIT_LIMIT", "16"))
+QUEUE_MAX = int(os.getenv("DUNSEL_ADMIT_QUEUE", "256"))
+DEADLINES = {
+    INTERACTIVE: float(os.getenv("DUNSEL_ADMIT_DEADLINE_INTERACTIVE", "10")),
+    BULK: float(os.getenv("DUNSEL_ADMIT_DEADLINE_BULK", "30")),
+}
+# Slot hold time assumed before any call has finished (seconds), and the EWMA weight.
+INITIAL_HOLD = float(os.getenv("DUNSEL_ADMIT_INITIAL_HOLD", "2.0"))
+HOLD_ALPHA = 0.2
+UPSTREAM_RPM = int(os.getenv("DUNSEL_UPSTREAM_RPM", "0"))
+RATE_WINDOW = 60.0
+
+
+def lane_limit(lane: str) -> int:
+    v = os.getenv(f"DUNSEL_ADMIT_LIMIT_{lane.upper()}")
+    return int(v) if v else ADMIT_LIMIT
+
+
+class Overloaded(Exception):
+    """Refused by admission control; the caller should answer 503 with Retry-After."""
+
+    def __init__(self, lane: str, reason: str, retry_after: float):
+        super().__init__(f"{lane}: {reason}")
+        self.lane, self.reason = lane, reason
+        self.retry_after = max(1, min(60, math.ceil(retry_after)))
+
+
+class Ticket:
+    """One admitted slot; release() is idempotent."""
+    __slots__ = ("lane", "start", "released")
+
+    def __init__(self, lane: Optional["Lane"]):
+        self.lane = lane
+        self.start = time.perf_counter()
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            if self.lane is not None:
+                self.lane._release(time.perf_counter() - self.start)
+
+    def cancel(self) -> None:
+        """Give the slot back without counting it toward the lane's hold time."""
+        if not self.released:
+            self.released = True
+            if self.lane is not None:
+                self.lane._release(None)
+
+
+class Lane:
+    def __init__(self, name: str, limit: int):
+        self.name, self.limit = name, max(1, limit)
+        self.active = 0
+        self.waiting = {INTERACTIVE: 0, BULK: 0}
+        self.hold = INITIAL_HOLD
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.counters = {"admitted": 0, "queued": 0, "rejected_queue_full": 0,
+                         "rejected_expected_wait": 0, "rejected_deadline": 0,
+                         "rejected_rate_limit": 0, "max_queue": 0}
+
+    def expected_wait(self, priority: int) -> float:
+        """Seconds a new request of this priority would wait (0 if a slot is free)."""
+        ahead = sum(n for p, n in self.waiting.items() if p <= priority)
+        if self.active < self.limit and not ahead:
+            return 0.0
+        return (ahead + 1) * self.hold / self.limit
+
+    def _reject(self, priority: int, reason: str, retry_after: float) -> Overloaded:
+        self.counters[f"rejected_{reason}"] += 1
+        metrics.ADMISSION_REJECTED.inc(self.name, PRIORITY_NAMES[priority], reason)
+        return Overloaded(self.name, reason, retry_after)
+
+    async def acquire(self, priority: int, deadline: float) -> Ticket:
+        est = self.expected_wait(priority)
+        if est == 0.0:
+            self.active += 1
+            self.counters["admitted"] += 1
+            metrics.ADMISSION_WAIT_SECONDS.observe(0.0, self.name, PRIORITY_NAMES[priority])
+            return Ticket(self)
+        if sum(self.waiting.values()) >= QUEUE_MAX:
+            raise self._reject(priority, "queue_full", est)
+        if est > deadline:
+            raise self._reject(priority, "expected_wait", est)
+
+        t0 = time.perf_counter()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), fut))
+        self.waiting[priority] += 1
+        self.counters["queued"] += 1
+        self.counters["max_queue"] = max(self.counters["max_queue"], sum(self.waiting.values()))
+        try:
+            await asyncio.wait((fut,), timeout=deadline)
+        except asyncio.CancelledError:
+            # Client went away while queued; pass a slot it was just handed to the next.
+            if fut.done():
+                self._release(None)
+            else:
+                fut.cancel()
+            raise
+        finally:
+            if not fut.done() or fut.cancelled():
+                fut.cancel()
+            self.waiting[priority] -= 1
+        waited = time.perf_counter() - t0
+        metrics.ADMISSION_WAIT_SECONDS.observe(waited, self.name, PRIORITY_NAMES[priority])
+        if fut.cancelled():
+            raise self._reject(priority, "deadline", self.expected_wait(priority))
+        self.counters["admitted"] += 1
+        return Ticket(self)
+
+    def _release(self, held: Optional[float]) -> None:
+        if held is not None:
+            self.hold += HOLD_ALPHA * (held - self.hold)
+        # Hand the slot straight to the best live waiter, so newcomers can't jump the queue.
+        while self._queue:
+            _, _, fut = heapq.heappop(self._queue)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "limit": self.limit,
+            "active": self.active,
+            "waiting_interactive": self.waiting[INTERACTIVE],
+            "waiting_bulk": self.waiting[BULK],
+            "hold_s": round(self.hold, 3),
+            "expected_wait_interactive_s": round(self.expected_wait(INTERACTIVE), 3),
+            "expected_wait_bulk_s": round(self.expected_wait(BULK), 3),
+        }
+
+
+class AdmissionController:
+    def __init__(self):
+        self.lanes: Dict[str, Lane] = {}
+
+    def lane(self, name: str) -> Lane:
+        lane = self.lanes.get(name)
+        if lane is None:
+            lane = self.lanes[name] = Lane(name, lane_limit(name))
+        return lane
+
+    async def acquire(self, lane: str, priority: int = INTERACTIVE, deadline_ms: Optional[int] = None) -> Ticket:
+        """Wait for a slot in `lane` or raise Overloaded. Release the ticket when the upstream call ends."""
+        if not ADMIT_ENABLED:
+            return Ticket(None)
+        deadline = deadline_ms / 1000.0 if deadline_ms else DEADLINES[priority]
+        ln = self.lane(lane)
+        ticket = await ln.acquire(priority, deadline)
+        if UPSTREAM_RPM:
+            count = shared_state.store.incr("upstream_requests", RATE_WINDOW)
+            if count is not None and count > UPSTREAM_RPM:
+                ticket.cancel()
+                raise ln._reject(priority, "rate_limit", RATE_WINDOW - time.time() % RATE_WINDOW)
+        return ticket
+
+    @asynccontextmanager
+    async def admit(self, lane: str, priority: int = INTERACTIVE, deadline_ms: Optional[int] = None) -> AsyncIterator[Ticket]:
+        ticket = await self.acquire(lane, priority, deadline_ms)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": ADMIT_ENABLED, "upstream_rpm": UPSTREAM_RPM, "lanes": {name: lane.stats() for name, lane in sorted(self.lanes.items())}}
+
+    def gauges(self) -> Dict[str, Any]:
+        """Flat per-lane numbers for /metrics."""
+        return {f"{name}_{k}": v for name, lane in self.lanes.items() for k, v in lane.stats().items()}
+
+
+ADMISSION = AdmissionController()
@@ -0,0 +1,174 @@
+# app/batcher.py
+# Micro-batching for short persona takes (Kosh headlines, news opinions).
+#
+# Requests for the same persona that miss the response cache are held for a few
+# milliseconds (or until max_items are waiting) and sent as one structured completion:
+# one copy of the persona prefix, a JSON list of messages in, a JSON list of replies
+# out. Each caller gets its own reply back. If the batched answer can't be parsed, or
+# leaves an item out, those items fall back to ordinary single calls.
+#
+# Admission (admission.py) is per upstream call, not per request: a batch takes one
+# slot in the persona's lane and counts once against the upstream rate limit, at the
+# most urgent priority and shortest deadline among its items. A refusal (Overloaded)
+# is raised to every caller the call would have answered.
+
+from __future__ import annotations
+import asyncio, json, os, re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import llm
+import prompts
+from admission import ADMISSION, INTERACTIVE
+from prompts import PersonaPrompt
+
+BATCH_ENABLED = os.getenv("DUNSEL_BATCH", "1") not in ("0", "false", "off")
+WINDOW_MS = float(os.getenv("DUNSEL_BATCH_WINDOW_MS", "8"))
+MAX_ITEMS = int(os.getenv("DUNSEL_BATCH_MAX_ITEMS", "12"))
+TOKENS_PER_ITEM = int(os.getenv("DUNSEL_BATCH_TOKENS_PER_ITEM", "300"))
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+@dataclass
+class _Pending:
+    message: str
+    style_hint: str
+    user_name: Optional[str]
+    priority: int
+    deadline_ms: Optional[int]
+    future: asyncio.Future
+
+
+def parse_batch_reply(text: str, n: int) -> List[Optional[str]]:
+    """
+    Replies by position for ids 1..n; None where an id is missing or malformed.
+    Raises ValueError when the text is not the expected JSON at all.
+    """
+    data = json.loads(_FENCE_RE.sub("", (text or "").strip()))
+    rows = data.get("replies") if isinstance(data, dict) else data
+    if not isinstance(rows, list):
+        raise ValueError("no replies list")
+    out: List[Optional[str]] = [None] * n
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        i, reply = row.get("id"), row.get("reply")
+        if isinstance(i, int) and 1 <= i <= n and isinstance(reply, str) and reply.strip():
+            out[i - 1] = reply.strip()
+    return out
+
+
+class MicroBatcher:
+    def __init__(self, params: Dict[str, Any], window_ms: float = WINDOW_MS, max_items: int = MAX_ITEMS):
+        self.window = window_ms / 1000.0
+        self.max_items = max_items
+        self.params = dict(params)
+        self._pending: Dict[str, List[_Pending]] = {}
+        self._prompts: Dict[str, PersonaPrompt] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+        self.counters = {"requests": 0, "upstream_calls": 0, "batches": 0, "batched_items": 0,
+                         "fallbacks": 0, "parse_failures": 0}
+
+    async def submit(
+        self,
+        prompt: PersonaPrompt,
+        message: str,
+        style_hint: str = "",
+        user_name: Optional[str] = None,
+        priority: int = INTERACTIVE,
+        deadline_ms: Optional[int] = None,
+    ) -> Tuple[str, int]:
+        """
+        Queue one message for `prompt`'s persona and wait for its reply.
+        Returns (reply, size of the upstream call that answered it); raises Overloaded
+        if that call was refused admission.
+        """
+        loop = asyncio.get_running_loop()
+        pid = prompt.persona_id
+        item = _Pending(message, style_hint, user_name, priority, deadline_ms, loop.create_future())
+        queue = self._pending.setdefault(pid, [])
+        queue.append(item)
+        self._prompts[pid] = prompt
+        self.counters["requests"] += 1
+        if len(queue) >= self.max_items:
+            self._flush(pid)
+        elif pid not in self._timers:
+            self._timers[pid] = loop.call_later(self.window, self._flush, pid)
+        return await item.future
+
+    def _flush(self, pid: str) -> None:
+        timer = self._timers.pop(pid, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(pid, [])
+        if items:
+            task = asyncio.ensure_future(self._run(self._prompts[pid], items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _single(self, prompt: PersonaPrompt, item: _Pending) -> None:
+        messages = prompts.build_messages(prompt, item.message, style_hint=item.style_hint, user_name=item.user_name)
+        try:
+            async with ADMISSION.admit(prompt.persona_id, item.priority, item.deadline_ms):
+                self.counters["upstream_calls"] += 1
+                completion = await llm.chat_completion(messages, **self.params)
+            prompts.record_usage(completion.usage)
+            reply = (completion.choices[0].message.content or "").strip()
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result((reply, 1))
+
+    async def _run(self, prompt: PersonaPrompt, items: List[_Pending]) -> None:
+        if len(items) == 1:
+            await self._single(prompt, items[0])
+            return
+
+        n = len(items)
+        messages = prompts.build_batch_messages(
+            prompt,
+            [{"message": it.message, "style_hint": it.style_hint, "user_name": it.user_name} for it in items],
+        )
+        params = dict(self.params)
+        params["max_tokens"] = max(params.get("max_tokens", 0), TOKENS_PER_ITEM * n)
+        params["response_format"] = {"type": "json_object"}
+        deadlines = [it.deadline_ms for it in items if it.deadline_ms]
+        try:
+            async with ADMISSION.admit(prompt.persona_id, min(it.priority for it in items),
+                                       min(deadlines) if deadlines else None):
+                self.counters["upstream_calls"] += 1
+                self.counters["batches"] += 1
+                completion = await llm.chat_completion(messages, **params)
+        except Exception as e:
+            for it in items:
+                if not it.future.done():
+                    it.future.set_exception(e)
+            return
+        prompts.record_usage(completion.usage)
+
+        try:
+            replies = parse_batch_reply(completion.choices[0].message.content or "", n)
+        except (ValueError, AttributeError):
+            self.counters["parse_failures"] += 1
+            replies = [None] * n
+
+        missing = []
+        for it, reply in zip(items, replies):
+            if reply is None:
+                missing.append(it)
+            elif not it.future.done():
+                it.future.set_result((reply, n))
+                self.counters["batched_items"] += 1
+        if missing:
+            self.counters["fallbacks"] += len(missing)
+            await asyncio.gather(*(self._single(prompt, it) for it in missing))
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self.counters)
+        out.update({"enabled": BATCH_ENABLED, "window_ms": self.window * 1000, "max_items": self.max_items})
+        return out
+
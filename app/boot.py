@@ -0,0 +1,209 @@
+# app/boot.py
+# Fast-start entrypoint: `uvicorn boot:app`.
+#
+# Importing server.py (FastAPI, the OpenAI SDK, numpy, feedparser) takes over a
+# second, and uvicorn binds only after its app is imported. This module imports
+# only starlette, so the port opens almost at once: the UI pages, static files,
+# /healthz and /readyz are served from here while server.py is imported in a thread
+# and its lifespan (which starts the background warm-up) is run. Other requests wait
+# for the import (up to DUNSEL_BOOT_WAIT_SECONDS) and are then handed to server.app,
+# which from then on serves everything.
+#
+# Also keeps boot milestones (ms since process start) for /healthz and /readyz.
+
+from __future__ import annotations
+import asyncio, importlib, json, os, sys, time
+from typing import Any, Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from static_cache import STATIC, CachedStaticFiles
+
+TARGET = os.getenv("DUNSEL_BOOT_TARGET", "server:app")
+WAIT_SECONDS = float(os.getenv("DUNSEL_BOOT_WAIT_SECONDS", "30"))
+
+
+# -------------------------------------------------------------------
+# Boot milestones
+# -------------------------------------------------------------------
+
+def _process_start() -> float:
+    """perf_counter() value at process start (Linux /proc; else this import)."""
+    try:
+        with open("/proc/self/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - ticks / os.sysconf("SC_CLK_TCK")
+        if 0 <= age < 60:
+            return time.perf_counter() - age
+    except (OSError, ValueError, IndexError):
+        pass
+    return time.perf_counter()
+
+
+PROCESS_START = _process_start()
+MILESTONES: Dict[str, float] = {}
+
+
+def mark(name: str) -> None:
+    """Record `name` once, as ms since process start."""
+    MILESTONES.setdefault(name, round((time.perf_counter() - PROCESS_START) * 1000, 1))
+
+
+def milestones() -> Dict[str, float]:
+    return dict(MILESTONES)
+
+
+mark("boot_imported")
+
+
+# -------------------------------------------------------------------
+# Front-door pages (also used by server.py)
+# -------------------------------------------------------------------
+
+def page_for(host: str) -> str:
+    """
+    HTML page (under static/) for a hostname:
+    - kirk.casa204.net -> persona.html (Kirk UI)
+    - kosh.casa204.net -> kosh.html (Kosh UI)
+    - everything else  -> home.html (Dunsel hub)
+    """
+    if host.startswith("kirk.casa204.net"):
+        return "persona.html"
+    if host.startswith("kosh.casa204.net"):
+        return "kosh.html"
+    return "home.html"
+
+
+def root_page(request):
+    return STATIC.page(page_for(request.headers.get("host", "")), request.headers,
+                       "Dunsel online, but expected HTML file is missing.")
+
+
+def hub_page(request):
+    return STATIC.page("home.html", request.headers, "Dunsel hub online, but home.html missing.")
+
+
+# -------------------------------------------------------------------
+# Early app + hand-off
+# -------------------------------------------------------------------
+
+class BootApp:
+    """ASGI app that answers the cheap routes itself until `target` is imported and started."""
+
+    EARLY_PATHS = ("/", "/dunsel", "/healthz", "/readyz")
+
+    def __init__(self, target: str = TARGET):
+        self.target = target
+        self.app: Any = None
+        self.error: Optional[str] = None
+        self._stopping = False
+        self._loaded: Optional[asyncio.Event] = None
+        self._lifespan_rx: Optional[asyncio.Queue] = None
+        self._lifespan_tx: Optional[asyncio.Queue] = None
+        self._lifespan_task: Optional[asyncio.Future] = None
+        self.early = Starlette(routes=[
+            Route("/", root_page),
+            Route("/dunsel", hub_page),
+            Route("/healthz", self._healthz),
+            Route("/readyz", self._readyz),
+            Mount("/static", CachedStaticFiles(STATIC, check_dir=False), name="static"),
+        ])
+
+    def _state(self) -> Dict[str, Any]:
+        return {"ready": False, "loading": self.error is None, "error": self.error, "boot": milestones()}
+
+    async def _healthz(self, request):
+        return JSONResponse({"ok": self.error is None, **self._state()})
+
+    async def _readyz(self, request):
+        return JSONResponse(self._state(), status_code=503, headers={"Retry-After": "1"})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if self.app is None and scope["type"] == "http":
+            path = scope["path"]
+            if path in self.EARLY_PATHS or path.startswith("/static/"):
+                await self.early(scope, receive, self._first_response(send))
+                return
+            if self._loaded is not None:
+                try:
+                    await asyncio.wait_for(self._loaded.wait(), WAIT_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            if self.app is None:
+                body = json.dumps({"error": "Starting up.", **self._state()}).encode()
+                await send({"type": "http.response.start", "status": 503, "headers": [
+                    (b"content-type", b"application/json"), (b"retry-after", b"1"),
+                    (b"content-length", str(len(body)).encode())]})
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _first_response(send):
+        async def wrapped(message):
+            if message["type"] == "http.response.start":
+                mark("first_response")
+            await send(message)
+        return wrapped
+
+    # --- lifespan: bind now, import + start the real app in the background ---
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._loaded = asyncio.Event()
+                asyncio.ensure_future(self._load())
+                mark("bind")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self._stopping = True
+                await self._stop_inner()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _load(self) -> None:
+        try:
+            module, _, attr = self.target.partition(":")
+            mod = await asyncio.to_thread(importlib.import_module, module)
+            app = getattr(mod, attr or "app")
+            mark("app_imported")
+            if self._stopping:
+                return
+            await self._start_inner(app)
+            self.app = app
+            mark("app_started")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"[boot] failed to start {self.target}: {self.error}", file=sys.stderr)
+        finally:
+            self._loaded.set()
+
+    async def _start_inner(self, app) -> None:
+        # Run the inner app's lifespan over a pair of queues, as a server would.
+        self._lifespan_rx, self._lifespan_tx = asyncio.Queue(), asyncio.Queue()
+        scope = {"type": "lifespan", "asgi": {"version": "3.0", "spec_version": "2.0"}, "state": {}}
+        self._lifespan_task = asyncio.ensure_future(app(scope, self._lifespan_rx.get, self._lifespan_tx.put))
+        await self._lifespan_rx.put({"type": "lifespan.startup"})
+        reply = await self._lifespan_tx.get()
+        if reply["type"] != "lifespan.startup.complete":
+            raise RuntimeError(reply.get("message") or "lifespan startup failed")
+
+    async def _stop_inner(self) -> None:
+        if self._lifespan_task is None or self._lifespan_task.done():
+            return
+        await self._lifespan_rx.put({"type": "lifespan.shutdown"})
+        try:
+            await asyncio.wait_for(self._lifespan_tx.get(), 30)
+        except asyncio.TimeoutError:
+            self._lifespan_task.cancel()
+
+
+app = BootApp()
@@ -1 +1,289 @@
-{}
\ No newline at end of file
+#!/usr/bin/env python3
+# app/build_index.py
+# Offline index build: walks persona shards + archives, chunks them and writes the
+# binary index described in shard_index.py. Run at image build time; at container
+# start it is a stat-only no-op unless a mounted source changed.
+#
+# Builds are incremental. The index carries a manifest (content hash, mtime, size,
+# doc and chunk ids per source file); a rebuild re-processes only added or changed
+# files, fanned out over a process pool, and carries every other document's chunks
+# and postings over from the previous index without re-reading its source.
+
+from __future__ import annotations
+import argparse, glob, hashlib, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from chunking import parse_doc_stream, iter_chunks
+from retriever import SHARDS_DIR, _split_header_body, _safe_read, _priority_of, _infer_keywords
+import shard_index
+
+APP_DIR = shard_index.APP_DIR
+BUILD_JOBS = int(os.getenv("DUNSEL_BUILD_JOBS", "0")) or (os.cpu_count() or 1)
+
+# (kind, persona, root, recursive)
+SOURCES = [
+    ("shard", "kirk", SHARDS_DIR, False),
+    ("archive", "kirk", os.path.join(APP_DIR, "kirk_archive"), True),
+    ("archive", "kosh", os.path.join(APP_DIR, "kosh_archive"), True),
+]
+
+
+def _rel(path: str) -> str:
+    return os.path.relpath(path, APP_DIR)
+
+
+def scan_sources() -> List[Tuple[str, str, str, float, int]]:
+    """
+    (kind, persona, abs_path, mtime, size) for every candidate .txt file, in build order.
+    Persona shards use the same non-recursive glob as retriever.load_all_shards().
+    """
+    out = []
+    for kind, persona, root, recursive in SOURCES:
+        pattern = os.path.join(root, "**", "*.txt") if recursive else os.path.join(root, "*.txt")
+        for fp in sorted(glob.glob(pattern, recursive=recursive)):
+            try:
+                st = os.stat(fp)
+            except OSError:
+                continue
+            out.append((kind, persona, fp, st.st_mtime, st.st_size))
+    return out
+
+
+def _fingerprint(scan) -> List[List[Any]]:
+    return [[_rel(fp), mtime, size] for _, _, fp, mtime, size in scan]
+
+
+def _shard_doc(fp: str, persona: str, text: str) -> Dict[str, Any] | None:
+    headers, body = _split_header_body(text)
+    if not headers and not body:
+        return None
+    sid = headers.get("id") or os.path.splitext(os.path.basename(fp))[0]
+    notes = headers.get("notes", "")
+    return {
+        "kind": "shard",
+        "persona": persona,
+        "id": sid,
+        "title": sid,
+        "type": headers.get("type", "shard"),
+        "source_id": sid,
+        "tags": [t.strip() for t in notes.split(",") if t.strip()],
+        "headers": headers,
+        "priority": _priority_of(headers),
+        "keywords": _infer_keywords(headers),
+        "body": body,
+    }
+
+
+def _archive_doc(fp: str, persona: str) -> Tuple[Dict[str, Any], Iterator[str]]:
+    blocks, meta = parse_doc_stream(Path(fp))
+    doc = {
+        "kind": "archive",
+        "persona": persona,
+        "id": meta["source_id"] or os.path.splitext(os.path.basename(fp))[0],
+        "title": meta["title"],
+        "year": meta["year"],
+        "type": meta["type"],
+        "source_id": meta["source_id"],
+        "tags": meta["tags"],
+    }
+    return doc, blocks
+
+
+def _sha256(fp: str) -> str:
+    h = hashlib.sha256()
+    with open(fp, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def process_source(kind: str, persona: str, fp: str) -> Tuple[str, Optional[shard_index.Segment]]:
+    """
+    Parse, chunk and tokenize one source file; runs in a worker process.
+    Returns (content hash, segment), segment None for empty or headerless files.
+    """
+    digest = _sha256(fp)
+    if kind == "shard":
+        text = _safe_read(fp)
+        doc = _shard_doc(fp, persona, text) if text else None
+        if doc is None:
+            return digest, None
+        blocks: Any = [doc["body"]]
+    else:
+        try:
+            doc, blocks = _archive_doc(fp, persona)
+        except ValueError:
+            # Empty placeholders or files without the TITLE/YEAR/... header.
+            return digest, None
+    return digest, shard_index.encode_chunks(doc, iter_chunks(blocks))
+
+
+def _process_all(todo: List[Tuple[str, str, str, float, int]], jobs: int) -> List[Tuple[str, Any]]:
+    # Largest files are submitted first so one big archive doesn't start last.
+    if jobs <= 1 or len(todo) <= 1:
+        return [process_source(kind, persona, fp) for kind, persona, fp, _, _ in todo]
+    order = sorted(range(len(todo)), key=lambda i: -todo[i][4])
+    with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as ex:
+        futs = {i: ex.submit(process_source, *todo[i][:3]) for i in order}
+        return [futs[i].result() for i in range(len(todo))]
+
+
+def _open_previous(out_path: str) -> Optional[shard_index.ShardIndex]:
+    try:
+        idx = shard_index.ShardIndex(out_path)
+    except (OSError, ValueError):
+        return None
+    if idx.manifest is None:  # built before manifests existed
+        idx.close()
+        return None
+    return idx
+
+
+def diff_sources(scan, manifest: Dict[str, Dict[str, Any]]) -> Dict[str, list]:
+    """
+    Split a scan against the previous manifest into added / changed / touched (stat
+    changed, same content) / unchanged entries, plus removed paths. Only files whose
+    mtime or size moved are hashed.
+    """
+    out: Dict[str, list] = {"added": [], "changed": [], "touched": [], "unchanged": [], "removed": []}
+    seen = set()
+    for entry in scan:
+        kind, persona, fp, mtime, size = entry
+        rel = _rel(fp)
+        seen.add(rel)
+        m = manifest.get(rel)
+        if m is None or (m["kind"], m["persona"]) != (kind, persona):
+            out["added"].append(entry)
+        elif m["mtime"] == mtime and m["size"] == size:
+            out["unchanged"].append(entry)
+        elif m["size"] == size and _sha256(fp) == m["sha256"]:
+            out["touched"].append(entry)
+        else:
+            out["changed"].append(entry)
+    out["removed"] = sorted(set(manifest) - seen)
+    return out
+
+
+def build(out_path: str, verbose: bool = True, full: bool = False, jobs: int = BUILD_JOBS) -> Dict[str, Any]:
+    """
+    Bring the index at `out_path` up to date with the sources on disk. Only added and
+    changed files are processed unless `full`; with nothing changed nothing is written.
+    Returns counts plus per-stage timings in seconds.
+    """
+    timings: Dict[str, float] = {}
+    t0 = mark = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal mark
+        now = time.perf_counter()
+        timings[stage] = round(now - mark, 4)
+        mark = now
+
+    scan = scan_sources()
+    lap("scan")
+    old = None if full else _open_previous(out_path)
+    manifest = old.manifest if old is not None else {}
+    diff = diff_sources(scan, manifest)
+    lap("diff")
+    stats: Dict[str, Any] = {k: len(v) for k, v in diff.items()}
+    stats["files"] = len(scan)
+
+    if old is not None and not (diff["added"] or diff["changed"] or diff["touched"] or diff["removed"]):
+        old.close()
+        stats.update(written=False, timings=timings, seconds=round(time.perf_counter() - t0, 3))
+        if verbose:
+            _report(out_path, stats, jobs)
+        return stats
+
+    todo = diff["added"] + diff["changed"]
+    results = dict(zip((fp for _, _, fp, _, _ in todo), _process_all(todo, jobs)))
+    lap("process")
+
+    entries: List[Tuple[str, Any]] = []
+    new_manifest: Dict[str, Dict[str, Any]] = {}
+    skipped: List[str] = []
+    n_chunks = 0
+    for kind, persona, fp, mtime, size in scan:
+        rel = _rel(fp)
+        info = {"path": rel, "mtime": mtime, "size": size}
+        if fp in results:
+            digest, seg = results[fp]
+            has_doc = seg is not None
+            count = len(seg.texts) if has_doc else 0
+            if has_doc:
+                seg.doc.update(info)
+                entries.append(("new", seg))
+        else:
+            prev = manifest[rel]
+            digest, count = prev["sha256"], prev["chunks"][1]
+            has_doc = prev["doc"] is not None
+            if has_doc:
+                entries.append(("old", (prev["doc"], info)))
+        if not has_doc:
+            skipped.append(rel)
+        new_manifest[rel] = {
+            "kind": kind, "persona": persona, "sha256": digest, "mtime": mtime, "size": size,
+            "doc": len(entries) - 1 if has_doc else None, "chunks": [n_chunks, count],
+        }
+        n_chunks += count
+
+    payloads, n = shard_index.merge_segments(
+        entries, old, meta={"sources": _fingerprint(scan), "manifest": new_manifest}
+    )
+    lap("merge")
+    if old is not None:
+        old.close()
+    written = shard_index.write_sections(out_path, payloads, n["n_docs"], n["n_chunks"], n["n_terms"], n["avgdl"])
+    lap("write")
+
+    stats.update(written)
+    stats.update(written=True, skipped=len(skipped), processed=len(todo),
+                 timings=timings, seconds=round(time.perf_counter() - t0, 3))
+    if verbose:
+        for rel in skipped:
+            print(f"[build_index] skipped (empty or no header): {rel}")
+        _report(out_path, stats, jobs)
+    return stats
+
+
+def _report(out_path: str, stats: Dict[str, Any], jobs: int) -> None:
+    t = stats["timings"]
+    notes = {
+        "scan": f"{stats['files']} files",
+        "diff": f"{stats['added']} added, {stats['changed']} changed, {stats['touched']} touched, "
+                f"{stats['removed']} removed, {stats['unchanged']} unchanged",
+        "process": f"{stats.get('processed', 0)} files on up to {jobs} worker(s)",
+    }
+    for stage, secs in t.items():
+        print(f"[build_index] {stage:<8} {secs:>8.3f}s  {notes.get(stage, '')}".rstrip())
+    if not stats["written"]:
+        print(f"[build_index] {out_path} is up to date")
+        return
+    print(
+        f"[build_index] wrote {out_path}: {stats['docs']} docs, {stats['chunks']} chunks, "
+        f"{stats['terms']} terms, {stats['bytes']} bytes in {stats['seconds']}s"
+    )
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Build the Dunsel shard/archive index.")
+    ap.add_argument("--out", default=shard_index.INDEX_PATH, help="index file to write")
+    ap.add_argument("--full", action="store_true", help="ignore the previous index and re-process every file")
+    ap.add_argument("-j", "--jobs", type=int, default=BUILD_JOBS, help="worker processes (default: CPU count)")
+    ap.add_argument("--if-stale", action="store_true",
+                    help="accepted for older entrypoints; an up-to-date index is always left alone")
+    ap.add_argument("-q", "--quiet", action="store_true")
+    args = ap.parse_args(argv)
+
+    try:
+        build(args.out, verbose=not args.quiet, full=args.full, jobs=max(1, args.jobs))
+    except Exception as e:
+        print(f"[build_index] failed: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
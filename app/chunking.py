@@ -1,34 +1,118 @@
+# app/chunking.py
+# Archive document parsing and chunking for the index build.
+#
+# Documents are read incrementally: the TITLE/YEAR/... header is matched against a
+# bounded prefix of the file, and the body is streamed in blocks through a chunker
+# that normalizes whitespace as it goes. Memory is bounded by the block size and
+# max_chars, not by the document, so full transcripts and autobiographies can go
+# into kirk_archive/ and kosh_archive/ as single files.
+
+from __future__ import annotations
 import re
 from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, TextIO, Tuple
 
 HEADER_RE = re.compile(r'^TITLE:(.*?)\nYEAR:(.*?)\nTYPE:(.*?)\nTAGS:(.*?)\nSOURCE_ID:(.*?)\n---\n', re.S)
+HEADER_MAX_CHARS = 1 << 16   # the header must end within this many characters
+BLOCK_CHARS = 1 << 16        # body read size
 
-def parse_doc(path: Path):
-    txt = path.read_text(encoding="utf-8", errors="ignore")
-    m = HEADER_RE.match(txt)
-    if not m:
-        raise ValueError(f"Missing header in {path}")
+_WS_RE = re.compile(r'\s+')
+
+
+def _body_blocks(f: TextIO, first: str) -> Iterator[str]:
+    with f:
+        if first:
+            yield first
+        while True:
+            block = f.read(BLOCK_CHARS)
+            if not block:
+                return
+            yield block
+
+
+def parse_doc_stream(path: Path) -> Tuple[Iterator[str], Dict[str, Any]]:
+    """
+    Like parse_doc(), but the body comes back as an iterator of text blocks that
+    reads the file as it is consumed (and closes it when exhausted).
+    Raises ValueError up front if the header is missing.
+    """
+    f = open(path, encoding="utf-8", errors="ignore")
+    try:
+        head = f.read(HEADER_MAX_CHARS)
+        m = HEADER_RE.match(head)
+        if not m:
+            raise ValueError(f"Missing header in {path}")
+    except BaseException:
+        f.close()
+        raise
     title, year, typ, tags, source_id = [s.strip() for s in m.groups()]
-    body = txt[m.end():].strip()
     meta = {
         "title": title, "year": year, "type": typ,
         "tags": [t.strip() for t in tags.split(",") if t.strip()],
         "source_id": source_id, "path": str(path)
     }
-    return body, meta
-
-def chunk_text(text: str, max_chars=1800, overlap=200):
-    import re
-    text = re.sub(r'\s+', ' ', text).strip()
-    chunks = []
-    i = 0
-    while i < len(text):
-        end = min(len(text), i + max_chars)
-        chunk = text[i:end]
-        last_period = chunk.rfind('. ')
-        if last_period > max_chars * 0.6:
-            end = i + last_period + 2
-            chunk = text[i:end]
-        chunks.append(chunk.strip())
-        i = max(end - overlap, end)
-    return chunks
+    return _body_blocks(f, head[m.end():]), meta
+
+
+def parse_doc(path: Path):
+    blocks, meta = parse_doc_stream(path)
+    return "".join(blocks).strip(), meta
+
+
+def iter_chunks(blocks: Iterable[str], max_chars: int = 1800, overlap: int = 200) -> Iterator[str]:
+    """
+    Chunks of whitespace-normalized text from a stream of blocks. Each chunk is at
+    most max_chars, ends at a sentence boundary ('. ') when one falls in its last 40%,
+    and the next chunk starts `overlap` characters before its end, moved forward to a
+    word boundary. Only the current window is held in memory.
+    """
+    overlap = max(0, min(overlap, max_chars - 1))
+    min_cut = int(max_chars * 0.6)
+    it = iter(blocks)
+    buf, i, eof = "", 0, False
+    while True:
+        # Refill until a full window is buffered, dropping the consumed prefix.
+        # One character past the window is needed to know whether it reaches the end.
+        if len(buf) - i <= max_chars and not eof:
+            parts = [buf[i:]]
+            have = len(parts[0])
+            tail_space = buf.endswith(" ") or not buf
+            while have <= max_chars:
+                block = next(it, None)
+                if block is None:
+                    eof = True
+                    break
+                s = _WS_RE.sub(" ", block)
+                if tail_space and s.startswith(" "):
+                    s = s[1:]
+                if s:
+                    parts.append(s)
+                    have += len(s)
+                    tail_space = s.endswith(" ")
+            buf, i = "".join(parts), 0
+            if eof and buf.endswith(" "):
+                buf = buf[:-1]
+        if i >= len(buf):
+            return
+
+        end = min(len(buf), i + max_chars)
+        # '. ' must lie wholly inside the window and past 60% of max_chars.
+        cut = buf.rfind(". ", i + min_cut + 1, end)
+        if cut != -1:
+            end = cut + 2
+        chunk = buf[i:end].strip()
+        if chunk:
+            yield chunk
+        if eof and end >= len(buf):
+            return
+
+        nxt = end - overlap
+        if overlap:
+            space = buf.find(" ", nxt, end - 1)
+            if space != -1:
+                nxt = space + 1
+        i = nxt if nxt > i else end
+
+
+def chunk_text(text: str, max_chars=1800, overlap=200) -> List[str]:
+    return list(iter_chunks([text], max_chars, overlap))
@@ -0,0 +1,166 @@
+# app/llm.py
+# One async OpenAI client per process, backed by a single pooled httpx transport.
+# Every upstream chat call goes through chat_completion(), which applies the
+# per-call timeout and the in-flight cap so a burst of chats queues here instead
+# of opening unbounded sockets to the provider.
+
+from __future__ import annotations
+import asyncio, os, time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+import metrics
+
+MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+
+# Pool / concurrency knobs (per uvicorn worker).
+MAX_CONNECTIONS = int(os.getenv("DUNSEL_LLM_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE = int(os.getenv("DUNSEL_LLM_MAX_KEEPALIVE", "32"))
+KEEPALIVE_EXPIRY = float(os.getenv("DUNSEL_LLM_KEEPALIVE_EXPIRY", "30"))
+MAX_INFLIGHT = int(os.getenv("DUNSEL_LLM_MAX_INFLIGHT", "48"))
+TIMEOUT = float(os.getenv("DUNSEL_LLM_TIMEOUT", "60"))
+CONNECT_TIMEOUT = float(os.getenv("DUNSEL_LLM_CONNECT_TIMEOUT", "5"))
+MAX_RETRIES = int(os.getenv("DUNSEL_LLM_MAX_RETRIES", "2"))
+
+_client: Optional[AsyncOpenAI] = None
+_http: Optional[httpx.AsyncClient] = None
+_inflight = asyncio.Semaphore(MAX_INFLIGHT)
+_active = 0
+_waiting = 0
+
+
+def get_client() -> AsyncOpenAI:
+    """
+    Lazily build the shared client. Reads OPENAI_API_KEY / OPENAI_BASE_URL from env.
+    """
+    global _client, _http
+    if _client is None:
+        _http = http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+        _client = AsyncOpenAI(http_client=http, max_retries=MAX_RETRIES, timeout=TIMEOUT)
+    return _client
+
+
+async def preconnect() -> None:
+    """
+    Open one pooled connection to the provider (DNS, TCP, TLS) ahead of the first chat.
+    The response itself is ignored; any status means the connection is up.
+    """
+    client = get_client()
+    await _http.head(str(client.base_url), timeout=CONNECT_TIMEOUT)
+
+
+@asynccontextmanager
+async def _slot():
+    # One in-flight upstream request; callers beyond MAX_INFLIGHT wait here.
+    global _active, _waiting
+    _waiting += 1
+    try:
+        await _inflight.acquire()
+    finally:
+        _waiting -= 1
+    _active += 1
+    try:
+        yield
+    finally:
+        _active -= 1
+        _inflight.release()
+
+
+async def chat_completion(
+    messages: List[Dict[str, Any]],
+    *,
+    model: Optional[str] = None,
+    timeout: Optional[float] = None,
+    **params: Any,
+):
+    """
+    Await one chat completion under the in-flight cap. `timeout` overrides the
+    default per-call deadline (seconds); remaining kwargs go to the API as-is.
+    """
+    async with _slot():
+        t0 = time.perf_counter()
+        try:
+            return await get_client().chat.completions.create(
+                model=model or MODEL,
+                messages=messages,
+                timeout=timeout if timeout is not None else TIMEOUT,
+                **params,
+            )
+        except Exception as e:
+            metrics.UPSTREAM_ERRORS.inc("chat", type(e).__name__)
+            raise
+        finally:
+            metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - t0, "chat")
+
+
+async def stream_chat_completion(
+    messages: List[Dict[str, Any]],
+    *,
+    model: Optional[str] = None,
+    timeout: Optional[float] = None,
+    on_usage: Optional[Callable[[Any], None]] = None,
+    **params: Any,
+) -> AsyncIterator[str]:
+    """
+    Yield content deltas as they arrive. The in-flight slot is held until the
+    stream is exhausted or the consumer stops iterating. If `on_usage` is given,
+    the provider is asked for a final usage chunk and it is passed to the callback.
+    """
+    if on_usage is not None:
+        params.setdefault("stream_options", {"include_usage": True})
+    async with _slot():
+        t0 = time.perf_counter()
+        first = True
+        try:
+            stream = await get_client().chat.completions.create(
+                model=model or MODEL,
+                messages=messages,
+                timeout=timeout if timeout is not None else TIMEOUT,
+                stream=True,
+                **params,
+            )
+            try:
+                async for chunk in stream:
+                    if on_usage is not None and getattr(chunk, "usage", None) is not None:
+                        on_usage(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if first:
+                            metrics.UPSTREAM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - t0)
+                            first = False
+                        yield delta
+            finally:
+                await stream.close()
+        except Exception as e:
+            metrics.UPSTREAM_ERRORS.inc("stream", type(e).__name__)
+            raise
+        finally:
+            metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - t0, "stream")
+
+
+async def aclose() -> None:
+    global _client, _http
+    if _client is not None:
+        await _client.close()
+        _client = _http = None
+
+
+def stats() -> Dict[str, int]:
+    return {
+        "inflight": _active,
+        "waiting": _waiting,
+        "max_inflight": MAX_INFLIGHT,
+        "max_connections": MAX_CONNECTIONS,
+    }
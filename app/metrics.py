@@ -0,0 +1,263 @@
+# app/metrics.py
+# Request instrumentation: per-stage timings, token counts, cache and upstream outcomes.
+#
+# MetricsMiddleware gives every HTTP request a Timings record (held in a contextvar,
+# so route code anywhere below it can add to it with `with stage("retrieve"):`). The
+# stages go out as a Server-Timing header and, when the response is finished
+# (including SSE bodies), into Prometheus histograms served on /metrics. Everything
+# is in-process counters and dict updates: no locks, no I/O, no dependency.
+#
+# Metrics are per process; with several uvicorn workers each one reports its own.
+
+from __future__ import annotations
+import math, os, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("DUNSEL_METRICS", "1") not in ("0", "false", "off")
+
+# Seconds; upstream calls dominate, local stages are sub-millisecond.
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+# -------------------------------------------------------------------
+# Metric types (Prometheus text exposition format 0.0.4)
+# -------------------------------------------------------------------
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, n: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + n
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, v in sorted(self._values.items()):
+            out.append(f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = TIME_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        s = self._series.get(labels)
+        if s is None:
+            s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        s[bisect_left(self.buckets, value)] += 1
+        s[-1] += value
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, s in sorted(self._series.items()):
+            acc = 0
+            for bound, n in zip(self.buckets + (math.inf,), s):
+                acc += n
+                le = 'le="' + _num(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(s[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {acc}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+        self.collectors: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collect(self, prefix: str, fn: Callable[[], Dict[str, Any]]) -> None:
+        """Export fn()'s numeric values as gauges <prefix>_<key> at scrape time."""
+        self.collectors.append((prefix, fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self.metrics:
+            lines += m.render()
+        for prefix, fn in self.collectors:
+            try:
+                values = fn()
+            except Exception:
+                continue
+            for key, v in sorted(values.items()):
+                if isinstance(v, bool) or not isinstance(v, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                lines += [f"# TYPE {name} gauge", f"{name} {_num(v)}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.add(Histogram(
+    "dunsel_request_seconds", "HTTP request duration, including streamed bodies.", ("route", "status")))
+STAGE_SECONDS = REGISTRY.add(Histogram(
+    "dunsel_stage_seconds", "Time spent in one stage of a request.", ("route", "stage")))
+UPSTREAM_SECONDS = REGISTRY.add(Histogram(
+    "dunsel_upstream_seconds", "Upstream chat completion duration (streams: until the last chunk).", ("call",)))
+UPSTREAM_FIRST_TOKEN_SECONDS = REGISTRY.add(Histogram(
+    "dunsel_upstream_first_token_seconds", "Time to the first streamed content delta."))
+UPSTREAM_ERRORS = REGISTRY.add(Counter(
+    "dunsel_upstream_errors_total", "Failed upstream calls by exception type.", ("call", "error")))
+TOKENS = REGISTRY.add(Histogram(
+    "dunsel_tokens", "Tokens per upstream call as reported by the provider.", ("kind",), TOKEN_BUCKETS))
+RESPONSE_CACHE = REGISTRY.add(Counter(
+    "dunsel_response_cache_total", "Response cache outcome per persona request.", ("route", "result")))
+ADMISSION_WAIT_SECONDS = REGISTRY.add(Histogram(
+    "dunsel_admission_wait_seconds", "Time queued for an upstream slot, admitted or not.", ("lane", "priority")))
+ADMISSION_REJECTED = REGISTRY.add(Counter(
+    "dunsel_admission_rejected_total", "Requests refused by admission control (503).", ("lane", "priority", "reason")))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# -------------------------------------------------------------------
+# Per-request timings
+# -------------------------------------------------------------------
+
+class Timings:
+    __slots__ = ("scope", "start", "stages", "notes")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.notes: Dict[str, str] = {}
+
+    @property
+    def route(self) -> str:
+        # Routed endpoints by path template (the router puts "endpoint" and "route" in
+        # scope), a mount (static files) by its prefix and 404s as "other", so
+        # arbitrary request paths and path parameters can't blow up the series count.
+        s = self.scope
+        if "endpoint" not in s:
+            return "other"
+        path = getattr(s.get("route"), "path", None)
+        if path is not None:
+            return path or "/"
+        if "app_root_path" in s:
+            return s["root_path"][len(s["app_root_path"]):] or "/"
+        return s.get("path", "other")
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        parts = [f"{k};dur={v * 1000:.2f}" for k, v in self.stages.items()]
+        parts += [f'{k};desc="{v}"' for k, v in self.notes.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[Timings]] = ContextVar("dunsel_timings", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the block as stage `name` of the current request (no-op outside one)."""
+    t = _current.get()
+    if t is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        t.add(name, time.perf_counter() - t0)
+
+
+def record(name: str, seconds: float) -> None:
+    """Add a stage duration measured by the caller."""
+    t = _current.get()
+    if t is not None:
+        t.add(name, seconds)
+
+
+def note(name: str, value: str) -> None:
+    """
+    Attach a per-request fact (e.g. cache="hit") to the Server-Timing header;
+    cache outcomes are also counted per route. Use a name no stage uses: clients
+    merge Server-Timing entries that share one (the lookup is timed as cache_lookup).
+    """
+    t = _current.get()
+    if t is not None:
+        t.notes[name] = value
+        if name == "cache":
+            RESPONSE_CACHE.inc(t.route, value)
+
+
+@contextmanager
+def untimed() -> Iterator[None]:
+    """
+    Detach the block (and tasks it spawns) from the request's timings, for fan-out
+    whose parallel stages would otherwise be summed; time the block as a whole instead.
+    """
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class MetricsMiddleware:
+    """Pure ASGI, so streamed bodies are timed to their last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        timings = Timings(scope)
+        token = _current.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1", "replace")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = timings.route
+            REQUEST_SECONDS.observe(time.perf_counter() - timings.start, route, str(status))
+            for name, seconds in timings.stages.items():
+                STAGE_SECONDS.observe(seconds, route, name)
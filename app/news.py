@@ -0,0 +1,391 @@
+# app/news.py
+# RSS/Atom ingestion for the news consoles.
+#
+# Every subscribed feed is fetched concurrently on one pooled httpx client, capped by
+# a semaphore. Each feed remembers its ETag / Last-Modified and its last parsed items,
+# so an unchanged feed costs one conditional GET answered with 304 and no parsing.
+# Titles are normalized with preprocess_headline_for_kosh (batched per feed), and each
+# new item is placed in its story cluster (story_index) so outlets covering the same
+# event share one take.
+#
+# With several workers, each feed's validators and parsed items are also kept in the
+# host-wide shared store (shared_state.py): a worker that finds a copy fetched less
+# than SHARED_FRESH seconds ago uses it without touching the network, and an older
+# copy still lends its ETag / Last-Modified, so N workers cost the feed one fetch.
+#
+# Feed URLs come from visitors, so fetches only go to public addresses. URLs naming
+# localhost or a non-public IP are refused when validated, and every connection the
+# client opens (the first hop and each redirect, at most MAX_REDIRECTS) resolves its
+# host itself, refuses it if any address is loopback, private, link-local or otherwise
+# not global, and connects to the address it checked. Bodies are streamed and cut off
+# past MAX_BYTES. The saved subscription list is shared by every visitor, so replacing
+# it takes DUNSEL_NEWS_FEEDS_TOKEN.
+
+from __future__ import annotations
+import asyncio, calendar, ipaddress, json, os, socket, time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import feedparser
+import httpcore
+import httpx
+
+import shared_state
+import story_index
+from utils.kosh_headline import preprocess_many
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+FEEDS_PATH = os.getenv("DUNSEL_NEWS_FEEDS_PATH", os.path.join(APP_DIR, "data", "news_feeds.json"))
+CONCURRENCY = int(os.getenv("DUNSEL_NEWS_CONCURRENCY", "16"))
+FETCH_TIMEOUT = float(os.getenv("DUNSEL_NEWS_TIMEOUT", "8"))
+MAX_FEEDS = int(os.getenv("DUNSEL_NEWS_MAX_FEEDS", "64"))
+ITEMS_PER_FEED = int(os.getenv("DUNSEL_NEWS_ITEMS_PER_FEED", "40"))
+SHARED_FRESH = float(os.getenv("DUNSEL_NEWS_SHARED_FRESH", "60"))
+SHARED_TTL = float(os.getenv("DUNSEL_NEWS_SHARED_TTL", str(6 * 3600)))
+MAX_BYTES = int(os.getenv("DUNSEL_NEWS_MAX_BYTES", str(2 * 2**20)))
+MAX_REDIRECTS = 5
+# Local stand-in feeds (tools/bench_news.py, tools/loadtest.py) need this; never in production.
+ALLOW_PRIVATE = os.getenv("DUNSEL_NEWS_ALLOW_PRIVATE", "0") not in ("0", "false", "off")
+# Needed (X-Dunsel-Token) to replace the saved feed list; unset = read-only.
+FEEDS_TOKEN = os.getenv("DUNSEL_NEWS_FEEDS_TOKEN", "")
+USER_AGENT = "dunsel-news/1.0"
+
+DEFAULT_FEEDS = [
+    "https://www.reuters.com/world/us/rss",
+    "https://apnews.com/hub/ap-top-news?utm_source=rss&utm_medium=referral&utm_campaign=apnews_rss",
+    "https://feeds.bbci.co.uk/news/world/rss.xml",
+]
+
+
+# -------------------------------------------------------------------
+# Subscribed feeds (shared by every console; a small JSON file)
+# -------------------------------------------------------------------
+
+def validate_feeds(urls: List[str]) -> Tuple[List[str], Optional[str]]:
+    """
+    Strip, de-duplicate (order kept) and check feed URLs. Returns (feeds, error).
+    """
+    out: List[str] = []
+    for raw in urls or []:
+        url = (raw or "").strip()
+        if not url or url in out:
+            continue
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            return out, f"Not an http(s) feed URL: {url}"
+        if not ALLOW_PRIVATE and not _public_name(parsed.hostname):
+            return out, f"Not a public feed host: {url}"
+        out.append(url)
+    if len(out) > MAX_FEEDS:
+        return out[:MAX_FEEDS], f"At most {MAX_FEEDS} feeds."
+    return out, None
+
+
+def _public_ip(ip: ipaddress.IPv4Address | ipaddress.IPv6Address) -> bool:
+    mapped = getattr(ip, "ipv4_mapped", None)
+    if mapped is not None:
+        ip = mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _public_name(host: str) -> bool:
+    """False for names or address literals that are never public (checked before DNS)."""
+    host = host.lower().rstrip(".")
+    if host == "localhost" or host.endswith(".localhost"):
+        return False
+    try:
+        return _public_ip(ipaddress.ip_address(host))
+    except ValueError:
+        return True  # a name: resolved and checked when fetched
+
+
+def load_feeds() -> List[str]:
+    try:
+        with open(FEEDS_PATH, "r", encoding="utf-8") as f:
+            feeds = json.load(f).get("feeds")
+    except (OSError, ValueError):
+        return list(DEFAULT_FEEDS)
+    return feeds if isinstance(feeds, list) else list(DEFAULT_FEEDS)
+
+
+def save_feeds(urls: List[str]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(FEEDS_PATH)), exist_ok=True)
+    tmp = f"{FEEDS_PATH}.tmp.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"feeds": urls}, f, indent=2)
+    os.replace(tmp, FEEDS_PATH)
+
+
+# -------------------------------------------------------------------
+# Fetching
+# -------------------------------------------------------------------
+
+class FeedRefused(Exception):
+    """A feed fetch stopped before parsing: non-public address or oversized body."""
+
+
+class _PublicOnly(httpcore.AsyncNetworkBackend):
+    """
+    Network backend for the feed client: resolves the host, raises FeedRefused unless
+    every address is public, then connects to those addresses (the TLS name and the
+    pool key stay the host name, so certificates and keep-alive work as usual).
+    """
+
+    def __init__(self, inner: httpcore.AsyncNetworkBackend):
+        self._inner = inner
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            infos = await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM), timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise httpcore.ConnectError(f"cannot resolve {host}: {e}") from None
+        addrs = list(dict.fromkeys(ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos))
+        bad = [a for a in addrs if not _public_ip(a)]
+        if not addrs or bad:
+            raise FeedRefused(f"{host} resolves to a non-public address ({bad[0] if bad else 'none'})")
+        err: Optional[Exception] = None
+        for addr in addrs:
+            try:
+                return await self._inner.connect_tcp(
+                    str(addr), port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except httpcore.ConnectError as e:
+                err = e
+        raise err
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise FeedRefused("unix sockets are not feeds")
+
+    async def sleep(self, seconds: float) -> None:
+        await self._inner.sleep(seconds)
+
+
+@dataclass
+class FeedState:
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    title: str = ""
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    status: str = "new"          # new | ok | not_modified | error
+    error: Optional[str] = None
+    fetched_at: float = 0.0
+    parsed_at: float = 0.0
+
+
+def _published(entry: Any) -> Optional[float]:
+    for key in ("published_parsed", "updated_parsed"):
+        t = entry.get(key)
+        if t:
+            return float(calendar.timegm(t))
+    return None
+
+
+def _source_name(url: str, feed_title: str) -> str:
+    if feed_title:
+        return feed_title
+    host = urlparse(url).netloc
+    return host[4:] if host.startswith("www.") else host
+
+
+def parse_feed(url: str, body: bytes) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Parse one RSS/Atom document into (feed title, normalized items).
+    """
+    parsed = feedparser.parse(body)
+    feed_title = (parsed.feed.get("title") or "").strip()
+    source = _source_name(url, feed_title)
+    entries = [e for e in parsed.entries[:ITEMS_PER_FEED] if (e.get("title") or "").strip()]
+    titles = [" ".join(e.get("title", "").split()) for e in entries]
+    cleaned = preprocess_many(titles)
+    items = []
+    for e, title, clean in zip(entries, titles, cleaned):
+        items.append({
+            "title": title,
+            "clean": clean or title,
+            "link": e.get("link", ""),
+            "source": source,
+            "published": _published(e),
+            "feed": url,
+        })
+    return feed_title, items
+
+
+class FeedFetcher:
+    """
+    Conditional, concurrent feed fetches with a per-feed parsed-item cache.
+    """
+
+    def __init__(self, concurrency: int = CONCURRENCY, timeout: float = FETCH_TIMEOUT):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.states: Dict[str, FeedState] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.counters = {"fetches": 0, "not_modified": 0, "parsed": 0, "errors": 0, "shared": 0}
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            transport = httpx.AsyncHTTPTransport(limits=limits)
+            if not ALLOW_PRIVATE:
+                # httpx has no resolver hook; the backend of its httpcore pool is the seam.
+                transport._pool._network_backend = _PublicOnly(transport._pool._network_backend)
+            self._client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True,
+                max_redirects=MAX_REDIRECTS,
+            )
+            self._sem = asyncio.Semaphore(self.concurrency)
+        return self._client
+
+    async def fetch(self, url: str) -> FeedState:
+        state = self.states.get(url)
+        if state is None:
+            if len(self.states) >= 4 * MAX_FEEDS:
+                # Consoles can send their own lists; forget the longest-idle feed.
+                del self.states[min(self.states, key=lambda u: self.states[u].fetched_at)]
+            state = self.states[url] = FeedState(url)
+        if self._adopt_shared(state):
+            self.counters["shared"] += 1
+            return state
+        client = self._http()
+        headers = {}
+        if state.etag:
+            headers["If-None-Match"] = state.etag
+        if state.last_modified:
+            headers["If-Modified-Since"] = state.last_modified
+
+        async with self._sem:
+            self.counters["fetches"] += 1
+            try:
+                status, resp_headers, body = await self._get(client, url, headers)
+            except (httpx.HTTPError, FeedRefused) as e:
+                self.counters["errors"] += 1
+                state.status, state.error = "error", f"{type(e).__name__}: {e}"
+                return state
+
+        state.fetched_at = time.time()
+        if status == 304:
+            self.counters["not_modified"] += 1
+            state.status, state.error = "not_modified", None
+            self._publish(state)
+            return state
+        if status != 200:
+            self.counters["errors"] += 1
+            state.status, state.error = "error", f"HTTP {status}"
+            return state
+
+        # Parsing is CPU work; keep it off the event loop.
+        title, items = await asyncio.to_thread(parse_feed, url, body)
+        for it in items:
+            it["story"] = story_index.stories().canonical(it["clean"])
+        self.counters["parsed"] += 1
+        state.title, state.items = title, items
+        state.etag = resp_headers.get("etag")
+        state.last_modified = resp_headers.get("last-modified")
+        state.status, state.error = "ok", None
+        state.parsed_at = state.fetched_at
+        self._publish(state)
+        return state
+
+    async def _get(
+        self, client: httpx.AsyncClient, url: str, headers: Dict[str, str]
+    ) -> Tuple[int, httpx.Headers, bytes]:
+        """
+        (status, headers, body) of a GET; the body is only read for a 200, streamed
+        and refused past MAX_BYTES. Raises FeedRefused or httpx.HTTPError.
+        """
+        async with client.stream("GET", url, headers=headers) as resp:
+            if resp.status_code != 200:
+                return resp.status_code, resp.headers, b""
+            length = resp.headers.get("content-length", "")
+            if length.isdigit() and int(length) > MAX_BYTES:
+                raise FeedRefused(f"feed larger than {MAX_BYTES} bytes")
+            body = bytearray()
+            async for chunk in resp.aiter_bytes():
+                body += chunk
+                if len(body) > MAX_BYTES:
+                    raise FeedRefused(f"feed larger than {MAX_BYTES} bytes")
+            return 200, resp.headers, bytes(body)
+
+    def _adopt_shared(self, state: FeedState) -> bool:
+        """
+        Take a newer copy of the feed from the shared store. True if it is fresh enough
+        to skip the fetch; otherwise its validators still make the fetch conditional.
+        """
+        shared = shared_state.store.get("feed", state.url)
+        if not shared or shared["fetched_at"] <= state.fetched_at:
+            return False
+        if shared["parsed_at"] != state.parsed_at:
+            items = shared["items"]
+            # Story clusters are per process; place the items in this worker's index.
+            for it in items:
+                it["story"] = story_index.stories().canonical(it["clean"])
+            state.title, state.items, state.parsed_at = shared["title"], items, shared["parsed_at"]
+        state.etag, state.last_modified = shared["etag"], shared["last_modified"]
+        if time.time() - shared["fetched_at"] >= SHARED_FRESH:
+            return False
+        state.fetched_at = shared["fetched_at"]
+        state.status, state.error = shared["status"], None
+        return True
+
+    def _publish(self, state: FeedState) -> None:
+        shared_state.store.put("feed", state.url, {
+            "etag": state.etag,
+            "last_modified": state.last_modified,
+            "title": state.title,
+            "items": [{k: v for k, v in it.items() if k != "story"} for it in state.items],
+            "status": state.status,
+            "fetched_at": state.fetched_at,
+            "parsed_at": state.parsed_at,
+        }, SHARED_TTL)
+
+    async def refresh(self, urls: List[str]) -> List[FeedState]:
+        """Fetch every feed at once (bounded by the pool); order follows `urls`."""
+        return list(await asyncio.gather(*(self.fetch(u) for u in urls)))
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self.counters)
+        out["feeds_cached"] = len(self.states)
+        out["concurrency"] = self.concurrency
+        return out
+
+
+def latest_items(states: List[FeedState], max_items: int) -> List[Dict[str, Any]]:
+    """
+    Newest items across feeds (undated ones last, in feed order), one per story
+    cluster.
+    """
+    pool = [it for s in states for it in s.items]
+    pool.sort(key=lambda it: -(it["published"] or 0.0))
+    out, seen = [], set()
+    for it in pool:
+        key = it["story"].lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(it)
+        if len(out) >= max_items:
+            break
+    return out
+
+
+def feed_summary(states: List[FeedState]) -> List[Dict[str, Any]]:
+    return [
+        {"url": s.url, "title": s.title, "status": s.status, "error": s.error, "items": len(s.items)}
+        for s in states
+    ]
+
+
+fetcher = FeedFetcher()
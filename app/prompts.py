@@ -0,0 +1,184 @@
+# app/prompts.py
+# Precompiled per-persona prompt templates.
+#
+# Each persona's static prefix (intro + persona spec + few-shots) is assembled once and
+# kept byte-identical across requests; everything that varies per request (style hint,
+# user turn) is appended after it. Providers that cache prompt prefixes can then reuse
+# the whole prefix. Templates are rebuilt only when the persona file's mtime/size change.
+
+from __future__ import annotations
+import json, os, threading, time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PERSONA_DIR = os.path.join(APP_DIR, "persona")
+STAT_INTERVAL = float(os.getenv("DUNSEL_PERSONA_STAT_INTERVAL", "1.0"))
+
+KIRK_FEW_SHOTS = [
+    {"role": "user", "content": "Your officer froze under fire. What now?"},
+    {"role": "assistant", "content": "Small win. Now. ‘Give me a safe vector.’ Momentum defeats panic. Then we debrief—what scared you, what signal you missed, what you’ll do next. Fear’s real. Leadership’s the choice you make anyway."},
+    {"role": "user", "content": "That plan looks reckless."},
+    {"role": "assistant", "content": "Reckless is jumping without a rope. I bring a rope, a backup rope, and a ship at the end of it."},
+    {"role": "user", "content": "Is strongman politics efficient?"},
+    {"role": "assistant", "content": "For bullies—briefly. For civilizations—never. Truth bends, institutions rot, talent flees. In a crisis you need trust, not fear. Fear breaks on contact."},
+]
+
+# persona id -> (display name, few-shot messages)
+PERSONAS: Dict[str, tuple] = {
+    "kirk": ("James T. Kirk", KIRK_FEW_SHOTS),
+    "kosh": ("Kosh", []),
+}
+
+
+@dataclass
+class PersonaPrompt:
+    persona_id: str
+    persona_name: str
+    text: str
+    prefix: List[Dict[str, str]]
+    mtime: float
+    size: int
+    checked: float = field(default=0.0)
+
+
+def _compile(persona_id: str, path: str, mtime: float, size: int) -> PersonaPrompt:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    persona_name, few_shots = PERSONAS.get(persona_id, (persona_id.title(), []))
+    system_intro = (
+        f"You are {persona_name}, a persistent persona running inside the Dunsel system. "
+        "Stay strictly in character. Do not mention being an AI, a model, or a persona. "
+        "Respond only as the character."
+    )
+    system_content = "\n\n".join([system_intro, "Persona specification:", text])
+    prefix = [{"role": "system", "content": system_content}] + [dict(m) for m in few_shots]
+    return PersonaPrompt(persona_id, persona_name, text, prefix, mtime, size, time.monotonic())
+
+
+_TEMPLATES: Dict[str, PersonaPrompt] = {}
+_LOCK = threading.Lock()
+
+
+def get_prompt(persona_id: str) -> PersonaPrompt:
+    """
+    Compiled template for app/persona/<persona_id>.md. The file is stat()ed at most
+    once per STAT_INTERVAL and only re-read when its mtime or size changed.
+    """
+    cur = _TEMPLATES.get(persona_id)
+    now = time.monotonic()
+    if cur is not None and now - cur.checked < STAT_INTERVAL:
+        return cur
+    path = os.path.join(PERSONA_DIR, f"{persona_id}.md")
+    st = os.stat(path)
+    if cur is not None and (cur.mtime, cur.size) == (st.st_mtime, st.st_size):
+        cur.checked = now
+        return cur
+    with _LOCK:
+        fresh = _compile(persona_id, path, st.st_mtime, st.st_size)
+        _TEMPLATES[persona_id] = fresh
+        STATS["compiles"] += 1
+    return fresh
+
+
+def user_turn(user_message: str, user_name: Optional[str] = None) -> str:
+    """The user message as the model sees it (also how session history stores it)."""
+    return f"{user_name or 'User'} says:\n\n{user_message}"
+
+
+def build_messages(
+    prompt: PersonaPrompt,
+    user_message: str,
+    style_hint: str = "",
+    user_name: Optional[str] = None,
+    context: str = "",
+    summary: str = "",
+    history: Optional[List[Dict[str, str]]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Static prefix first, then the per-request parts. The prefix list is shared, so the
+    message dicts are copied shallowly and must not be mutated by callers.
+    A session's summary and earlier turns go right after the prefix: they only grow
+    between compactions, so the provider's prompt cache extends over them too.
+    """
+    messages = list(prompt.prefix)
+    if summary:
+        messages.append({"role": "system", "content": f"Conversation so far (summary):\n\n{summary}"})
+    if history:
+        messages.extend(history)
+    if style_hint:
+        messages.append({
+            "role": "system",
+            "content": f"Additional style hint:\n\n{style_hint}",
+        })
+    if context:
+        messages.append({"role": "system", "content": context})
+    messages.append({"role": "user", "content": user_turn(user_message, user_name)})
+    return messages
+
+
+BATCH_INSTRUCTIONS = (
+    "Several messages follow as a JSON list, each with an id, who it is from, and an "
+    "optional style hint. Answer each one separately and fully in character, exactly as "
+    "you would if it had arrived alone; do not refer to the other messages. "
+    'Reply with JSON only: {"replies": [{"id": <id>, "reply": "<your reply>"}, ...]} '
+    "with one entry for every id."
+)
+
+
+def build_batch_messages(
+    prompt: PersonaPrompt,
+    items: List[Dict[str, str]],
+) -> List[Dict[str, str]]:
+    """
+    One request carrying several user turns (dicts with message / style_hint /
+    user_name). Same static prefix as build_messages(), so it caches the same way.
+    """
+    payload = [
+        {
+            "id": i,
+            "from": it.get("user_name") or "User",
+            "style": it.get("style_hint") or "",
+            "message": it["message"],
+        }
+        for i, it in enumerate(items, 1)
+    ]
+    messages = list(prompt.prefix)
+    messages.append({"role": "system", "content": BATCH_INSTRUCTIONS})
+    messages.append({"role": "user", "content": json.dumps(payload, ensure_ascii=False)})
+    return messages
+
+
+# -------------------------------------------------------------------
+# Provider prompt-cache measurement
+# -------------------------------------------------------------------
+
+STATS: Dict[str, Any] = {"compiles": 0, "calls": 0, "prompt_tokens": 0, "cached_tokens": 0}
+
+
+def record_usage(usage: Any) -> Dict[str, int]:
+    """
+    Fold one completion's usage into the running totals and return
+    {prompt_tokens, cached_prompt_tokens} for the response metadata.
+    """
+    if usage is None:
+        return {}
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    STATS["calls"] += 1
+    STATS["prompt_tokens"] += prompt_tokens
+    STATS["cached_tokens"] += cached
+    metrics.TOKENS.observe(prompt_tokens, "prompt")
+    metrics.TOKENS.observe(cached, "cached_prompt")
+    metrics.TOKENS.observe(getattr(usage, "completion_tokens", 0) or 0, "completion")
+    return {"prompt_tokens": prompt_tokens, "cached_prompt_tokens": cached}
+
+
+def stats() -> Dict[str, Any]:
+    out = dict(STATS)
+    out["cached_ratio"] = round(out["cached_tokens"] / out["prompt_tokens"], 4) if out["prompt_tokens"] else 0.0
+    out["templates"] = {k: {"mtime": v.mtime, "size": v.size} for k, v in _TEMPLATES.items()}
+    return out
@@ -0,0 +1,340 @@
+# app/punchup.py
+# Persona voice filters (cadence + lexicon), shared by the JSON and streaming endpoints.
+#
+# A filter is a declarative rule table compiled once into a RewriteEngine: each scope's
+# rules become one combined alternation, so a sentence is rewritten in a single regex
+# pass (plus an anchored lead strip) instead of one re.sub per rule. The Kirk filter
+# is built on it below; punch_up_kirk() rewrites a finished reply and
+# KirkStreamRewriter applies the same engine sentence by sentence while tokens are
+# still arriving. Another persona gets its own filter by declaring a rule table.
+#
+# tools/bench_punchup.py checks the Kirk filter against recorded replies.
+
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+# -----------------------
+# Rule engine
+# -----------------------
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    One rewrite: regex `pattern` (case-insensitive) -> literal `repl`.
+
+    scope, in the order they run on a sentence:
+      raw      - on the raw sentence, before its line breaks are joined
+      sentence - on the joined sentence
+      lead     - anchored at the start, after the sentence rules (first match only)
+      long     - first match only, on sentences longer than min_len characters
+      final    - last; does not count toward min_len, and sees the sentence after
+                 the lead strip (the old whole-reply pass)
+    tag: the rule only runs when this tag is on the request.
+
+    Rules that share a scope are combined into one alternation, so they must not
+    overlap or feed each other (one rule's output matching another); keep the
+    recorded-reply check green when adding one.
+    """
+    pattern: str
+    repl: str
+    scope: str = "sentence"
+    tag: Optional[str] = None
+    min_len: int = 0
+
+
+_SCOPES = ("raw", "sentence", "lead", "long", "final")
+_BOUNDARY_RE = re.compile(r"[.!?]\s+")
+_FIRST_SENTENCE_RE = re.compile(r"^.*?[.!?]\s*", re.S)
+_WORD_RE = re.compile(r"\w")
+
+
+def _split_alts(p: str, i: int) -> Tuple[Optional[List[str]], int]:
+    """Top-level alternatives of p from i up to an unmatched ')' or the end."""
+    alts, depth, start = [], 0, i
+    while i < len(p):
+        c = p[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            return None, i
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        elif c == "|" and depth == 0:
+            alts.append(p[start:i])
+            start = i + 1
+        i += 1
+    alts.append(p[start:i])
+    return alts, i
+
+
+def _lead_letters(pattern: str) -> Optional[str]:
+    """
+    ASCII letters/digits every match of `pattern` starts with, for the shapes rule
+    tables use (\\bword..., \\b(?:one|two)...); None when that is not plain to see.
+    """
+    p = pattern[2:] if pattern.startswith(r"\b") else pattern
+    if p.startswith("(?:"):
+        alts, end = _split_alts(p, 3)
+        if alts is None or end >= len(p) or p[end + 1:end + 2] in ("?", "*", "{"):
+            return None
+        heads = [a for alt in alts for a in (_split_alts(alt, 0)[0] or [""])]
+    else:
+        heads, end = _split_alts(p, 0)
+        if heads is None or end < len(p):
+            return None
+    ok = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    if not all(a[:1] and a[0] in ok and a[1:2] not in ("?", "*", "{") for a in heads):
+        return None
+    return "".join(sorted({a[0].lower() for a in heads}))
+
+
+def _combine(rules: Sequence[Rule]) -> Tuple[Optional[re.Pattern], Dict[str, str]]:
+    """
+    One alternation for a scope, with a named group per rule. A \\b every rule starts
+    with is hoisted out, and when the first letters are known a lookahead on them
+    lets the scan skip most positions without trying each branch.
+    """
+    if not rules:
+        return None, {}
+    names = {f"r{i}": r.repl for i, r in enumerate(rules)}
+    hoist = all(r.pattern.startswith(r"\b") and len(_split_alts(r.pattern, 0)[0] or ()) == 1 for r in rules)
+    body = "|".join(f"(?P<r{i}>{r.pattern[2:] if hoist else r.pattern})" for i, r in enumerate(rules))
+    letters = [_lead_letters(r.pattern) for r in rules]
+    guard = f"(?=[{''.join(sorted(set(''.join(letters))))}])" if all(letters) else ""
+    pat = (r"\b" if hoist else "") + guard + f"(?:{body})"
+    return re.compile(pat, re.I), names
+
+
+class _Pass:
+    """The compiled rules for one set of active tags."""
+
+    def __init__(self, rules: Sequence[Rule]):
+        by = {s: [r for r in rules if r.scope == s] for s in _SCOPES}
+        self.raw, self.raw_repl = _combine(by["raw"])
+        # sentence + final rules share one pass; final matches are tracked so min_len
+        # can be judged on the pre-final length.
+        self.main, self.main_repl = _combine(by["sentence"] + by["final"])
+        self.final_names = frozenset(list(self.main_repl)[len(by["sentence"]):])
+        self.final, self.final_repl = _combine(by["final"])
+        self.lead = re.compile("|".join(f"(?:{r.pattern})" for r in by["lead"]), re.I) if by["lead"] else None
+        self.long = [(re.compile(r.pattern, re.I), r.repl, r.min_len) for r in by["long"]]
+
+
+class RewriteEngine:
+    """
+    A compiled rule table. sentence() rewrites one raw sentence; rewrite() strips a
+    banned opener, splits a reply on sentence boundaries and rewrites each piece.
+    """
+
+    def __init__(self, rules: Iterable[Rule], openers: Sequence[str] = ()):
+        self.rules = tuple(rules)
+        unknown = {r.scope for r in self.rules} - set(_SCOPES)
+        if unknown:
+            raise ValueError(f"unknown rule scope(s): {sorted(unknown)}")
+        self.tags = frozenset(r.tag for r in self.rules if r.tag)
+        self.openers = re.compile("|".join(f"(?:{p})" for p in openers), re.I) if openers else None
+        self._passes: Dict[FrozenSet[str], _Pass] = {}
+
+    def select(self, tags: Optional[Iterable[str]]) -> _Pass:
+        active = self.tags.intersection(tags or ())
+        p = self._passes.get(active)
+        if p is None:
+            p = self._passes[active] = _Pass([r for r in self.rules if not r.tag or r.tag in active])
+        return p
+
+    def has_opener(self, text: str) -> bool:
+        return bool(self.openers and self.openers.search(text))
+
+    def strip_opener(self, text: str) -> str:
+        """Strip; drop the first sentence if the reply opens with a banned opener."""
+        t = text.strip()
+        if self.has_opener(t):
+            m = _FIRST_SENTENCE_RE.match(t)
+            if m:
+                t = t[m.end():]
+        return t
+
+    def sentence(self, raw: str, p: _Pass) -> str:
+        s = p.raw.sub(lambda m: p.raw_repl[m.lastgroup], raw) if p.raw else raw
+        s = " ".join(ln.strip() for ln in s.splitlines() if ln.strip())
+        shrink = 0
+        if p.main:
+            if p.long and p.final_names:
+                def repl(m: re.Match) -> str:
+                    nonlocal shrink
+                    rep = p.main_repl[m.lastgroup]
+                    if m.lastgroup in p.final_names:
+                        shrink += m.end() - m.start() - len(rep)
+                    return rep
+                s = p.main.sub(repl, s)
+            else:
+                s = p.main.sub(lambda m: p.main_repl[m.lastgroup], s)
+        if p.lead:
+            m = p.lead.match(s)
+            if m and m.end():
+                cut = m.end()
+                rest = s[cut:]
+                # Stripping a lead glued to the next word puts a word boundary at the new
+                # start that the final rules did not see; they ran after the strip before.
+                if p.final and rest and _WORD_RE.match(s, cut - 1) and _WORD_RE.match(rest):
+                    f = p.final.match(rest)
+                    if f:
+                        rep = p.final_repl[f.lastgroup]
+                        shrink += f.end() - len(rep)
+                        rest = rep + rest[f.end():]
+                s = rest
+        for pat, rep, min_len in p.long:
+            if len(s) + shrink > min_len:
+                s = pat.sub(rep, s, count=1)
+        return s
+
+    def split(self, text: str) -> List[str]:
+        """Raw sentences: each ends at . ! or ? (kept), the whitespace after it dropped."""
+        out, start = [], 0
+        for m in _BOUNDARY_RE.finditer(text):
+            out.append(text[start:m.start() + 1])
+            start = m.end()
+        out.append(text[start:])
+        return out
+
+    def rewrite(self, text: str, tags: Optional[Iterable[str]] = None) -> str:
+        p = self.select(tags)
+        return " ".join(self.sentence(s, p) for s in self.split(self.strip_opener(text)))
+
+
+@lru_cache(maxsize=256)
+def _name_re(user_name: str) -> re.Pattern:
+    return re.compile(rf"\b{re.escape(user_name)}\b", re.I)
+
+
+# -----------------------
+# Kirk punch-up filter (cadence + lexicon)
+# -----------------------
+KIRKISMS = {
+    r"\bno win\b": "no-win",
+    r"\breckless\b": "reckless—without a rope",
+    r"\bwe cannot\b": "we can’t",
+    r"\bdo not\b": "don’t",
+    r"\btherefore\b": "so",
+}
+BANNED_OPENERS = [
+    r"^as (?:an )?ai\b",
+    r"^as captain of the u\.?s\.?s\.? enterprise\b",
+    r"^in (?:this|that) context\b",
+    r"^ultimately\b",
+    r"^to be clear\b",
+    r"^in conclusion\b",
+]
+KIRK_RULES = [
+    *(Rule(pat, rep, "raw") for pat, rep in KIRKISMS.items()),
+    Rule(r"\b(?:perhaps|maybe|it seems|it may be|one must)\b", "let’s"),
+    Rule(r"\bI (?:would|might|would probably)\b", "I’ll"),
+    Rule(r"\bbut\b", "—but"),
+    Rule(r"^(?:In this context|Therefore|Ultimately|In conclusion),?\s*", "", "lead"),
+    Rule(r",\s+", " — ", "long", min_len=220),
+    Rule(r"\b(?:should|ought to)\b", "must", "final", tag="politics_now"),
+]
+KIRK = RewriteEngine(KIRK_RULES, BANNED_OPENERS)
+
+NEXT_MOVE = "  Next move: organize talent, protect facts, build lawful pressure—then act."
+_NEXT_MOVE_RE = re.compile(r"\bNext move:\b")
+
+def _address_user(text: str, user_name: Optional[str]) -> str:
+    if not user_name:
+        return text
+    if not _name_re(user_name).search(text):
+        text = f"{user_name}— " + text.lstrip()
+    return text
+
+def punch_up_kirk(text: str, user_name: Optional[str], tags: List[str]) -> str:
+    t = KIRK.rewrite(text, tags)
+    if "politics_now" in (tags or []):
+        if not _NEXT_MOVE_RE.search(t):
+            t = t.rstrip() + NEXT_MOVE
+    t = _address_user(t, user_name)
+    return t.strip()
+
+
+# -----------------------
+# Incremental (streaming) variant
+# -----------------------
+_OPENER_LOOKAHEAD = 64  # longer than any banned opener; enough to decide on the first sentence
+_OPENER_END_RE = re.compile(r"[.!?]\s*")
+
+class KirkStreamRewriter:
+    """
+    Feed raw token deltas in, get punched-up text out, one finished sentence at a time.
+
+    Runs the same engine as punch_up_kirk(): banned openers are decided on the head of
+    the reply and every finished sentence goes through KIRK.sentence(). Two things
+    cannot be known until the end of a batch reply, so the stream decides them early:
+      - the user-name salutation is added unless the name appears in the first sentence;
+      - the politics "Next move" line is appended at finish() if no sentence had one.
+    """
+
+    def __init__(self, user_name: Optional[str] = None, tags: Optional[List[str]] = None,
+                 engine: RewriteEngine = KIRK):
+        self.user_name = user_name
+        self.politics = "politics_now" in (tags or [])
+        self._engine = engine
+        self._pass = engine.select(tags)
+        self._buf = ""
+        self._head_done = False
+        self._emitted = 0
+        self._next_move_seen = False
+
+    def _head(self, final: bool) -> bool:
+        # Strip leading whitespace / a banned first sentence before anything is emitted.
+        self._buf = self._buf.lstrip()
+        if not final and len(self._buf) < _OPENER_LOOKAHEAD and not _BOUNDARY_RE.search(self._buf):
+            return False
+        if self._engine.has_opener(self._buf):
+            m = _OPENER_END_RE.search(self._buf)
+            if m is None or (m.end() == len(self._buf) and not final):
+                return False  # opener sentence (or its trailing whitespace) still arriving
+            self._buf = self._buf[m.end():]
+        self._head_done = True
+        return True
+
+    def _sentence(self, raw: str) -> str:
+        s = self._engine.sentence(raw, self._pass)
+        if self.politics and _NEXT_MOVE_RE.search(s):
+            self._next_move_seen = True
+        if not s:
+            return ""
+        if self._emitted == 0:
+            s = _address_user(s, self.user_name)
+        out = s if self._emitted == 0 else " " + s
+        self._emitted += 1
+        return out
+
+    def feed(self, delta: str) -> str:
+        # Everything before the buffer's last character was scanned by an earlier feed.
+        pos = max(len(self._buf) - 1, 0) if self._head_done else 0
+        self._buf += delta
+        if not self._head_done and not self._head(final=False):
+            return ""
+        out: List[str] = []
+        start = 0
+        for m in _BOUNDARY_RE.finditer(self._buf, pos):
+            out.append(self._sentence(self._buf[start:m.start() + 1]))
+            start = m.end()
+        self._buf = self._buf[start:]
+        return "".join(out)
+
+    def finish(self) -> str:
+        if not self._head_done:
+            self._head(final=True)
+        out = self._sentence(self._buf) if self._buf.strip() else ""
+        self._buf = ""
+        if self.politics and not self._next_move_seen:
+            out += NEXT_MOVE if self._emitted else NEXT_MOVE.lstrip()
+        return out
@@ -0,0 +1,154 @@
+# app/response_cache.py
+# Two-tier cache for persona replies: a bounded in-process LRU with TTL in front of a
+# local SQLite file. The SQLite tier survives restarts and is shared by every uvicorn
+# worker on the host (WAL mode, so readers never block the writer).
+
+from __future__ import annotations
+import hashlib, json, os, re, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import shared_state
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.getenv("DUNSEL_RESPONSE_CACHE_PATH", os.path.join(APP_DIR, "data", "response_cache.sqlite3"))
+CACHE_ENABLED = os.getenv("DUNSEL_RESPONSE_CACHE", "1") not in ("0", "false", "off")
+CACHE_TTL = float(os.getenv("DUNSEL_RESPONSE_CACHE_TTL", str(6 * 3600)))
+CACHE_SIZE = int(os.getenv("DUNSEL_RESPONSE_CACHE_SIZE", "2048"))
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    return _WS_RE.sub(" ", text or "").strip().lower()
+
+
+def make_key(
+    *,
+    persona: str,
+    model: str,
+    message: str,
+    tags: Iterable[str],
+    params: Dict[str, Any],
+) -> str:
+    """
+    Stable key for one persona request. `message` should already be normalized
+    (normalize_message(), or the Kosh headline preprocessor's output).
+    """
+    blob = json.dumps(
+        [persona, model, message, sorted(set(tags or [])), sorted(params.items())],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._mem: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._puts = 0
+        self.counters = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "stores": 0, "bypass": 0, "errors": 0}
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self._db = shared_state.connect(
+                    self.path,
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL);",
+                )
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return None
+        return self._db
+
+    def _remember(self, key: str, expires: float, value: Dict[str, Any]) -> None:
+        self._mem[key] = (expires, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                if hit[0] > now:
+                    self._mem.move_to_end(key)
+                    self.counters["hits_memory"] += 1
+                    return hit[1]
+                del self._mem[key]
+
+            db = self._conn()
+            row = None
+            if db is not None:
+                try:
+                    row = db.execute(
+                        "SELECT value, expires FROM responses WHERE key = ? AND expires > ?", (key, now)
+                    ).fetchone()
+                except sqlite3.Error:
+                    self.counters["errors"] += 1
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            self.counters["hits_disk"] += 1
+            return value
+
+    def contains(self, key: str) -> bool:
+        """Whether get() would hit, without counting a lookup or reordering the LRU."""
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None and hit[0] > now:
+                return True
+            db = self._conn()
+            if db is None:
+                return False
+            try:
+                return db.execute(
+                    "SELECT 1 FROM responses WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone() is not None
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return False
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires, value)
+            self.counters["stores"] += 1
+            db = self._conn()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires),
+                )
+                self._puts += 1
+                if self._puts % 256 == 0:
+                    db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+
+    def note_bypass(self) -> None:
+        self.counters["bypass"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        c = dict(self.counters)
+        hits = c["hits_memory"] + c["hits_disk"]
+        lookups = hits + c["misses"]
+        c["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        c["memory_entries"] = len(self._mem)
+        c["enabled"] = CACHE_ENABLED
+        return c
+
+
+cache = ResponseCache()
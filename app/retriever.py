@@ -7,12 +7,18 @@
 # Body may include QUOTES / SCENE TEXTURE / CADENCE NOTES / VOICE SUMMARY, etc.
 
 from __future__ import annotations
-import os, glob, re, time, random, hashlib
-from functools import lru_cache
+import os, glob, heapq, re, time, random, hashlib, threading
+from bisect import bisect_left
+from collections import Counter
 from typing import List, Dict, Any
 
+import shard_index
+
 SHARDS_DIR = os.path.join(os.path.dirname(__file__), "persona", "shards")
 HEADER_RE = re.compile(r"^\s*#\s*(\w+)\s*:\s*(.*)\s*$")
+# Ranks scanned by the first step of shard selection; each further step doubles it
+# (see choose_shards_for_request).
+SCAN_STEP = int(os.getenv("DUNSEL_SHARD_SCAN_STEP", "64"))
 
 def _safe_read(path: str) -> str:
     try:
@@ -64,35 +70,302 @@ def _mtime_of(path: str) -> float:
     except Exception:
         return 0.0
 
-@lru_cache(maxsize=1)
-def load_all_shards() -> List[Dict[str, Any]]:
-    files = sorted(glob.glob(os.path.join(SHARDS_DIR, "*.txt")))
-    shards: List[Dict[str, Any]] = []
-    for fp in files:
-        text = _safe_read(fp)
-        if not text:
-            continue
-        headers, body = _split_header_body(text)
-        if not headers and not body:
-            continue
-        sid = headers.get("id") or os.path.splitext(os.path.basename(fp))[0]
-        shard = {
-            "id": sid,
+def _parse_shard(fp: str, mtime: float) -> Dict[str, Any] | None:
+    text = _safe_read(fp)
+    if not text:
+        return None
+    headers, body = _split_header_body(text)
+    if not headers and not body:
+        return None
+    sid = headers.get("id") or os.path.splitext(os.path.basename(fp))[0]
+    return {
+        "id": sid,
+        "path": fp,
+        "headers": headers,
+        "body": body,
+        "priority": _priority_of(headers),
+        "keywords": _infer_keywords(headers),
+        "mtime": mtime,
+    }
+
+def _state_from_index(idx: shard_index.ShardIndex) -> Dict[str, tuple]:
+    # path -> (mtime, size, shard | None), seeded from the prebuilt index so the first
+    # poll only re-parses files that changed since the image/index was built.
+    state: Dict[str, tuple] = {}
+    shards_root = os.path.abspath(SHARDS_DIR)
+    for rel, mtime, size in idx.sources:
+        fp = shard_index.abs_path(rel)
+        if os.path.dirname(fp) == shards_root:
+            state[fp] = (mtime, size, None)
+    for i, d in idx.iter_docs(kind="shard"):
+        fp = shard_index.abs_path(d["path"])
+        state[fp] = (d["mtime"], d["size"], {
+            "id": d["id"],
             "path": fp,
-            "headers": headers,
-            "body": body,
-            "priority": _priority_of(headers),
-            "keywords": _infer_keywords(headers),
-            "mtime": _mtime_of(fp),
-        }
-        shards.append(shard)
-    return shards
+            "headers": d["headers"],
+            "body": idx.doc_body(i),
+            "priority": d["priority"],
+            "keywords": d["keywords"],
+            "mtime": d["mtime"],
+        })
+    return state
+
+# -------------------------------------------------------------------
+# Token estimates + context budgets
+# -------------------------------------------------------------------
+
+# Prompt tokens allowed for retrieved material per request; DUNSEL_CONTEXT_BUDGET_<PERSONA>
+# overrides it for one persona (e.g. DUNSEL_CONTEXT_BUDGET_KIRK=1200).
+CONTEXT_BUDGET = int(os.getenv("DUNSEL_CONTEXT_BUDGET", "1200"))
+# Sections kept, in this order, when a whole shard does not fit the style budget.
+STYLE_SECTIONS = [s.strip().upper() for s in os.getenv("DUNSEL_STYLE_SECTIONS", "CADENCE NOTES,QUOTES").split(",") if s.strip()]
+# A hit is only trimmed to fit if at least this many tokens are left for it.
+MIN_TRIM_TOKENS = int(os.getenv("DUNSEL_CONTEXT_MIN_TRIM", "48"))
+
+STYLE_PREAMBLE = (
+    "The following scene shards are cadence/diction exemplars—emulate voice; do not quote long passages back to the user."
+)
+
+_PIECE_RE = re.compile(r"[^\W\d_]+|\d{1,3}|\S")
+_SECTION_RE = re.compile(r"^[A-Z][A-Z /&-]+$")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Tokenizer-free estimate of BPE tokens: a word is one token per 6 letters, digits
+    go in groups of three, every other non-space character is one. Close enough to
+    budget prompts with; usage reported by the provider stays the ground truth.
+    """
+    n = 0
+    for p in _PIECE_RE.findall(text or ""):
+        n += 1 + (len(p) - 1) // 6 if p[0].isalpha() else 1
+    return n
+
+def context_budget(persona: str | None) -> int:
+    if persona:
+        v = os.getenv(f"DUNSEL_CONTEXT_BUDGET_{persona.upper()}")
+        if v:
+            return int(v)
+    return CONTEXT_BUDGET
+
+def _style_parts(shard: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pre-rendered pieces of a shard's style-block entry with their token counts:
+    the header lines, the whole body, and the body split at its SECTION headings.
+    """
+    h = shard["headers"]
+    head = [f"[shard:{h.get('id', shard['id'])}]"]
+    if h.get("source"): head.append(f"SOURCE: {h['source']}")
+    if h.get("notes"):  head.append(f"NOTES: {h['notes']}")
+    head_text = "\n".join(head)
+    body = shard["body"].strip()
+    sections: Dict[str, List[str]] = {}
+    cur: List[str] | None = None
+    for line in body.splitlines():
+        if _SECTION_RE.match(line.strip()):
+            cur = sections.setdefault(line.strip(), [line.strip()])
+        elif cur is not None:
+            cur.append(line)
+    return {
+        "head": head_text,
+        "head_tokens": estimate_tokens(head_text),
+        "body": body,
+        "body_tokens": estimate_tokens(body),
+        "sections": {
+            name: (text, estimate_tokens(text))
+            for name, text in ((n, "\n".join(ls).strip()) for n, ls in sections.items())
+        },
+    }
+
+def _trim_to_tokens(text: str, tokens: int, budget: int) -> str:
+    # Cut at the last sentence end inside the budget (scaled by characters).
+    if tokens <= budget:
+        return text
+    cut = text[:max(0, len(text) * budget // max(tokens, 1))]
+    end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    return cut[:end + 1] if end > 0 else ""
+
+def fit_hits(hits: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """
+    Best-first hits that fit `budget` tokens. A hit that doesn't fit whole is cut at
+    a sentence boundary when at least MIN_TRIM_TOKENS remain, otherwise skipped in
+    favour of shorter ones further down. Each kept hit gets its "tokens".
+    """
+    out: List[Dict[str, Any]] = []
+    left = budget
+    for h in hits:
+        title_tokens = estimate_tokens(h.get("title", "")) + 3  # "[i] title: "
+        tokens = title_tokens + estimate_tokens(h["text"])
+        if tokens <= left:
+            out.append(dict(h, tokens=tokens))
+            left -= tokens
+        elif left - title_tokens >= MIN_TRIM_TOKENS:
+            text, room = h["text"], left - title_tokens
+            est = tokens - title_tokens
+            while text and est > room:  # the cut is scaled by characters, so re-check it
+                text = _trim_to_tokens(text, est, room)
+                est = estimate_tokens(text)
+            if text:
+                tokens = title_tokens + est
+                out.append(dict(h, text=text, tokens=tokens, trimmed=True))
+                left -= tokens
+    return out
+
+# -------------------------------------------------------------------
+# Corpus snapshot + hot reload
+# -------------------------------------------------------------------
+
+class ShardCorpus:
+    """
+    Immutable snapshot of the shard directory. A reload builds a new one off to the side
+    and swaps the module reference; readers keep whatever snapshot they already hold.
+
+    Selection structures are built here, once per snapshot:
+      by_priority  positions ordered by (-priority, -mtime, position), i.e. the stable
+                   sort choose_shards_for_request() has always used
+      inverted     keyword -> ranks (indexes into by_priority) of the shards carrying
+                   it, ascending, so the head of each list holds its best shards
+    """
+    __slots__ = ("shards", "files", "inverted", "by_priority", "max_priority")
+
+    def __init__(self, files: Dict[str, tuple]):
+        self.files = files  # path -> (mtime, size, shard | None)
+        self.shards: List[Dict[str, Any]] = [files[fp][2] for fp in sorted(files) if files[fp][2] is not None]
+        for sh in self.shards:
+            if "keyword_set" not in sh:
+                sh["keyword_set"] = frozenset(sh["keywords"])
+            if "style" not in sh:
+                sh["style"] = _style_parts(sh)
+        self.by_priority: List[int] = sorted(
+            range(len(self.shards)),
+            key=lambda p: (-self.shards[p]["priority"], -self.shards[p]["mtime"], p),
+        )
+        self.inverted: Dict[str, List[int]] = {}
+        for r, pos in enumerate(self.by_priority):
+            for kw in self.shards[pos]["keyword_set"]:
+                self.inverted.setdefault(kw, []).append(r)
+        self.max_priority = self.shards[self.by_priority[0]]["priority"] if self.shards else 0
+
+_CORPUS: ShardCorpus | None = None
+_RELOAD_LOCK = threading.Lock()
+SELECT_STATS: Dict[str, int] = {"queries": 0, "postings_read": 0}
+RELOAD_STATS: Dict[str, Any] = {
+    "reloads": 0, "files_reparsed": 0, "last_reload_at": None,
+    "last_duration_ms": None, "last_error": None, "polls": 0,
+}
+
+def _scan_dir() -> Dict[str, tuple]:
+    out: Dict[str, tuple] = {}
+    for fp in glob.glob(os.path.join(SHARDS_DIR, "*.txt")):
+        try:
+            st = os.stat(fp)
+        except OSError:
+            continue
+        out[os.path.abspath(fp)] = (st.st_mtime, st.st_size)
+    return out
+
+def current_corpus() -> ShardCorpus:
+    global _CORPUS
+    corpus = _CORPUS
+    if corpus is None:
+        with _RELOAD_LOCK:
+            if _CORPUS is None:
+                # Prefer the prebuilt index (build_index.py); fall back to parsing the files.
+                idx = shard_index.open_index()
+                files = _state_from_index(idx) if idx is not None else {}
+                _CORPUS = ShardCorpus(files)
+            corpus = _CORPUS
+        if not corpus.files:
+            refresh_shards()
+            corpus = _CORPUS
+    return corpus
+
+def load_all_shards() -> List[Dict[str, Any]]:
+    return current_corpus().shards
+
+def refresh_shards() -> bool:
+    """
+    Stat the shard directory, re-parse only files whose (mtime, size) changed, and
+    atomically swap in a new snapshot if anything differs. Returns True on swap.
+    """
+    with _RELOAD_LOCK:
+        t0 = time.perf_counter()
+        RELOAD_STATS["polls"] += 1
+        old = _CORPUS.files if _CORPUS is not None else {}
+        seen = _scan_dir()
+        if _CORPUS is not None and seen.keys() == old.keys() and all(
+            old[fp][:2] == seen[fp] for fp in seen
+        ):
+            return False
+        try:
+            files: Dict[str, tuple] = {}
+            reparsed = 0
+            for fp, (mtime, size) in seen.items():
+                prev = old.get(fp)
+                if prev is not None and prev[:2] == (mtime, size):
+                    files[fp] = prev
+                else:
+                    files[fp] = (mtime, size, _parse_shard(fp, mtime))
+                    reparsed += 1
+            new = ShardCorpus(files)
+        except Exception as e:  # keep serving the old snapshot
+            RELOAD_STATS["last_error"] = f"{type(e).__name__}: {e}"
+            return False
+        _swap(new)
+        RELOAD_STATS["reloads"] += 1
+        RELOAD_STATS["files_reparsed"] += reparsed
+        RELOAD_STATS["last_reload_at"] = time.time()
+        RELOAD_STATS["last_duration_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        RELOAD_STATS["last_error"] = None
+        return True
+
+def _swap(new: ShardCorpus) -> None:
+    global _CORPUS
+    _CORPUS = new
+
+class ShardWatcher:
+    """
+    Background thread polling the shard directory every `interval` seconds, and the
+    index file, so a rebuild by any worker is mapped by all of them.
+    Polling (rather than inotify) also works on the read-only bind mount docker-compose
+    uses, where host-side edits do not always raise events inside the container.
+    """
+
+    def __init__(self, interval: float = float(os.getenv("DUNSEL_SHARD_POLL_SECONDS", "2.0"))):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                shard_index.refresh_index()
+                refresh_shards()
+            except Exception as e:
+                RELOAD_STATS["last_error"] = f"{type(e).__name__}: {e}"
+
+    def start(self) -> "ShardWatcher":
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="shard-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+def reload_stats() -> Dict[str, Any]:
+    out = dict(RELOAD_STATS)
+    corpus = _CORPUS
+    out["shards"] = len(corpus.shards) if corpus is not None else 0
+    return out
 
 def _score_match(shard: Dict[str, Any], want_words: List[str]) -> float:
     # Simple lexical overlap score for when tags/words are provided.
     if not want_words:
         return 0.0
-    kw = set(shard.get("keywords", []))
+    kw = shard.get("keyword_set") or frozenset(shard.get("keywords", []))
     w  = set(want_words)
     overlap = len(kw & w)
     return overlap + 0.01 * shard["priority"]
@@ -111,25 +384,86 @@ def choose_shards_for_request(
     Pick up to k shards. If words provided (e.g., tags or episode names), prefer shards whose
     headers overlap lexically. Otherwise: take a blend of high-priority and recency, seeded by hint.
     """
-    corpus = load_all_shards()
+    snap = current_corpus()
+    corpus = snap.shards
     if not corpus:
         return []
 
     words_norm = [w.lower() for w in (words or []) if w]
 
-    # 1) If we have words, rank by lexical score + priority
-    scored = []
+    # 1) If we have words, rank by lexical score + priority.
+    #    Only shards on a matching posting list are scored; everything else scores
+    #    0.01 * priority, which is exactly snap.by_priority order, so the top of that
+    #    list fills in behind the matches. Keys match the old full sort, with the
+    #    position as the final tie-break that the stable sort used to provide.
+    #    Posting lists are in by_priority order, so they are read in rank steps
+    #    (SCAN_STEP, doubling): overlap counts are exact for every rank scanned so far,
+    #    and the scan stops once no shard further down could place, i.e. k shards
+    #    already match at least as many words as there are unfinished lists (or score
+    #    more than such a shard could reach). The result is always exact; the work is
+    #    at most the query's posting lists, and less when enough strong matches sit
+    #    near their heads.
     if words_norm:
-        for s in corpus:
-            scored.append(( _score_match(s, words_norm), s ))
-        scored.sort(key=lambda x: (-x[0], -x[1]["priority"], -x[1]["mtime"]))
-        picked = [s for _, s in scored[:k]]
+        wset = set(words_norm)
+        order = snap.by_priority
+        lists = [snap.inverted[w] for w in wset if w in snap.inverted]
+
+        def key(pos: int, n: int):
+            s = corpus[pos]
+            return (-(n + 0.01 * s["priority"]), -s["priority"], -s["mtime"], pos)
+
+        # For one overlap count the key orders shards by rank, so only the k best-ranked
+        # shards of each count can place; scanning in rank order finds them first.
+        top: Dict[int, List[int]] = {}
+        cuts = [0] * len(lists)
+        edge, read = 0, 0
+        while True:
+            edge = max(2 * edge, SCAN_STEP)
+            seg: Counter = Counter()
+            for i, plist in enumerate(lists):
+                j = bisect_left(plist, edge, cuts[i])
+                seg.update(plist[cuts[i]:j])
+                read += j - cuts[i]
+                cuts[i] = j
+            # Single matches are the bulk of a segment and only their k best can place.
+            ones = top.setdefault(1, [])
+            for r in sorted(seg):
+                if len(ones) >= k:
+                    break
+                if seg[r] == 1:
+                    ones.append(r)
+            for r in sorted(r for r, c in seg.items() if c > 1):
+                ranks = top.setdefault(seg[r], [])
+                if len(ranks) < k:
+                    ranks.append(r)
+            # Most words any unscanned shard can match, and the best score it can reach.
+            left = sum(c < len(plist) for c, plist in zip(cuts, lists))
+            if left == 0:
+                break
+            if sum(len(rs) for n, rs in top.items() if n >= left) >= k:
+                break
+            best = heapq.nsmallest(k, (key(order[r], n) for n, rs in top.items() for r in rs))
+            if len(best) >= k and -best[-1][0] > left + 0.01 * corpus[order[edge]]["priority"]:
+                break
+        SELECT_STATS["queries"] += 1
+        SELECT_STATS["postings_read"] += read
+
+        cands = heapq.nsmallest(k, (key(order[r], n) for n, rs in top.items() for r in rs))
+        # Shards matching no word score 0.01 * priority; they can only place when fewer
+        # than k matches beat the best of them.
+        fill = []
+        if len(cands) < k or -cands[-1][0] <= 0.01 * snap.max_priority:
+            for pos in snap.by_priority:
+                if len(fill) >= k:
+                    break
+                if corpus[pos]["keyword_set"].isdisjoint(wset):
+                    fill.append(key(pos, 0))
+        picked = [corpus[c[3]] for c in heapq.nsmallest(k, cands + fill)]
         if picked:
             return picked
 
     # 2) Otherwise, mix top priority and recency, then sample deterministically
-    by_priority = sorted(corpus, key=lambda s: (-s["priority"], -s["mtime"]))
-    top_pool = by_priority[:max(6, k)]  # small front pool
+    top_pool = [corpus[p] for p in snap.by_priority[:max(6, k)]]  # small front pool
 
     rnd = random.Random(_seed_from(hint))
     if len(top_pool) <= k:
@@ -141,32 +475,82 @@ def choose_shards_for_request(
     sampled = rnd.sample(rest, k - 1)
     return first + sampled
 
-def render_style_block(
-    *, words: List[str] | None = None, k: int = 3, hint: str | None = None
-) -> str:
+def retrieve(
+    query: str, tags: List[str] | None = None, k: int = 8, persona: str | None = None
+) -> List[Dict[str, Any]]:
+    """
+    BM25 over shard bodies and archive chunks (the prebuilt index), best first.
+    Tags are folded into the query terms. Each hit carries the fields chat endpoints
+    turn into citations: id/title/type/source_id/tags/text, plus score.
     """
-    Return the text block to tuck into the system prompt.
+    idx = shard_index.open_index()
+    if idx is None:
+        return []
+    tokens = shard_index.tokenize(" ".join([query or ""] + [t.replace("_", " ") for t in (tags or [])]))
+    hits: List[Dict[str, Any]] = []
+    for cid, score in idx.bm25(tokens, k=k, persona=persona):
+        d = idx.docs[idx.chunk_doc(cid)]
+        hits.append({
+            "id": f"{d['id']}#{cid}",
+            "title": d.get("title", d["id"]),
+            "type": d.get("type", "shard"),
+            "source_id": d.get("source_id", ""),
+            "tags": d.get("tags", []),
+            "text": idx.chunk_text(cid),
+            "score": round(score, 4),
+        })
+    return hits
+
+def pack_style_block(
+    *, words: List[str] | None = None, k: int = 3, hint: str | None = None,
+    budget: int | None = None, persona: str | None = "kirk",
+) -> tuple[str, Dict[str, Any]]:
     """
+    Style block for the system prompt, packed under `budget` tokens (default: the
+    persona's context budget). The chosen shards go in best first; one that doesn't
+    fit whole contributes its STYLE_SECTIONS that do, and one with nothing that fits is
+    dropped. Returns (text, {"tokens", "shards", "trimmed", "dropped", "budget"}).
+    """
+    budget = context_budget(persona) if budget is None else budget
+    info = {"tokens": 0, "shards": 0, "trimmed": 0, "dropped": 0, "budget": budget}
     shards = choose_shards_for_request(words=words, k=k, hint=hint)
-    out_lines: List[str] = []
     if not shards:
-        return ""  # nothing found; safe no-op
+        return "", info  # nothing found; safe no-op
 
     # Gentle nudge so quotes guide cadence without being parroted.
-    out_lines.append(
-        "The following scene shards are cadence/diction exemplars—emulate voice; do not quote long passages back to the user."
-    )
-    out_lines.append("")
-
+    used = estimate_tokens(STYLE_PREAMBLE)
+    out_lines: List[str] = [STYLE_PREAMBLE, ""]
     for s in shards:
-        h = s["headers"]
-        title = h.get("id", s["id"])
-        source = h.get("source", "")
-        notes = h.get("notes", "")
-        out_lines.append(f"[shard:{title}]")
-        if source: out_lines.append(f"SOURCE: {source}")
-        if notes:  out_lines.append(f"NOTES: {notes}")
-        out_lines.append(s["body"].strip())
-        out_lines.append("")  # spacer
-
-    return "\n".join(out_lines).strip()
+        st = s.get("style") or _style_parts(s)
+        cost = st["head_tokens"] + st["body_tokens"]
+        if used + cost <= budget:
+            out_lines += [st["head"], st["body"], ""]
+            used += cost
+            info["shards"] += 1
+            continue
+        picked, cost = [], st["head_tokens"]
+        for name in STYLE_SECTIONS:
+            sec = st["sections"].get(name)
+            if sec is not None and used + cost + sec[1] <= budget:
+                picked.append(sec[0])
+                cost += sec[1]
+        if picked:
+            out_lines += [st["head"], *picked, ""]
+            used += cost
+            info["shards"] += 1
+            info["trimmed"] += 1
+        else:
+            info["dropped"] += 1
+
+    if not info["shards"]:
+        return "", info
+    info["tokens"] = used
+    return "\n".join(out_lines).strip(), info
+
+def render_style_block(
+    *, words: List[str] | None = None, k: int = 3, hint: str | None = None, budget: int | None = None
+) -> str:
+    """
+    Return the text block to tuck into the system prompt (see pack_style_block).
+    """
+    return pack_style_block(words=words, k=k, hint=hint, budget=budget)[0]
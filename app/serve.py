@@ -0,0 +1,133 @@
+# app/serve.py
+# Pre-forking multi-worker launcher:
+#
+#     python serve.py --workers 4 --host 0.0.0.0 --port 8080
+#
+# `uvicorn --workers N` spawns N fresh interpreters that each import FastAPI, openai,
+# numpy, feedparser, ... and load the corpus, prompts and static assets on their own:
+# ~90 MB RSS apiece, nearly all of it the same library code. Here the parent does that
+# once, moves everything it allocated out of the GC's reach (gc.freeze(), so collections
+# in the workers don't write to those pages), binds the listening socket and forks the
+# workers, which share those pages copy-on-write. Each worker then runs the normal
+# lifespan (warm-up, shard watcher, upstream pool) on its own event loop.
+#
+# The parent only supervises: a worker that exits is replaced (at most once a second
+# per slot), SIGTERM / SIGINT are passed on and the parent exits once all are gone.
+# Mutable state the workers share (response cache, sessions, feed cache, upstream rate
+# counter) is in SQLite, see shared_state.py. The parent has no readiness page of its
+# own: connections queue in the listen backlog until the first worker accepts them.
+
+from __future__ import annotations
+import argparse, gc, os, signal, socket, sys, threading, time, traceback
+from typing import Dict
+
+import uvicorn
+
+BACKLOG = int(os.getenv("DUNSEL_BACKLOG", "2048"))
+RESPAWN_INTERVAL = 1.0
+
+
+def bind(host: str, port: int, backlog: int = BACKLOG) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload() -> None:
+    """Import the app and load what every worker would load identically anyway."""
+    import server
+    import prompts
+    import retriever
+
+    retriever.current_corpus()
+    for path in sorted(server.PERSONA_DIR.glob("*.md")):
+        prompts.get_prompt(path.stem)
+    server.STATIC.preload()
+    if threading.active_count() > 1:
+        # Threads don't survive fork(); whatever they guard could be left locked.
+        sys.exit(f"serve.py: {threading.active_count()} threads running after preload; refusing to fork")
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(sock: socket.socket, args) -> None:
+    import server
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(server.app, log_level=args.log_level, timeout_keep_alive=args.timeout_keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, sock: socket.socket, args):
+        self.sock, self.args = sock, args
+        self.children: Dict[int, int] = {}   # pid -> slot
+        self.started: Dict[int, float] = {}  # slot -> last fork time
+        self.stopping = False
+
+    def spawn(self, slot: int) -> None:
+        wait = self.started.get(slot, 0.0) + RESPAWN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self.started[slot] = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock, self.args)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.children[pid] = slot
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for slot in range(self.args.workers):
+            self.spawn(slot)
+        print(f"[serve] {self.args.workers} workers on {self.args.host}:{self.args.port} "
+              f"(pids {sorted(self.children)})", file=sys.stderr)
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            slot = self.children.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            print(f"[serve] worker {pid} exited (status {status}); restarting", file=sys.stderr)
+            self.spawn(slot)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the app in N pre-forked uvicorn workers.")
+    ap.add_argument("--workers", type=int, default=int(os.getenv("DUNSEL_WORKERS", str(os.cpu_count() or 1))))
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--log-level", default="info")
+    ap.add_argument("--timeout-keep-alive", type=int, default=5)
+    args = ap.parse_args()
+
+    sock = bind(args.host, args.port)
+    preload()
+    Supervisor(sock, args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 # server.py (header)
-import os, re
 from typing import List, Optional
 from pathlib import Path
 
@@ -8,7 +7,8 @@ from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-from retriever import render_style_block
+import llm
+from punchup import punch_up_kirk
 
 # -----------------------
 # App & static mount (safe)
@@ -34,16 +34,9 @@ except Exception:
         return []  # no shards yet
 
 # -----------------------
-# OpenAI client
+# OpenAI client (shared async pool, see llm.py)
 # -----------------------
-def _make_client():
-    from openai import OpenAI
-    key = os.environ.get("OPENAI_API_KEY")
-    if not key:
-        raise RuntimeError("OPENAI_API_KEY not set")
-    return OpenAI(api_key=key)
-
-_CHAT_MODEL = os.environ.get("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+_CHAT_MODEL = llm.MODEL
 
 # -----------------------
 # KIRK voice + politics override
@@ -96,77 +89,10 @@ FEW_SHOTS = [
     {"role":"assistant","content":"For bullies—briefly. For civilizations—never. Truth bends, institutions rot, talent flees. In a crisis you need trust, not fear. Fear breaks on contact."},
 ]
 
-# -----------------------
-# Punch-up filter (cadence + lexicon)
-# -----------------------
-KIRKISMS = {
-    r"\bno win\b": "no-win",
-    r"\breckless\b": "reckless—without a rope",
-    r"\bwe cannot\b": "we can’t",
-    r"\bdo not\b": "don’t",
-    r"\btherefore\b": "so",
-}
-BANNED_OPENERS = [
-    r"^as (?:an )?ai\b",
-    r"^as captain of the u\.?s\.?s\.? enterprise\b",
-    r"^in (?:this|that) context\b",
-    r"^ultimately\b",
-    r"^to be clear\b",
-    r"^in conclusion\b",
-]
-
-def _ban_openers(text: str) -> str:
-    t = text.strip()
-    for pat in BANNED_OPENERS:
-        if re.search(pat, t, flags=re.I):
-            t = re.sub(r"^.*?[.!?]\s*", "", t, flags=re.S)
-            break
-    return t
-
-def _apply_kirkisms(text: str) -> str:
-    for pat, rep in KIRKISMS.items():
-        text = re.sub(pat, rep, text, flags=re.I)
-    return text
-
-def _tighten_sentences(text: str) -> str:
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    text = " ".join(lines)
-    parts = re.split(r"(?<=[.!?])\s+", text)
-    out = []
-    for s in parts:
-        s = s.strip()
-        s = re.sub(r"\b(perhaps|maybe|it seems|it may be|one must)\b", "let’s", s, flags=re.I)
-        s = re.sub(r"\bI (?:would|might|would probably)\b", "I’ll", s, flags=re.I)
-        s = re.sub(r"\bbut\b", "—but", s, flags=re.I)
-        s = re.sub(r"^(In this context|Therefore|Ultimately|In conclusion),?\s*", "", s, flags=re.I)
-        if len(s) > 220:
-            s = re.sub(r",\s+", " — ", s, count=1)
-        out.append(s)
-    return " ".join(out)
-
-def _address_user(text: str, user_name: Optional[str]) -> str:
-    if not user_name:
-        return text
-    if not re.search(rf"\b{re.escape(user_name)}\b", text, flags=re.I):
-        text = f"{user_name}— " + text.lstrip()
-    return text
-
-def punch_up_kirk(text: str, user_name: Optional[str], tags: List[str]) -> str:
-    t = _ban_openers(text)
-    t = _apply_kirkisms(t)
-    t = _tighten_sentences(t)
-    if "politics_now" in (tags or []):
-        t = re.sub(r"\b(should|ought to)\b", "must", t, flags=re.I)
-        if not re.search(r"\bNext move:\b", t):
-            t = t.rstrip() + "  Next move: organize talent, protect facts, build lawful pressure—then act."
-    t = _address_user(t, user_name)
-    return t.strip()
-
 # -----------------------
 # LLM call
 # -----------------------
-def call_llm(user_msg: str, context_snippets: List[str], tags: List[str], user_name: Optional[str] = None) -> str:
-    client = _make_client()
+async def call_llm(user_msg: str, context_snippets: List[str], tags: List[str], user_name: Optional[str] = None) -> str:
     style = style_from_tags(tags)
     ctx_blocks = []
     if context_snippets:
@@ -185,9 +111,9 @@ def call_llm(user_msg: str, context_snippets: List[str], tags: List[str], user_n
         "content": f"{ctx}\n\nQUESTION:\n{user_msg}\n\nRespond as Kirk. Be vivid; short paragraphs; em-dash cadence. If you draw on a shard, tag it inline like [1], [2]. End with one crisp next action if appropriate."
     })
 
-    resp = client.chat.completions.create(
+    resp = await llm.chat_completion(
+        messages,
         model=_CHAT_MODEL,
-        messages=messages,
         temperature=1.05,
         top_p=0.9,
         presence_penalty=1.0,
@@ -213,7 +139,7 @@ def health():
     return {"ok": True, "index_ready": INDEX_READY, "last_build_error": LAST_BUILD_ERROR}
 
 @app.post("/dunsel/api/chat/dunsel_kirk")
-def chat_kirk(payload: ChatIn = Body(...)):
+async def chat_kirk(payload: ChatIn = Body(...)):
     user_msg = (payload.message or "").strip()
     tags = payload.tags or []
     user_name = payload.user_name or "Josh"
@@ -221,7 +147,7 @@ def chat_kirk(payload: ChatIn = Body(...)):
         return JSONResponse({"reply": "Say again?", "citations": []})
     hits = retrieve(user_msg, tags, k=8) or []
     context = [h.get("text","") for h in hits[:6] if h.get("text")]
-    reply_text = call_llm(user_msg, context_snippets=context, tags=tags, user_name=user_name)
+    reply_text = await call_llm(user_msg, context_snippets=context, tags=tags, user_name=user_name)
     cites = [
         {
             "id": h.get("id",""),
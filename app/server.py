@@ -1,27 +1,68 @@
+import asyncio
+import json
 import os
+import secrets
+import sys
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List, Optional
-from .utils.kosh_headline import preprocess_headline_for_kosh, infer_tag_from_text
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, Request
+import boot
+boot.mark("server_import_start")
+
+from utils.kosh_headline import preprocess_headline_for_kosh, infer_tags_from_text
+
+from fastapi import FastAPI, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, PlainTextResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from openai import OpenAI
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+import openai
+
+from admission import ADMISSION, BULK, INTERACTIVE, Overloaded, Ticket
+import llm
+import metrics
+from batcher import BATCH_ENABLED, MicroBatcher
+import news
+import prompts
+import response_cache
+import retriever
+import sessions
+import shard_index
+import shared_state
+from static_cache import STATIC, CachedStaticFiles
+from singleflight import SingleFlight
+import story_index
+from prompts import PersonaPrompt
+from punchup import KirkStreamRewriter, punch_up_kirk
 
 # -------------------------------------------------------------------
 # Basic setup
 # -------------------------------------------------------------------
 
 BASE_DIR = Path(__file__).resolve().parent
-STATIC_DIR = BASE_DIR / "static"
 PERSONA_DIR = BASE_DIR / "persona"
 
-app = FastAPI()
 
-# Static files
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pick up added/edited shards from the (read-only) mount without a restart.
+    watcher = retriever.ShardWatcher().start()
+    # Load everything else in the background; /readyz flips when it is done.
+    warm = asyncio.create_task(warm_up())
+    yield
+    warm.cancel()
+    watcher.stop()
+    # Drain the shared upstream connection pool on shutdown.
+    await llm.aclose()
+    await news.fetcher.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Static files (in memory, precompressed, ETag/304; see static_cache.py)
+app.mount("/static", CachedStaticFiles(STATIC), name="static")
 
 # CORS (loose, but fine for your use case / local + CF tunnel)
 app.add_middleware(
@@ -32,12 +73,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-client = OpenAI()
-MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+# Per-stage timings -> Server-Timing header + /metrics (outermost, so it sees everything).
+app.add_middleware(metrics.MetricsMiddleware)
 
-# simple health flags
-INDEX_READY = True
-LAST_BUILD_ERROR: Optional[str] = None
+MODEL = llm.MODEL
+CACHE_ENABLED = response_cache.CACHE_ENABLED
+
+# Sampling params for persona chats (part of the response cache key).
+CHAT_PARAMS = {"temperature": 0.7, "max_tokens": 600}
+
+# Short headline takes that miss the cache are coalesced into multi-item calls.
+BATCHER = MicroBatcher(CHAT_PARAMS)
+
+# Identical requests already in flight share one upstream call (JSON and streams).
+FLIGHTS = SingleFlight()
+
+# Warm-up (see warm_up()): rebuild a stale index in a child process after start,
+# and open one upstream connection before the first chat needs it.
+BUILD_ON_START = os.getenv("DUNSEL_BUILD_ON_START", "1") not in ("0", "false", "off")
+PRECONNECT = os.getenv("DUNSEL_PRECONNECT", "1") not in ("0", "false", "off")
 
 
 # -------------------------------------------------------------------
@@ -48,18 +102,35 @@ class ChatRequest(BaseModel):
     message: str
     tags: List[str] = []
     user_name: Optional[str] = None
+    no_cache: bool = False  # skip the response cache for this request (read and write)
+    # Multi-turn: history is kept server-side under this client-chosen id (sessions.py).
+    session_id: Optional[str] = Field(None, pattern=sessions.SESSION_ID_PATTERN)
+    # Longest wait for an upstream slot before a 503 (admission.py); default per class.
+    deadline_ms: Optional[int] = Field(None, gt=0)
+
+
+class FeedsRequest(BaseModel):
+    feeds: List[str] = []
+
+
+class OpineRequest(BaseModel):
+    feeds: Optional[List[str]] = None  # default: the saved subscription list
+    max_items: int = 6
+    bridge_mode: bool = False
+    deadline_ms: Optional[int] = Field(None, gt=0)
 
 
 # -------------------------------------------------------------------
 # Persona loading
 # -------------------------------------------------------------------
 
-def load_persona(name: str) -> str:
+def load_persona(name: str) -> PersonaPrompt:
     """
-    Load persona markdown text from app/persona/<name>.md
+    Compiled prompt template for app/persona/<name>.md.
+    Held in memory; re-read only when the file's mtime/size change.
     """
-    path = PERSONA_DIR / f"{name}.md"
-    return path.read_text(encoding="utf-8")
+    with metrics.stage("persona"):
+        return prompts.get_prompt(name)
 
 
 # -------------------------------------------------------------------
@@ -78,89 +149,375 @@ def style_from_tags(tags: List[str]) -> str:
         )
     if "command" in tags:
         return "Be more directive and concise. Provide actionable guidance."
+    if "bridge" in tags:
+        return "Bridge cadence: one or two clipped sentences, as if reporting to the crew."
+    if "news" in tags:
+        return "React to the headline in two or three sentences. No preamble."
     return ""
 
 
 def build_messages(
-    persona_text: str,
+    persona: PersonaPrompt,
     user_message: str,
     tags: List[str],
     user_name: Optional[str],
-    persona_name: str,
+    hits: Optional[List[dict]] = None,
+    history: Tuple[str, List[dict]] = ("", []),
 ) -> List[dict]:
     """
     Build OpenAI chat messages given a persona, user input, and tags.
+    The persona's static prefix comes first and is byte-identical on every call,
+    so provider-side prompt caching can hit; per-request parts follow it.
+    `history` is a session's (summary, earlier turns), see session_history().
     """
-    style_hint = style_from_tags(tags)
+    with metrics.stage("build"):
+        return prompts.build_messages(
+            persona,
+            user_message,
+            style_hint=style_from_tags(tags),
+            user_name=user_name,
+            context=context_block(hits or []),
+            summary=history[0],
+            history=history[1],
+        )
 
-    system_intro = (
-        f"You are {persona_name}, a persistent persona running inside the Dunsel system. "
-        "Stay strictly in character. Do not mention being an AI, a model, or a persona. "
-        "Respond only as the character."
-    )
 
-    system_content = "\n\n".join(
-        [
-            system_intro,
-            "Persona specification:",
-            persona_text,
-            "",
-            "Additional style hint (optional, may be empty):",
-            style_hint,
-        ]
-    )
+# -------------------------------------------------------------------
+# Sessions (server-side multi-turn history, see sessions.py)
+# -------------------------------------------------------------------
 
-    user_name_label = user_name or "User"
+NO_HISTORY: Tuple[str, List[dict]] = ("", [])
 
-    user_content = f"{user_name_label} says:\n\n{user_message}"
 
-    messages: List[dict] = [
-        {"role": "system", "content": system_content},
-        {"role": "user", "content": user_content},
-    ]
+def has_history(history: Tuple[str, List[dict]]) -> bool:
+    return bool(history[0] or history[1])
+
 
-    return messages
+async def session_history(session_id: Optional[str], persona_id: str) -> Tuple[str, List[dict]]:
+    """(summary, turns) of the session's conversation with the persona; empty without one."""
+    if not session_id or not sessions.SESSIONS_ENABLED:
+        return NO_HISTORY
+    with metrics.stage("session"):
+        return await asyncio.to_thread(sessions.store.history, session_id, persona_id)
+
+
+async def session_record(
+    session_id: Optional[str], persona_id: str, message: str, user_name: Optional[str], reply: str
+) -> Dict[str, Any]:
+    """
+    Append the exchange to the session (compacting it in the background when it has
+    grown past the threshold); returns {"session": ...} for the response meta.
+    """
+    if not session_id or not sessions.SESSIONS_ENABLED or not reply:
+        return {}
+    with metrics.stage("session"):
+        info = await asyncio.to_thread(
+            sessions.store.append, session_id, persona_id, prompts.user_turn(message, user_name), reply
+        )
+    if not info:
+        return {}
+    sessions.store.maybe_compact(session_id, persona_id, info["history_tokens"])
+    return {"session": {"id": session_id, **info}}
 
 
 # -------------------------------------------------------------------
-# Routes: HTML front doors
+# Retrieval (BM25 over the prebuilt index)
 # -------------------------------------------------------------------
 
-@app.get("/", response_class=HTMLResponse)
-async def root(request: Request):
+RETRIEVE_K = int(os.getenv("DUNSEL_RETRIEVE_K", "3"))
+
+
+def retrieve_for(persona_id: str, message: str, tags: List[str]) -> List[dict]:
     """
-    Serve different HTML depending on hostname:
-    - kirk.casa204.net -> persona.html (Kirk UI)
-    - kosh.casa204.net -> kosh.html (Kosh UI)
-    - everything else  -> home.html (Dunsel hub)
+    Top hits for the persona, packed under its context token budget
+    (DUNSEL_CONTEXT_BUDGET[_<PERSONA>]); each carries its "tokens".
     """
-    host = request.headers.get("host", "")
+    with metrics.stage("retrieve"):
+        hits = retriever.retrieve(message, tags, k=RETRIEVE_K, persona=persona_id)
+        return retriever.fit_hits(hits, retriever.context_budget(persona_id))
+
+
+def context_tokens(hits: Optional[List[dict]]) -> int:
+    return sum(h.get("tokens", 0) for h in hits or [])
+
+
+def context_block(hits: List[dict]) -> str:
+    if not hits:
+        return ""
+    lines = ["Reference material (draw on it if relevant; tag what you use inline like [1]):", ""]
+    for i, h in enumerate(hits, 1):
+        lines.append(f"[{i}] {h['title']}: {h['text']}")
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def citations_from(hits: List[dict]) -> List[dict]:
+    return [
+        {
+            "id": h.get("id", ""),
+            "title": h.get("title", ""),
+            "type": h.get("type", "shard"),
+            "source_id": h.get("source_id", ""),
+            "tags": h.get("tags", []),
+        }
+        for h in hits
+    ]
+
+
+# -------------------------------------------------------------------
+# Upstream call
+# -------------------------------------------------------------------
 
-    if host.startswith("kirk.casa204.net"):
-        html_path = STATIC_DIR / "persona.html"
-    elif host.startswith("kosh.casa204.net"):
-        html_path = STATIC_DIR / "kosh.html"
+def request_key(persona_id: str, message: str, tags: List[str], params: dict) -> str:
+    """
+    Identity of a persona request: (persona, model, normalized message, tags, params).
+    Shared by the response cache and single-flight coalescing.
+    """
+    return response_cache.make_key(
+        persona=persona_id,
+        model=MODEL,
+        message=response_cache.normalize_message(message),
+        tags=tags,
+        params=params,
+    )
+
+
+def response_cache_key(
+    persona_id: str, message: str, tags: List[str], params: dict, bypass: bool = False
+) -> Optional[str]:
+    """
+    Cache key for one persona request, or None when caching is off for it.
+    """
+    if not CACHE_ENABLED:
+        return None
+    if bypass:
+        response_cache.cache.note_bypass()
+        return None
+    return request_key(persona_id, message, tags, params)
+
+
+def flight_key(
+    persona_id: str, message: str, tags: List[str], params: dict, bypass: bool = False
+) -> Optional[str]:
+    """
+    Single-flight key, or None for requests that asked for a fresh reply (no_cache).
+    """
+    return None if bypass else request_key(persona_id, message, tags, params)
+
+
+async def run_chat_with_persona(
+    *,
+    persona: PersonaPrompt,
+    message: str,
+    tags: List[str],
+    user_name: Optional[str],
+    hits: Optional[List[dict]] = None,
+    no_cache: bool = False,
+    cache_message: Optional[str] = None,
+    batch: bool = False,
+    history: Tuple[str, List[dict]] = NO_HISTORY,
+    priority: int = INTERACTIVE,
+    deadline_ms: Optional[int] = None,
+):
+    """
+    Build messages for a persona and await one completion on the shared async client,
+    going through the response cache first. Returns (reply, citations, meta).
+    `cache_message` is what the cache key is built from when it should differ from
+    the message sent (e.g. a headline without its outlet). With `batch`, a miss
+    waits briefly in the micro-batcher to share an upstream call with its neighbours.
+    A reply that depends on session history is neither cached, coalesced nor batched.
+    A miss first takes an upstream slot in the persona's admission lane at `priority`
+    (a batched miss shares its batch's slot); Overloaded (-> 503) if none is free
+    within `deadline_ms`.
+    """
+    params = CHAT_PARAMS
+    stateful = has_history(history)
+    no_cache = no_cache or stateful
+    key_message = cache_message or message
+    key = response_cache_key(persona.persona_id, key_message, tags, params, bypass=no_cache)
+    if key is not None:
+        with metrics.stage("cache_lookup"):
+            hit = response_cache.cache.get(key)
+        if hit is not None:
+            metrics.note("cache", "hit")
+            return hit["reply"], hit["citations"], {"cache": "hit"}
+
+    citations = citations_from(hits or [])
+
+    async def generate():
+        if batch and BATCH_ENABLED and not hits and not stateful:
+            # The batcher takes the admission slot, once per upstream call it makes.
+            with metrics.stage("upstream"):  # includes the batch window and admission wait
+                reply, size = await BATCHER.submit(
+                    persona, message, style_from_tags(tags), user_name, priority, deadline_ms
+                )
+            usage = {"batch": size}
+        else:
+            with metrics.stage("admission"):
+                ticket = await ADMISSION.acquire(persona.persona_id, priority, deadline_ms)
+            try:
+                messages = build_messages(persona, message, tags, user_name, hits, history)
+                with metrics.stage("upstream"):
+                    completion = await llm.chat_completion(messages, model=MODEL, **params)
+            finally:
+                ticket.release()
+            reply = (completion.choices[0].message.content or "").strip()
+            usage = prompts.record_usage(completion.usage)
+        if key is not None and reply:
+            response_cache.cache.put(key, {"reply": reply, "citations": citations})
+        return reply, usage
+
+    meta = {"cache": "miss" if key is not None else "bypass", "context_tokens": context_tokens(hits)}
+    metrics.note("cache", meta["cache"])
+    fkey = flight_key(persona.persona_id, key_message, tags, params, bypass=no_cache)
+    t0 = time.perf_counter()
+    if fkey is None:
+        (reply, usage), shared = await generate(), False
+    else:
+        (reply, usage), shared = await FLIGHTS.do(fkey, generate)
+    if shared:
+        metrics.record("coalesced", time.perf_counter() - t0)
+        meta["coalesced"] = True
     else:
-        html_path = STATIC_DIR / "home.html"
+        meta.update(usage)
+    return reply, citations, meta
 
-    if html_path.exists():
-        return HTMLResponse(html_path.read_text(encoding="utf-8"))
 
-    return PlainTextResponse(
-        "Dunsel online, but expected HTML file is missing.",
-        status_code=200,
+@app.exception_handler(openai.APITimeoutError)
+async def upstream_timeout(request: Request, exc: openai.APITimeoutError):
+    return JSONResponse({"error": "Upstream timed out."}, status_code=504)
+
+
+@app.exception_handler(openai.APIConnectionError)
+async def upstream_unreachable(request: Request, exc: openai.APIConnectionError):
+    return JSONResponse({"error": "Upstream unreachable."}, status_code=502)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    return JSONResponse(
+        {"error": "Busy, try again shortly.", "retry_after": exc.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
     )
 
 
+async def admit_stream(
+    persona_id: str, deadline_ms: Optional[int], cache_key: Optional[str], flight: Optional[str]
+) -> Optional[Ticket]:
+    """
+    Upstream slot for a stream, taken before the 200 goes out so a full lane can still
+    answer 503. None when the reply will come from the cache or a stream already running.
+    """
+    if (cache_key and response_cache.cache.contains(cache_key)) or (flight and FLIGHTS.running(flight)):
+        return None
+    with metrics.stage("admission"):
+        return await ADMISSION.acquire(persona_id, INTERACTIVE, deadline_ms)
+
+
+# -------------------------------------------------------------------
+# Warm-up and readiness
+# -------------------------------------------------------------------
+
+WARMUP: Dict[str, Any] = {"state": "pending", "stages": {}, "errors": {}}
+
+
+async def _rebuild_index() -> None:
+    """
+    Incremental build_index.py in a child process (it forks its own parse workers),
+    replacing the old `build_index.py ; uvicorn` entrypoint. A rewritten index is
+    swapped in; an up-to-date one is left alone. One worker on the host builds; the
+    others skip it and pick the new file up through their ShardWatcher.
+    """
+    with shared_state.file_lock(shard_index.INDEX_PATH + ".lock") as held:
+        if not held:
+            WARMUP["index_build"] = "another worker"
+            return
+        before = shard_index.index_stamp()
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, str(BASE_DIR / "build_index.py"), "-q",
+            cwd=str(BASE_DIR), stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, err = await proc.communicate()
+        except asyncio.CancelledError:
+            proc.kill()
+            raise
+        if proc.returncode:
+            raise RuntimeError(err.decode("utf-8", "replace").strip() or f"exit status {proc.returncode}")
+        WARMUP["index_build"] = "built"
+        if shard_index.index_stamp() != before:
+            shard_index.reopen_index()
+
+
+async def _warm_prompts() -> None:
+    for path in sorted(PERSONA_DIR.glob("*.md")):
+        prompts.get_prompt(path.stem)
+
+
+async def _warm_upstream() -> None:
+    if PRECONNECT:
+        await llm.preconnect()
+    else:
+        llm.get_client()
+
+
+WARMUP_STAGES = [
+    # mmap the prebuilt index; a missing one is reported as index_ready=false, not an error
+    ("index", lambda: asyncio.to_thread(shard_index.open_index)),
+    ("corpus", lambda: asyncio.to_thread(retriever.current_corpus)),
+    ("prompts", _warm_prompts),
+    ("static", lambda: asyncio.to_thread(STATIC.preload)),
+    ("sessions", lambda: asyncio.to_thread(sessions.store.sweep)),
+    ("upstream", _warm_upstream),
+]
+if BUILD_ON_START:
+    WARMUP_STAGES.append(("index_build", _rebuild_index))
+
+
+async def warm_up() -> None:
+    """
+    Run each warm-up stage once, timing it. A failing stage is recorded and skipped,
+    since chat still works without it (e.g. no index, provider unreachable for now).
+    """
+    WARMUP["state"] = "running"
+    t_start = time.perf_counter()
+    for name, fn in WARMUP_STAGES:
+        t0 = time.perf_counter()
+        try:
+            await fn()
+        except Exception as e:
+            WARMUP["errors"][name] = f"{type(e).__name__}: {e}"
+            print(f"[warmup] {name} failed: {WARMUP['errors'][name]}", file=sys.stderr)
+        WARMUP["stages"][name] = round((time.perf_counter() - t0) * 1000, 1)
+    WARMUP["seconds"] = round(time.perf_counter() - t_start, 3)
+    WARMUP["state"] = "ready"
+    boot.mark("ready")
+
+
+def is_ready() -> bool:
+    return WARMUP["state"] == "ready"
+
+
+# -------------------------------------------------------------------
+# Routes: HTML front doors
+# -------------------------------------------------------------------
+
+@app.get("/", response_class=HTMLResponse)
+async def root(request: Request):
+    """
+    Serve different HTML depending on hostname (see boot.page_for):
+    Kirk UI, Kosh UI, or the Dunsel hub. From memory, with ETag/304.
+    """
+    return boot.root_page(request)
+
+
 @app.get("/dunsel", response_class=HTMLResponse)
-async def dunsel_home():
+async def dunsel_home(request: Request):
     """
     Explicit hub page route, same as root for non-persona hosts.
     """
-    html_path = STATIC_DIR / "home.html"
-    if html_path.exists():
-        return HTMLResponse(html_path.read_text(encoding="utf-8"))
-    return PlainTextResponse("Dunsel hub online, but home.html missing.", status_code=200)
+    return boot.hub_page(request)
 
 
 # -------------------------------------------------------------------
@@ -169,13 +526,169 @@ async def dunsel_home():
 
 @app.get("/healthz")
 async def healthz():
+    """Liveness: the process answers. Whether it is warmed up is `ready` (and /readyz)."""
     return {
         "ok": True,
-        "index_ready": INDEX_READY,
-        "last_build_error": LAST_BUILD_ERROR,
+        "pid": os.getpid(),
+        "ready": is_ready(),
+        "index_ready": shard_index.current_index() is not None,
+        "last_build_error": WARMUP["errors"].get("index_build") or shard_index.last_error(),
+        "upstream": llm.stats(),
+        "response_cache": response_cache.cache.stats(),
+        "prompt_cache": prompts.stats(),
+        "sessions": sessions.store.stats(),
+        "static": STATIC.stats(),
+        "shards": retriever.reload_stats(),
+        "news": news.fetcher.stats(),
+        "stories": story_index.stats(),
+        "batcher": BATCHER.stats(),
+        "singleflight": FLIGHTS.stats(),
+        "admission": ADMISSION.stats(),
+        "shared_state": shared_state.store.stats(),
     }
 
 
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: 200 once warm-up has finished, 503 (Retry-After) until then.
+    Carries the warm-up stage timings and boot milestones (ms since process start).
+    """
+    body = {"ready": is_ready(), "warmup": WARMUP, "boot": boot.milestones()}
+    if not body["ready"]:
+        return JSONResponse(body, status_code=503, headers={"Retry-After": "1"})
+    return body
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus text format: request/stage/upstream histograms, token counts, cache
+    outcomes, plus the /healthz counters as gauges. Per worker process.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+metrics.REGISTRY.collect("dunsel_upstream", llm.stats)
+metrics.REGISTRY.collect("dunsel_response_cache", response_cache.cache.stats)
+metrics.REGISTRY.collect("dunsel_prompt_cache", prompts.stats)
+metrics.REGISTRY.collect("dunsel_static", STATIC.stats)
+metrics.REGISTRY.collect("dunsel_sessions", sessions.store.stats)
+metrics.REGISTRY.collect("dunsel_news", news.fetcher.stats)
+metrics.REGISTRY.collect("dunsel_batcher", BATCHER.stats)
+metrics.REGISTRY.collect("dunsel_singleflight", FLIGHTS.stats)
+metrics.REGISTRY.collect("dunsel_admission", ADMISSION.gauges)
+metrics.REGISTRY.collect("dunsel_shared_state", shared_state.store.stats)
+metrics.REGISTRY.collect("dunsel_warmup_stage_ms", lambda: WARMUP["stages"])
+metrics.REGISTRY.collect("dunsel_boot_ms", boot.milestones)
+
+
+# -------------------------------------------------------------------
+# Streaming (Server-Sent Events)
+# -------------------------------------------------------------------
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_events(
+    messages: List[dict],
+    citations: List[dict],
+    rewriter: Optional[KirkStreamRewriter] = None,
+    cache_key: Optional[str] = None,
+    params: dict = CHAT_PARAMS,
+    flight: Optional[str] = None,
+    n_context_tokens: int = 0,
+    on_complete: Optional[Callable[[str], Awaitable[Dict[str, Any]]]] = None,
+    ticket: Optional[Ticket] = None,
+) -> AsyncIterator[str]:
+    """
+    SSE body: `delta` events as text arrives (rewritten sentence by sentence when a
+    rewriter is given), then one `citations` event and a closing `done`.
+    Upstream failures become an `error` event, since the 200 is already sent.
+    A cached reply is replayed as a single delta; a fresh one is cached once complete.
+    With a `flight` key, identical streams already running are joined, not restarted.
+    `on_complete` gets the full text the client was sent; what it resolves to goes into meta.
+    `ticket` (admit_stream()) is released as soon as the upstream part is over.
+    """
+    with metrics.stage("cache_lookup"):
+        hit = response_cache.cache.get(cache_key) if cache_key else None
+    raw: List[str] = []
+    shown: List[str] = []
+    meta = {"cache": "hit" if hit is not None else ("miss" if cache_key else "bypass")}
+    metrics.note("cache", meta["cache"])
+    t0 = time.perf_counter()
+    rewrite_s = 0.0
+    if hit is None:
+        meta["context_tokens"] = n_context_tokens
+    try:
+        if hit is not None:
+            citations = hit["citations"]
+            text = rewriter.feed(hit["reply"]) if rewriter else hit["reply"]
+            if text:
+                shown.append(text)
+                yield _sse("delta", {"text": text})
+        else:
+            def source():
+                return llm.stream_chat_completion(
+                    messages,
+                    model=MODEL,
+                    on_usage=lambda u: meta.update(prompts.record_usage(u)),
+                    **params,
+                )
+
+            deltas, shared = FLIGHTS.stream(flight, source) if flight else (source(), False)
+            if shared:
+                meta["coalesced"] = True
+            async for delta in deltas:
+                if not raw:
+                    metrics.record("first_token", time.perf_counter() - t0)
+                raw.append(delta)
+                if rewriter:
+                    r0 = time.perf_counter()
+                    text = rewriter.feed(delta)
+                    rewrite_s += time.perf_counter() - r0
+                else:
+                    text = delta
+                if text:
+                    shown.append(text)
+                    yield _sse("delta", {"text": text})
+            metrics.record("coalesced" if shared else "upstream", time.perf_counter() - t0 - rewrite_s)
+        if rewriter:
+            r0 = time.perf_counter()
+            tail = rewriter.finish()
+            metrics.record("punchup", rewrite_s + time.perf_counter() - r0)
+            if tail:
+                shown.append(tail)
+                yield _sse("delta", {"text": tail})
+    except openai.APITimeoutError:
+        yield _sse("error", {"error": "Upstream timed out."})
+        return
+    except openai.APIError as e:
+        yield _sse("error", {"error": f"Upstream error: {type(e).__name__}"})
+        return
+    finally:
+        if ticket is not None:
+            ticket.release()
+    reply = "".join(raw).strip()
+    if cache_key and hit is None and reply and not meta.get("coalesced"):
+        response_cache.cache.put(cache_key, {"reply": reply, "citations": citations})
+    if on_complete:
+        meta.update(await on_complete("".join(shown).strip()))
+    yield _sse("citations", citations)
+    yield _sse("done", {"meta": meta})
+
+
+def _sse_response(events: AsyncIterator[str], ticket: Optional[Ticket] = None) -> StreamingResponse:
+    # The background release covers a client gone before the body generator started.
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release) if ticket is not None else None,
+    )
+
+
 # -------------------------------------------------------------------
 # Kirk persona endpoint
 # -------------------------------------------------------------------
@@ -186,35 +699,52 @@ async def chat_dunsel_kirk(req: ChatRequest):
     Main chat endpoint for the Kirk persona.
     """
 
-    persona_text = load_persona("kirk")
-    messages = build_messages(
-        persona_text=persona_text,
-        user_message=req.message,
+    reply, citations, meta = await run_chat_with_persona(
+        persona=load_persona("kirk"),
+        message=req.message,
         tags=req.tags,
         user_name=req.user_name,
-        persona_name="James T. Kirk",
+        hits=retrieve_for("kirk", req.message, req.tags),
+        no_cache=req.no_cache,
+        history=await session_history(req.session_id, "kirk"),
+        deadline_ms=req.deadline_ms,
     )
+    with metrics.stage("punchup"):
+        reply = punch_up_kirk(reply, user_name=req.user_name, tags=req.tags)
+    meta.update(await session_record(req.session_id, "kirk", req.message, req.user_name, reply))
+    return {"reply": reply, "citations": citations, "meta": meta}
 
-    completion = client.chat.completions.create(
-        model=MODEL,
-        messages=messages,
-        temperature=0.7,
-        max_tokens=600,
-    )
 
-    reply = completion.choices[0].message.content.strip()
-    return {
-        "reply": reply,
-        "citations": [],
-    }
+@app.post("/dunsel/api/chat/dunsel_kirk/stream")
+async def chat_dunsel_kirk_stream(req: ChatRequest):
+    """
+    Streaming variant of the Kirk endpoint (text/event-stream).
+    """
+    history = await session_history(req.session_id, "kirk")
+    hits = retrieve_for("kirk", req.message, req.tags)
+    messages = build_messages(load_persona("kirk"), req.message, req.tags, req.user_name, hits, history)
+    rewriter = KirkStreamRewriter(user_name=req.user_name, tags=req.tags)
+    bypass = req.no_cache or has_history(history)
+    key = response_cache_key("kirk", req.message, req.tags, CHAT_PARAMS, bypass=bypass)
+    flight = flight_key("kirk", req.message, req.tags, CHAT_PARAMS, bypass=bypass)
+    ticket = await admit_stream("kirk", req.deadline_ms, key, flight)
+    return _sse_response(_stream_events(
+        messages, citations_from(hits), rewriter, cache_key=key, flight=flight, n_context_tokens=context_tokens(hits),
+        on_complete=lambda text: session_record(req.session_id, "kirk", req.message, req.user_name, text),
+        ticket=ticket,
+    ), ticket)
 
 
 # -------------------------------------------------------------------
 # Kosh persona endpoint (news + gossip)
 # -------------------------------------------------------------------
 
-@app.post("/dunsel/api/chat/dunsel_kosh_news")
-async def chat_kosh_news(request: ChatRequest):
+def _kosh_inputs(request: ChatRequest):
+    """
+    Shared by the JSON and streaming Kosh endpoints. Returns (message, tags); the
+    response cache and single-flight key on the cleaned message itself, so rewordings
+    the cleaner folds together (outlet suffix, loud verbs, emoji) share one take.
+    """
     raw_message = request.message or ""
     incoming_tags = request.tags or []
 
@@ -227,21 +757,172 @@ async def chat_kosh_news(request: ChatRequest):
 
     # 3) Ensure we have at least one tag:
     #    - Use existing tags if present
-    #    - Otherwise infer from the cleaned headline
+    #    - Otherwise score every tag against the raw text (the cleaner strips words
+    #      like "viral" that the scorer needs) and send the strongest first
     tags = list(incoming_tags)
     if not tags:
-        inferred = infer_tag_from_text(final_message)
-        tags = [inferred]
+        tags = infer_tags_from_text(raw_message)
+
+    return final_message, tags
+
 
-    persona = load_persona("kosh")  # whatever your existing loading function is
+@app.post("/dunsel/api/chat/dunsel_kosh_news")
+async def chat_kosh_news(request: ChatRequest):
+    with metrics.stage("preprocess"):
+        final_message, tags = _kosh_inputs(request)
 
-    # 4) Call your existing OpenAI chat wrapper with the preprocessed message & tags
-    reply, citations = await run_chat_with_persona(
-        persona=persona,
+    # 4) Call the shared async chat wrapper with the preprocessed message & tags
+    reply, citations, meta = await run_chat_with_persona(
+        persona=load_persona("kosh"),
         message=final_message,
         tags=tags,
         user_name=request.user_name or "User",
+        no_cache=request.no_cache,
+        batch=True,
+        history=await session_history(request.session_id, "kosh"),
+        deadline_ms=request.deadline_ms,
     )
+    meta.update(await session_record(request.session_id, "kosh", final_message, request.user_name or "User", reply))
+
+    return {"reply": reply, "citations": citations, "meta": meta}
+
+
+@app.post("/dunsel/api/chat/dunsel_kosh_news/stream")
+async def chat_kosh_news_stream(request: ChatRequest):
+    """
+    Streaming variant of the Kosh endpoint. Kosh replies are one or two sentences,
+    so deltas are forwarded untouched.
+    """
+    with metrics.stage("preprocess"):
+        final_message, tags = _kosh_inputs(request)
+    history = await session_history(request.session_id, "kosh")
+    user_name = request.user_name or "User"
+    messages = build_messages(load_persona("kosh"), final_message, tags, user_name, history=history)
+    bypass = request.no_cache or has_history(history)
+    key = response_cache_key("kosh", final_message, tags, CHAT_PARAMS, bypass=bypass)
+    flight = flight_key("kosh", final_message, tags, CHAT_PARAMS, bypass=bypass)
+    ticket = await admit_stream("kosh", request.deadline_ms, key, flight)
+    return _sse_response(_stream_events(
+        messages, [], cache_key=key, flight=flight,
+        on_complete=lambda text: session_record(request.session_id, "kosh", final_message, user_name, text),
+        ticket=ticket,
+    ), ticket)
+
+
+# -------------------------------------------------------------------
+# Sessions API
+# -------------------------------------------------------------------
+
+@app.post("/dunsel/api/sessions")
+async def create_session():
+    """
+    A fresh session id. Clients may also pick their own (8-64 chars of [A-Za-z0-9_-])
+    and just send it as session_id; an unknown or expired id starts a new conversation.
+    """
+    return {"session_id": sessions.new_id(), "ttl_seconds": sessions.SESSION_TTL}
+
+
+@app.get("/dunsel/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    conversations = await asyncio.to_thread(sessions.store.get, session_id) if sessions.valid_id(session_id) else []
+    if not conversations:
+        return JSONResponse({"error": "No such session."}, status_code=404)
+    return {"session_id": session_id, "conversations": conversations}
+
 
-    return {"reply": reply, "citations": citations}
+@app.delete("/dunsel/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    return {"deleted": sessions.valid_id(session_id) and await asyncio.to_thread(sessions.store.delete, session_id)}
 
+
+# -------------------------------------------------------------------
+# News console (feeds + Kirk's take on the latest headlines)
+# -------------------------------------------------------------------
+
+@app.get("/dunsel/api/news/feeds")
+async def get_news_feeds():
+    return {"feeds": news.load_feeds()}
+
+
+@app.post("/dunsel/api/news/feeds")
+async def save_news_feeds(req: FeedsRequest, x_dunsel_token: Optional[str] = Header(None)):
+    """
+    Replace the saved subscription list every visitor starts from; needs the
+    X-Dunsel-Token header to match DUNSEL_NEWS_FEEDS_TOKEN (unset: nobody may).
+    Visitors can still send their own list with each /news/opine request.
+    """
+    if not news.FEEDS_TOKEN or not secrets.compare_digest(x_dunsel_token or "", news.FEEDS_TOKEN):
+        return JSONResponse(
+            {"ok": False, "error": "Saving the shared feed list is not allowed.", "feeds": news.load_feeds()},
+            status_code=403,
+        )
+    feeds, error = news.validate_feeds(req.feeds)
+    if error:
+        return {"ok": False, "error": error, "feeds": feeds}
+    news.save_feeds(feeds)
+    return {"ok": True, "feeds": feeds}
+
+
+async def _opine(item: dict, tags: List[str], deadline_ms: Optional[int] = None) -> str:
+    """
+    Kirk's take on one headline; bulk priority, so interactive chat goes first. The take
+    is cached and coalesced on the item's story (story_index), so every outlet's wording
+    of one event costs a single upstream call.
+    """
+    message = f"Headline ({item['source']}): {item['clean']}"
+    try:
+        reply, _, _ = await run_chat_with_persona(
+            persona=load_persona("kirk"), message=message, tags=tags, user_name=None,
+            cache_message=item["story"], batch=True, priority=BULK, deadline_ms=deadline_ms,
+        )
+    except openai.OpenAIError:
+        return ""
+    return punch_up_kirk(reply, user_name=None, tags=tags)
+
+
+@app.post("/dunsel/api/news/opine")
+@app.post("/dunsel/api/chat/kirk_news")
+async def news_opine(req: OpineRequest):
+    """
+    Refresh the feeds (conditional GETs, all at once), take the newest distinct
+    headlines and get Kirk's take on each.
+    """
+    if req.feeds is None:
+        feeds = news.load_feeds()
+    else:
+        feeds, error = news.validate_feeds(req.feeds)
+        if error:
+            return JSONResponse({"error": error, "items": []}, status_code=400)
+
+    with metrics.stage("feeds"):
+        states = await news.fetcher.refresh(feeds)
+        picked = news.latest_items(states, max(1, min(24, req.max_items)))
+    tags = ["news", "bridge"] if req.bridge_mode else ["news"]
+    # The takes run in parallel; time them as one stage rather than summing theirs.
+    with metrics.stage("opinions"), metrics.untimed():
+        results = await asyncio.gather(*(_opine(it, tags, req.deadline_ms) for it in picked), return_exceptions=True)
+    shed = [r for r in results if isinstance(r, Overloaded)]
+    for r in results:
+        if isinstance(r, BaseException) and not isinstance(r, Overloaded):
+            raise r
+    if shed and len(shed) == len(results):
+        raise shed[0]
+    # Takes refused under load come back empty, like failed ones.
+    opinions = ["" if isinstance(r, Overloaded) else r for r in results]
+
+    items = []
+    for i, (it, opinion) in enumerate(zip(picked, opinions), 1):
+        items.append({
+            "idx": i,
+            "index": i,
+            "title": it["title"],
+            "link": it["link"],
+            "source": it["source"],
+            "published": it["published"],
+            "opinion": opinion,
+        })
+    return {"items": items, "feeds": news.feed_summary(states)}
+
+
+# End of module import (boot milestone, reported on /readyz).
+boot.mark("server_imported")
@@ -0,0 +1,341 @@
+# app/sessions.py
+# Server-side multi-turn chat sessions in a local SQLite file.
+#
+# A chat request carrying a session_id gets that session's history in its prompt
+# and its own turn appended afterwards, so the frontends send one message per turn.
+# History stays bounded three ways:
+# - compaction: once the verbatim turns pass COMPACT_TOKENS, the older ones (all but
+#   the newest KEEP_TOKENS) are folded into a running summary by one short upstream
+#   call, off the request path;
+# - a hard cap: at most MAX_HISTORY_TOKENS of verbatim turns ever go into a prompt
+#   (oldest dropped first) and at most MAX_TURNS are kept, whatever compaction does;
+# - idle TTL: sessions untouched for SESSION_TTL are deleted (swept every few hundred
+#   writes, and treated as gone when read).
+#
+# Same storage setup as response_cache.py (shared_state.connect: WAL, shared by every
+# worker on the host). Reads and writes can wait on other workers' transactions for up
+# to the busy timeout, so async callers run them in a thread (asyncio.to_thread), as
+# _compact does.
+# A session id is chosen by the client (any 8-64 char [A-Za-z0-9_-] string) and holds
+# one conversation per persona.
+
+from __future__ import annotations
+import asyncio, os, re, secrets, sqlite3, threading, time
+from typing import Any, Dict, List, Optional, Tuple
+
+import llm
+import prompts
+import shared_state
+from retriever import estimate_tokens
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSIONS_PATH = os.getenv("DUNSEL_SESSIONS_PATH", os.path.join(APP_DIR, "data", "sessions.sqlite3"))
+SESSIONS_ENABLED = os.getenv("DUNSEL_SESSIONS", "1") not in ("0", "false", "off")
+SESSION_TTL = float(os.getenv("DUNSEL_SESSION_TTL", str(24 * 3600)))
+COMPACT_TOKENS = int(os.getenv("DUNSEL_SESSION_COMPACT_TOKENS", "1200"))
+KEEP_TOKENS = int(os.getenv("DUNSEL_SESSION_KEEP_TOKENS", "400"))
+SUMMARY_TOKENS = int(os.getenv("DUNSEL_SESSION_SUMMARY_TOKENS", "250"))
+MAX_HISTORY_TOKENS = int(os.getenv("DUNSEL_SESSION_MAX_HISTORY_TOKENS", "2000"))
+MAX_TURNS = int(os.getenv("DUNSEL_SESSION_MAX_TURNS", "200"))
+MAX_TURN_CHARS = int(os.getenv("DUNSEL_SESSION_MAX_TURN_CHARS", "4000"))
+
+SESSION_ID_PATTERN = r"^[A-Za-z0-9_-]{8,64}$"
+_ID_RE = re.compile(SESSION_ID_PATTERN)
+
+SUMMARY_INSTRUCTIONS = (
+    "You keep the running memory of a conversation you are part of. Merge the earlier "
+    "summary (if any) and the turns below into one updated summary: who the user is, "
+    "what they asked, what was decided or promised, open questions, names and facts "
+    "worth keeping. Third person, plain prose, no quotes, at most {words} words."
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT NOT NULL, persona TEXT NOT NULL, summary TEXT NOT NULL DEFAULT '',
+    summary_tokens INTEGER NOT NULL DEFAULT 0, compacted INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL, updated REAL NOT NULL, PRIMARY KEY (id, persona));
+CREATE TABLE IF NOT EXISTS turns (
+    id TEXT NOT NULL, persona TEXT NOT NULL, seq INTEGER NOT NULL,
+    role TEXT NOT NULL, content TEXT NOT NULL, tokens INTEGER NOT NULL,
+    PRIMARY KEY (id, persona, seq));
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+"""
+
+
+def new_id() -> str:
+    return secrets.token_urlsafe(18)
+
+
+def valid_id(session_id: str) -> bool:
+    return bool(_ID_RE.match(session_id or ""))
+
+
+class SessionStore:
+    def __init__(self, path: str = SESSIONS_PATH, ttl: float = SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self._compacting: set = set()
+        self._tasks: set = set()
+        self.counters = {"loads": 0, "appends": 0, "compactions": 0, "compaction_errors": 0,
+                         "compacted_turns": 0, "trimmed_turns": 0, "evicted": 0, "errors": 0}
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self._db = shared_state.connect(self.path, SCHEMA)
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return None
+        return self._db
+
+    # --- reads ---
+
+    def history(self, session_id: str, persona: str) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        (summary, turns) for the prompt: the running summary and the newest verbatim
+        turns that fit in MAX_HISTORY_TOKENS, oldest first. Expired sessions read as empty.
+        """
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return "", []
+            try:
+                row = db.execute(
+                    "SELECT summary FROM sessions WHERE id = ? AND persona = ? AND updated > ?",
+                    (session_id, persona, time.time() - self.ttl),
+                ).fetchone()
+                if row is None:
+                    return "", []
+                rows = db.execute(
+                    "SELECT role, content, tokens FROM turns WHERE id = ? AND persona = ? ORDER BY seq DESC",
+                    (session_id, persona),
+                ).fetchall()
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return "", []
+            self.counters["loads"] += 1
+        turns: List[Dict[str, str]] = []
+        budget = MAX_HISTORY_TOKENS
+        for role, content, tokens in rows:
+            if tokens > budget:
+                break
+            budget -= tokens
+            turns.append({"role": role, "content": content})
+        turns.reverse()
+        # Never open the history on an assistant turn whose question was cut off.
+        while turns and turns[0]["role"] != "user":
+            turns.pop(0)
+        return row[0], turns
+
+    def get(self, session_id: str) -> List[Dict[str, Any]]:
+        """Every persona conversation under the id (for the sessions API)."""
+        out = []
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return out
+            try:
+                for persona, summary, compacted, created, updated in db.execute(
+                    "SELECT persona, summary, compacted, created, updated FROM sessions"
+                    " WHERE id = ? AND updated > ? ORDER BY persona",
+                    (session_id, time.time() - self.ttl),
+                ).fetchall():
+                    turns = db.execute(
+                        "SELECT role, content FROM turns WHERE id = ? AND persona = ? ORDER BY seq",
+                        (session_id, persona),
+                    ).fetchall()
+                    out.append({"persona": persona, "summary": summary, "compacted_turns": compacted,
+                                "created": created, "updated": updated,
+                                "turns": [{"role": r, "content": c} for r, c in turns]})
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+        return out
+
+    # --- writes ---
+
+    def append(self, session_id: str, persona: str, user_text: str, reply: str) -> Dict[str, Any]:
+        """
+        Record one exchange (each side capped at MAX_TURN_CHARS), creating the session
+        if needed. Returns {turns, history_tokens} of what is now stored verbatim.
+        Waits up to shared_state.BUSY_TIMEOUT for the write lock: call it via asyncio.to_thread.
+        """
+        now = time.time()
+        pair = [("user", user_text[:MAX_TURN_CHARS]), ("assistant", reply[:MAX_TURN_CHARS])]
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return {}
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                cur = db.execute(
+                    "UPDATE sessions SET updated = ? WHERE id = ? AND persona = ? AND updated > ?",
+                    (now, session_id, persona, now - self.ttl),
+                )
+                if cur.rowcount == 0:
+                    # New, or expired and not yet swept: start over.
+                    db.execute("DELETE FROM turns WHERE id = ? AND persona = ?", (session_id, persona))
+                    db.execute(
+                        "INSERT OR REPLACE INTO sessions (id, persona, created, updated) VALUES (?, ?, ?, ?)",
+                        (session_id, persona, now, now),
+                    )
+                seq = db.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM turns WHERE id = ? AND persona = ?", (session_id, persona)
+                ).fetchone()[0]
+                db.executemany(
+                    "INSERT INTO turns (id, persona, seq, role, content, tokens) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(session_id, persona, seq + i, role, text, estimate_tokens(text) + 4)
+                     for i, (role, text) in enumerate(pair, 1)],
+                )
+                n, tokens = db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM turns WHERE id = ? AND persona = ?",
+                    (session_id, persona),
+                ).fetchone()
+                if n > MAX_TURNS:
+                    db.execute(
+                        "DELETE FROM turns WHERE id = ? AND persona = ? AND seq <= ?",
+                        (session_id, persona, seq + 2 - MAX_TURNS),
+                    )
+                    self.counters["trimmed_turns"] += n - MAX_TURNS
+                    n, tokens = db.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM turns WHERE id = ? AND persona = ?",
+                        (session_id, persona),
+                    ).fetchone()
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                return {}
+            self.counters["appends"] += 1
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._sweep(db)
+        return {"turns": n, "history_tokens": tokens}
+
+    def delete(self, session_id: str) -> bool:
+        """Drop every conversation under the id (blocking, like append())."""
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return False
+            try:
+                db.execute("DELETE FROM turns WHERE id = ?", (session_id,))
+                return db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return False
+
+    def _sweep(self, db: sqlite3.Connection) -> None:
+        cutoff = time.time() - self.ttl
+        try:
+            db.execute(
+                "DELETE FROM turns WHERE (id, persona) IN (SELECT id, persona FROM sessions WHERE updated <= ?)",
+                (cutoff,),
+            )
+            self.counters["evicted"] += db.execute("DELETE FROM sessions WHERE updated <= ?", (cutoff,)).rowcount
+        except sqlite3.Error:
+            self.counters["errors"] += 1
+
+    def sweep(self) -> None:
+        """Delete sessions idle for longer than the TTL."""
+        with self._lock:
+            db = self._conn()
+            if db is not None:
+                self._sweep(db)
+
+    # --- compaction ---
+
+    def maybe_compact(self, session_id: str, persona: str, history_tokens: int) -> None:
+        """Start compaction in the background once the verbatim history is over the threshold."""
+        key = (session_id, persona)
+        if history_tokens <= COMPACT_TOKENS or key in self._compacting:
+            return
+        self._compacting.add(key)
+        task = asyncio.get_running_loop().create_task(self._compact(session_id, persona))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _older_turns(self, session_id: str, persona: str) -> Tuple[str, List[Tuple[int, str, str]]]:
+        # Everything except the newest KEEP_TOKENS worth of turns, cut at a user turn.
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return "", []
+            summary = db.execute(
+                "SELECT summary FROM sessions WHERE id = ? AND persona = ?", (session_id, persona)
+            ).fetchone()
+            rows = db.execute(
+                "SELECT seq, role, content, tokens FROM turns WHERE id = ? AND persona = ? ORDER BY seq DESC",
+                (session_id, persona),
+            ).fetchall()
+        kept = 0
+        for i, (seq, role, content, tokens) in enumerate(rows):
+            kept += tokens
+            if kept > KEEP_TOKENS and role == "user":
+                older = [(s, r, c) for s, r, c, _ in reversed(rows[i + 1:])]
+                return (summary[0] if summary else ""), older
+        return "", []
+
+    def _fold(self, session_id: str, persona: str, last_seq: int, n: int, summary: str) -> bool:
+        # Replace turns up to last_seq with the new summary, in one write transaction.
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return False
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute(
+                    "DELETE FROM turns WHERE id = ? AND persona = ? AND seq <= ?",
+                    (session_id, persona, last_seq),
+                )
+                db.execute(
+                    "UPDATE sessions SET summary = ?, summary_tokens = ?, compacted = compacted + ?"
+                    " WHERE id = ? AND persona = ?",
+                    (summary, estimate_tokens(summary), n, session_id, persona),
+                )
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                raise
+        return True
+
+    async def _compact(self, session_id: str, persona: str) -> None:
+        try:
+            summary, older = await asyncio.to_thread(self._older_turns, session_id, persona)
+            if not older:
+                return
+            transcript = "\n\n".join(f"{role.upper()}: {content}" for _, role, content in older)
+            if summary:
+                transcript = f"EARLIER SUMMARY: {summary}\n\n{transcript}"
+            completion = await llm.chat_completion(
+                [{"role": "system", "content": SUMMARY_INSTRUCTIONS.format(words=SUMMARY_TOKENS * 3 // 4)},
+                 {"role": "user", "content": transcript}],
+                model=llm.MODEL, temperature=0.2, max_tokens=SUMMARY_TOKENS,
+            )
+            prompts.record_usage(completion.usage)
+            fresh = (completion.choices[0].message.content or "").strip()
+            if not fresh:
+                return
+            if not await asyncio.to_thread(self._fold, session_id, persona, older[-1][0], len(older), fresh):
+                return
+            self.counters["compactions"] += 1
+            self.counters["compacted_turns"] += len(older)
+        except Exception:
+            # The hard history cap keeps prompts bounded until a later turn retries.
+            self.counters["compaction_errors"] += 1
+        finally:
+            self._compacting.discard((session_id, persona))
+
+    def stats(self) -> Dict[str, Any]:
+        c = dict(self.counters)
+        c["compacting"] = len(self._compacting)
+        c["enabled"] = SESSIONS_ENABLED
+        return c
+
+
+store = SessionStore()
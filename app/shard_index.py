@@ -0,0 +1,528 @@
+# app/shard_index.py
+# Versioned, memory-mappable on-disk index for persona shards + archive chunks.
+#
+# Layout (little-endian, every section 8-byte aligned):
+#   header   MAGIC, version, n_docs, n_chunks, n_terms, avgdl, section table
+#   DOCS     JSON {"docs": per-document metadata, "sources": scanned (path, mtime, size),
+#                  "manifest": per source file hash / doc / chunk range, see build_index}
+#   CHUNKS   n_chunks x (doc_idx u32, pad u32, text_off u64, text_len u64)
+#   LENGTHS  n_chunks x u32 token length per chunk (BM25 |d|)
+#   TEXT     utf-8 blob holding chunk texts and full shard bodies
+#   TERM_OFF (n_terms + 1) x u64 offsets into TERM_TEXT
+#   TERM_TXT utf-8 blob of the sorted token dictionary
+#   POST_OFF (n_terms + 1) x u64 offsets into POST_IDS / POST_TFS
+#   POST_IDS u32 chunk ids, sorted within each term
+#   POST_TFS u32 term frequencies, parallel to POST_IDS
+#
+# Built offline by build_index.py; the server only ever opens it read-only.
+
+from __future__ import annotations
+import json, math, mmap, os, re, struct
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.getenv("DUNSEL_INDEX_PATH", os.path.join(APP_DIR, "index", "dunsel.idx"))
+
+MAGIC = b"DUNSELIX"
+VERSION = 1
+
+SECTIONS = (
+    "docs", "chunks", "lengths", "text",
+    "term_off", "term_text", "post_off", "post_ids", "post_tfs",
+)
+_HEAD = struct.Struct("<8sIIIId")            # magic, version, n_docs, n_chunks, n_terms, avgdl
+_SECTION = struct.Struct("<QQ")              # offset, length
+_CHUNK = struct.Struct("<IIQQ")              # doc_idx, pad, text_off, text_len
+_CHUNK_DTYPE = np.dtype([("doc", "<u4"), ("pad", "<u4"), ("off", "<u8"), ("len", "<u8")])
+HEADER_SIZE = _HEAD.size + _SECTION.size * len(SECTIONS)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# BM25 parameters; per-chunk length normalization is derived from them once per open.
+BM25_K1 = float(os.getenv("DUNSEL_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("DUNSEL_BM25_B", "0.75"))
+
+
+class IndexFormatError(ValueError):
+    pass
+
+
+def tokenize(text: str) -> List[str]:
+    # Same token shape as retriever._infer_keywords so header keywords and body terms agree.
+    return TOKEN_RE.findall(text.lower())
+
+
+# -------------------------------------------------------------------
+# Writer
+# -------------------------------------------------------------------
+
+@dataclass
+class Segment:
+    """
+    One document's share of the index, ready to merge: its metadata row (with an
+    optional "body"), encoded chunk texts, token lengths and (term, chunk, tf)
+    postings with chunk ids local to the segment. Built by encode_chunks(), which is
+    the expensive part of a build and is safe to run in worker processes.
+    """
+    doc: Dict[str, Any]
+    texts: List[bytes]
+    lengths: array
+    terms: List[str]
+    post_term: array   # index into `terms`
+    post_chunk: array  # local chunk id
+    post_tf: array
+
+
+def encode_chunks(doc: Dict[str, Any], chunks: Iterable[str]) -> Segment:
+    texts: List[bytes] = []
+    lengths = array("I")
+    vocab: Dict[str, int] = {}
+    post_term, post_chunk, post_tf = array("I"), array("I"), array("I")
+    for c, chunk in enumerate(chunks):
+        texts.append(chunk.encode("utf-8"))
+        toks = tokenize(chunk)
+        lengths.append(len(toks))
+        for t, tf in Counter(toks).items():
+            post_term.append(vocab.setdefault(t, len(vocab)))
+            post_chunk.append(c)
+            post_tf.append(tf)
+    return Segment(doc, texts, lengths, list(vocab), post_term, post_chunk, post_tf)
+
+
+def merge_segments(
+    entries: List[Tuple[str, Any]],
+    old: Optional["ShardIndex"] = None,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Assemble index sections from entries in doc order. Each entry is ("new", Segment)
+    or ("old", (doc_idx, overrides)) to carry a document over from `old` unchanged:
+    its text bytes, lengths and postings are copied and renumbered without being
+    re-tokenized. Returns (payloads for write_sections, n_docs/n_chunks/n_terms/avgdl).
+    """
+    text = bytearray()
+    doc_rows: List[Dict[str, Any]] = []
+    chunk_parts: List[np.ndarray] = []
+    len_parts: List[np.ndarray] = []
+    g_parts: List[np.ndarray] = []
+    c_parts: List[np.ndarray] = []
+    tf_parts: List[np.ndarray] = []
+    vocab: Dict[str, int] = {}
+
+    if old is not None:
+        o_chunks = np.frombuffer(old._sec["chunks"], dtype=_CHUNK_DTYPE)
+        o_lengths = np.frombuffer(old._sec["lengths"], dtype="<u4")
+        o_text = old._sec["text"]
+        o_remap = np.full(old.n_chunks, -1, dtype=np.int64)
+        # chunks are stored grouped by doc, in doc order
+        o_first = np.searchsorted(o_chunks["doc"], np.arange(old.n_docs + 1))
+
+    cid = 0
+    for kind, item in entries:
+        if kind == "old":
+            doc_idx, overrides = item
+            row = dict(old.docs[doc_idx])
+            row.update(overrides)
+            if "body_off" in row:
+                body = o_text[row["body_off"]:row["body_off"] + row["body_len"]]
+                row["body_off"] = len(text)
+                text.extend(body)
+            a, b = int(o_first[doc_idx]), int(o_first[doc_idx + 1])
+            rows = o_chunks[a:b].copy()
+            if b > a:
+                start, stop = int(rows["off"][0]), int(rows["off"][-1] + rows["len"][-1])
+                if np.array_equal(rows["off"][1:], rows["off"][:-1] + rows["len"][:-1]):
+                    # The doc's chunk texts are one contiguous run: copy it in one go.
+                    rows["off"] = (rows["off"].astype(np.int64) + (len(text) - start)).astype("<u8")
+                    text.extend(o_text[start:stop])
+                else:
+                    for r in rows:
+                        off, ln = int(r["off"]), int(r["len"])
+                        r["off"] = len(text)
+                        text.extend(o_text[off:off + ln])
+            o_remap[a:b] = np.arange(cid, cid + (b - a))
+            n = b - a
+            len_parts.append(o_lengths[a:b])
+        else:
+            seg: Segment = item
+            row = dict(seg.doc)
+            body = row.pop("body", None)
+            if body is not None:
+                bb = body.encode("utf-8")
+                row["body_off"], row["body_len"] = len(text), len(bb)
+                text.extend(bb)
+            n = len(seg.texts)
+            rows = np.zeros(n, dtype=_CHUNK_DTYPE)
+            sizes = np.fromiter((len(t) for t in seg.texts), dtype=np.uint64, count=n)
+            rows["len"] = sizes
+            rows["off"] = len(text) + np.cumsum(sizes) - sizes
+            text.extend(b"".join(seg.texts))
+            len_parts.append(np.frombuffer(seg.lengths, dtype=np.uint32) if n else np.zeros(0, np.uint32))
+            if len(seg.post_term):
+                gids = np.fromiter((vocab.setdefault(t, len(vocab)) for t in seg.terms), dtype=np.int64, count=len(seg.terms))
+                g_parts.append(gids[np.frombuffer(seg.post_term, dtype=np.uint32)])
+                c_parts.append(np.frombuffer(seg.post_chunk, dtype=np.uint32).astype(np.int64) + cid)
+                tf_parts.append(np.frombuffer(seg.post_tf, dtype=np.uint32))
+        rows["doc"] = len(doc_rows)
+        chunk_parts.append(rows)
+        doc_rows.append(row)
+        cid += n
+
+    if old is not None and old.n_terms:
+        # Carried-over postings: keep those whose chunk survived, renumber chunk and term.
+        o_post_off = np.frombuffer(old._sec["post_off"], dtype="<u8").astype(np.int64)
+        o_ids = np.frombuffer(old._sec["post_ids"], dtype="<u4")
+        keep = o_remap[o_ids] >= 0
+        if keep.any():
+            o_tid = np.repeat(np.arange(old.n_terms), np.diff(o_post_off))[keep]
+            used = np.unique(o_tid)
+            o_gid = np.full(old.n_terms, -1, dtype=np.int64)
+            o_gid[used] = [vocab.setdefault(old.term(int(t)), len(vocab)) for t in used]
+            g_parts.append(o_gid[o_tid])
+            c_parts.append(o_remap[o_ids[keep]])
+            tf_parts.append(np.frombuffer(old._sec["post_tfs"], dtype="<u4")[keep])
+
+    g = np.concatenate(g_parts) if g_parts else np.zeros(0, np.int64)
+    c = np.concatenate(c_parts) if c_parts else np.zeros(0, np.int64)
+    tf = np.concatenate(tf_parts) if tf_parts else np.zeros(0, np.uint32)
+    # Final dictionary: terms that still have postings, in sorted order.
+    names = list(vocab)
+    used = np.unique(g)
+    terms = sorted(names[i] for i in used)
+    rank = np.zeros(len(names), dtype=np.int64)
+    rank[[vocab[t] for t in terms]] = np.arange(len(terms))
+    tid = rank[g]
+    order = np.lexsort((c, tid))
+    post_off = np.zeros(len(terms) + 1, dtype="<u8")
+    np.cumsum(np.bincount(tid, minlength=len(terms)), out=post_off[1:])
+    term_bytes = [t.encode("utf-8") for t in terms]
+    term_off = np.zeros(len(terms) + 1, dtype="<u8")
+    np.cumsum([len(t) for t in term_bytes], out=term_off[1:])
+
+    chunk_rows = np.concatenate(chunk_parts) if chunk_parts else np.zeros(0, dtype=_CHUNK_DTYPE)
+    lengths = np.concatenate(len_parts).astype("<u4") if len_parts else np.zeros(0, "<u4")
+    avgdl = float(lengths.mean()) if len(lengths) else 0.0
+    doc_meta = {"docs": doc_rows}
+    doc_meta.update(meta or {})
+    payloads = {
+        "docs": json.dumps(doc_meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        "chunks": chunk_rows,
+        "lengths": lengths,
+        "text": text,
+        "term_off": term_off,
+        "term_text": b"".join(term_bytes),
+        "post_off": post_off,
+        "post_ids": c[order].astype("<u4"),
+        "post_tfs": tf[order].astype("<u4"),
+    }
+    counts = {"n_docs": len(doc_rows), "n_chunks": len(chunk_rows), "n_terms": len(terms),
+              "avgdl": avgdl}
+    return payloads, counts
+
+
+def write_index(
+    path: str,
+    docs: List[Dict[str, Any]],
+    chunks: List[Tuple[int, str]],
+    sources: Optional[List[List[Any]]] = None,
+) -> Dict[str, int]:
+    """
+    Write docs + (doc_idx, chunk_text) pairs to `path` atomically.
+    A doc may carry a "body" string; it is moved into TEXT and replaced by body_off/body_len.
+    `sources` is the scan fingerprint ([rel_path, mtime, size] per file, including files
+    that produced no doc) so a later build can tell whether anything changed.
+    """
+    by_doc: List[List[str]] = [[] for _ in docs]
+    for doc_idx, chunk in chunks:
+        by_doc[doc_idx].append(chunk)
+    entries = [("new", encode_chunks(d, cs)) for d, cs in zip(docs, by_doc)]
+    payloads, n = merge_segments(entries, meta={"sources": sources or []})
+    return write_sections(path, payloads, n["n_docs"], n["n_chunks"], n["n_terms"], n["avgdl"])
+
+
+def write_sections(
+    path: str,
+    payloads: Dict[str, Any],
+    n_docs: int,
+    n_chunks: int,
+    n_terms: int,
+    avgdl: float,
+) -> Dict[str, int]:
+    """
+    Lay out already-encoded sections (bytes or any buffer) and atomically replace `path`.
+    Sections are streamed to disk, so peak memory is the payloads themselves.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    table = []
+    with open(tmp, "wb") as f:
+        pos = HEADER_SIZE + (-HEADER_SIZE % 8)
+        f.write(b"\0" * pos)
+        for name in SECTIONS:
+            data = memoryview(payloads[name]).cast("B")
+            table.append((pos, data.nbytes))
+            f.write(data)
+            pad = -data.nbytes % 8
+            f.write(b"\0" * pad)
+            pos += data.nbytes + pad
+        header = _HEAD.pack(MAGIC, VERSION, n_docs, n_chunks, n_terms, avgdl)
+        header += b"".join(_SECTION.pack(off, ln) for off, ln in table)
+        f.seek(0)
+        f.write(header)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)  # readers holding the old mmap keep their inode
+    return {"docs": n_docs, "chunks": n_chunks, "terms": n_terms, "bytes": pos}
+
+
+# -------------------------------------------------------------------
+# Reader
+# -------------------------------------------------------------------
+
+class ShardIndex:
+    """
+    Read-only view over an index file. Nothing is parsed up front except the
+    header and the (small) DOCS table; chunk text and postings are sliced
+    straight out of the mmap on demand.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.stamp = _stamp(os.fstat(f.fileno()))
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < HEADER_SIZE:
+            raise IndexFormatError(f"{path}: truncated header")
+        magic, version, n_docs, n_chunks, n_terms, avgdl = _HEAD.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise IndexFormatError(f"{path}: bad magic")
+        if version != VERSION:
+            raise IndexFormatError(f"{path}: index version {version}, expected {VERSION}")
+        self.version = version
+        self.n_docs, self.n_chunks, self.n_terms, self.avgdl = n_docs, n_chunks, n_terms, avgdl
+
+        view = memoryview(self._mm)
+        self._sec: Dict[str, memoryview] = {}
+        for i, name in enumerate(SECTIONS):
+            off, ln = _SECTION.unpack_from(self._mm, _HEAD.size + i * _SECTION.size)
+            if off + ln > len(self._mm):
+                raise IndexFormatError(f"{path}: section {name} out of bounds")
+            self._sec[name] = view[off:off + ln]
+
+        self.lengths = self._sec["lengths"].cast("I")
+        self._term_off = self._sec["term_off"].cast("Q")
+        self._post_off = self._sec["post_off"].cast("Q")
+        self._post_ids = self._sec["post_ids"].cast("I")
+        self._post_tfs = self._sec["post_tfs"].cast("I")
+        meta = json.loads(bytes(self._sec["docs"]).decode("utf-8"))
+        self.docs: List[Dict[str, Any]] = meta["docs"]
+        self.sources: List[List[Any]] = meta.get("sources", [])
+        # rel_path -> {kind, persona, sha256, mtime, size, doc, chunks: [first, count]}
+        self.manifest: Optional[Dict[str, Dict[str, Any]]] = meta.get("manifest")
+        self._np: Optional[Dict[str, Any]] = None  # NumPy views, built on first bm25()
+
+    def _text(self, off: int, ln: int) -> str:
+        return bytes(self._sec["text"][off:off + ln]).decode("utf-8")
+
+    def doc_body(self, doc_idx: int) -> str:
+        d = self.docs[doc_idx]
+        if "body_off" not in d:
+            return ""
+        return self._text(d["body_off"], d["body_len"])
+
+    def chunk_doc(self, cid: int) -> int:
+        return _CHUNK.unpack_from(self._sec["chunks"], cid * _CHUNK.size)[0]
+
+    def chunk_text(self, cid: int) -> str:
+        _, _, off, ln = _CHUNK.unpack_from(self._sec["chunks"], cid * _CHUNK.size)
+        return self._text(off, ln)
+
+    def term(self, i: int) -> str:
+        return bytes(self._sec["term_text"][self._term_off[i]:self._term_off[i + 1]]).decode("utf-8")
+
+    def term_id(self, token: str) -> int:
+        # Binary search over the sorted dictionary; compares raw utf-8 bytes.
+        key = token.encode("utf-8")
+        tt = self._sec["term_text"]
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = bytes(tt[self._term_off[mid]:self._term_off[mid + 1]])
+            if cur < key:
+                lo = mid + 1
+            elif cur > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def postings(self, token: str) -> Tuple[memoryview, memoryview]:
+        """
+        (chunk_ids, tfs) for `token`, as zero-copy u32 views. Empty if unknown.
+        """
+        tid = self.term_id(token)
+        if tid < 0:
+            return self._post_ids[0:0], self._post_tfs[0:0]
+        a, b = self._post_off[tid], self._post_off[tid + 1]
+        return self._post_ids[a:b], self._post_tfs[a:b]
+
+    # ---------------------------------------------------------------
+    # BM25 (NumPy over the mmapped postings; nothing is copied at open)
+    # ---------------------------------------------------------------
+
+    def _arrays(self) -> Dict[str, Any]:
+        arr = self._np
+        if arr is None:
+            lengths = np.frombuffer(self._sec["lengths"], dtype="<u4")
+            chunk_doc = np.frombuffer(self._sec["chunks"], dtype=_CHUNK_DTYPE)["doc"]
+            avgdl = self.avgdl or 1.0
+            personas = sorted({d.get("persona", "") for d in self.docs})
+            doc_persona = np.array([personas.index(d.get("persona", "")) for d in self.docs], dtype=np.int16)
+            arr = {
+                "post_off": np.frombuffer(self._sec["post_off"], dtype="<u8"),
+                "post_ids": np.frombuffer(self._sec["post_ids"], dtype="<u4"),
+                "post_tfs": np.frombuffer(self._sec["post_tfs"], dtype="<u4"),
+                # k1 * (1 - b + b * |d| / avgdl), the per-chunk half of the BM25 denominator
+                "norm": (BM25_K1 * (1.0 - BM25_B + BM25_B * lengths / avgdl)).astype(np.float32),
+                "chunk_persona": doc_persona[chunk_doc] if len(doc_persona) else np.zeros(0, np.int16),
+                "personas": personas,
+            }
+            self._np = arr
+        return arr
+
+    def bm25(self, tokens: Iterable[str], k: int = 8, persona: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (chunk_id, score) by Okapi BM25 for a bag of query tokens, optionally
+        restricted to chunks whose doc belongs to `persona`.
+        """
+        arr = self._arrays()
+        tids = {self.term_id(t) for t in tokens}
+        tids.discard(-1)
+        if not tids or k <= 0 or self.n_chunks == 0:
+            return []
+        n = self.n_chunks
+        ids_parts, w_parts = [], []
+        for tid in sorted(tids):
+            a, b = int(arr["post_off"][tid]), int(arr["post_off"][tid + 1])
+            ids = arr["post_ids"][a:b]
+            tf = arr["post_tfs"][a:b].astype(np.float32)
+            df = b - a
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            ids_parts.append(ids)
+            w_parts.append(idf * tf * (BM25_K1 + 1.0) / (tf + arr["norm"][ids]))
+        ids = np.concatenate(ids_parts)
+        w = np.concatenate(w_parts)
+        if persona is not None:
+            if persona not in arr["personas"]:
+                return []
+            keep = arr["chunk_persona"][ids] == arr["personas"].index(persona)
+            ids, w = ids[keep], w[keep]
+            if not len(ids):
+                return []
+        if len(ids_parts) > 1:
+            ids, inv = np.unique(ids, return_inverse=True)
+            w = np.bincount(inv, weights=w)
+        if len(ids) > k:
+            top = np.argpartition(-w, k - 1)[:k]
+        else:
+            top = np.arange(len(ids))
+        # Highest score first; ties by chunk id for a stable order.
+        top = top[np.lexsort((ids[top], -w[top]))]
+        return [(int(ids[i]), float(w[i])) for i in top]
+
+    def iter_docs(self, kind: Optional[str] = None) -> Iterable[Tuple[int, Dict[str, Any]]]:
+        for i, d in enumerate(self.docs):
+            if kind is None or d.get("kind") == kind:
+                yield i, d
+
+    def close(self) -> None:
+        # Derived views first; mmap.close() refuses while any export is alive.
+        self._np = None
+        for v in (self.lengths, self._term_off, self._post_off, self._post_ids, self._post_tfs):
+            v.release()
+        for v in self._sec.values():
+            v.release()
+        self._mm.close()
+
+
+def _stamp(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def index_stamp(path: Optional[str] = None) -> Optional[Tuple[int, int, int]]:
+    """(inode, mtime, size) of the index file, or None if it is missing."""
+    try:
+        return _stamp(os.stat(path or INDEX_PATH))
+    except OSError:
+        return None
+
+
+def abs_path(rel: str) -> str:
+    return rel if os.path.isabs(rel) else os.path.join(APP_DIR, rel)
+
+
+_OPEN: Optional[ShardIndex] = None
+_OPEN_ERROR: Optional[str] = None
+_TRIED: Optional[Tuple[int, int, int]] = None
+
+
+def open_index(path: Optional[str] = None) -> Optional[ShardIndex]:
+    """
+    Open (once) and return the default index, or None if it is missing/unreadable.
+    The failure reason is kept in last_error() for /healthz.
+    """
+    global _OPEN, _OPEN_ERROR
+    if _OPEN is not None and path in (None, _OPEN.path):
+        return _OPEN
+    p = path or INDEX_PATH
+    try:
+        idx = ShardIndex(p)
+    except FileNotFoundError:
+        _OPEN_ERROR = f"index not built: {p}"
+        return None
+    except (OSError, ValueError) as e:
+        _OPEN_ERROR = f"{type(e).__name__}: {e}"
+        return None
+    _OPEN, _OPEN_ERROR = idx, None
+    return idx
+
+
+def reopen_index() -> Optional[ShardIndex]:
+    """
+    Swap in the index file as it is now (after a rebuild). Requests already holding
+    the old ShardIndex finish on it; if the new file can't be opened the old stays.
+    """
+    global _OPEN
+    old, _OPEN = _OPEN, None
+    if open_index() is None:
+        _OPEN = old
+    return _OPEN
+
+
+def refresh_index() -> bool:
+    """
+    Reopen the default index if its file was replaced since it was opened, e.g. by
+    another worker's build (one stat; the ShardWatcher calls it every poll). Every
+    worker then maps the same new file. True if a new index was swapped in.
+    """
+    global _TRIED
+    stamp = index_stamp()
+    cur = _OPEN
+    if stamp is None or stamp == _TRIED or (cur is not None and cur.stamp == stamp):
+        return False
+    _TRIED = stamp
+    return reopen_index() is not cur
+
+
+def current_index() -> Optional[ShardIndex]:
+    """The open index, without trying to open it."""
+    return _OPEN
+
+
+def last_error() -> Optional[str]:
+    return _OPEN_ERROR
@@ -0,0 +1,165 @@
+# app/shared_state.py
+# State shared by every worker process on the host.
+#
+# The read-only side needs nothing here: the shard/archive index is one file that
+# each worker mmaps (shard_index.py), so its pages live once in the page cache, and a
+# rebuild is picked up by every worker's ShardWatcher. The mutable side lives in
+# SQLite files in WAL mode (readers never block the writer, writers queue on a busy
+# timeout), opened through connect():
+# - response_cache.py and sessions.py keep their own files;
+# - SharedStore (data/shared.sqlite3) holds small keyed blobs with a TTL (the news
+#   feed cache) and fixed-window counters (the upstream request rate limit).
+# file_lock() serializes one-per-host jobs such as the startup index build.
+
+from __future__ import annotations
+import fcntl, json, os, sqlite3, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARED_PATH = os.getenv("DUNSEL_SHARED_PATH", os.path.join(APP_DIR, "data", "shared.sqlite3"))
+BUSY_TIMEOUT = float(os.getenv("DUNSEL_SQLITE_BUSY_TIMEOUT", "2.0"))
+
+
+def connect(path: str, schema: str = "") -> sqlite3.Connection:
+    """
+    SQLite connection for state shared across workers: WAL, autocommit (use BEGIN
+    IMMEDIATE for read-modify-write), usable from any thread under the caller's lock.
+    Raises sqlite3.Error; callers count it and degrade.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    if schema:
+        db.executescript(schema)
+    return db
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[bool]:
+    """
+    Non-blocking exclusive lock on `path` (created if needed). Yields True if this
+    process holds it, False if another does; released on exit or process death.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+    updated REAL NOT NULL, expires REAL NOT NULL, PRIMARY KEY (ns, key));
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT NOT NULL, window INTEGER NOT NULL, count INTEGER NOT NULL,
+    expires REAL NOT NULL, PRIMARY KEY (name, window));
+"""
+
+
+class SharedStore:
+    def __init__(self, path: str = SHARED_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self.counters = {"gets": 0, "hits": 0, "puts": 0, "incrs": 0, "errors": 0}
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self._db = connect(self.path, SCHEMA)
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return None
+        return self._db
+
+    def get(self, ns: str, key: str) -> Optional[Any]:
+        """JSON value stored under (ns, key), or None if missing or expired."""
+        with self._lock:
+            self.counters["gets"] += 1
+            db = self._conn()
+            if db is None:
+                return None
+            try:
+                row = db.execute(
+                    "SELECT value FROM kv WHERE ns = ? AND key = ? AND expires > ?", (ns, key, time.time())
+                ).fetchone()
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return None
+            if row is None:
+                return None
+            self.counters["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, ns: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        blob = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO kv (ns, key, value, updated, expires) VALUES (?, ?, ?, ?, ?)",
+                    (ns, key, blob, now, now + ttl),
+                )
+                self.counters["puts"] += 1
+                self._writes += 1
+                if self._writes % 256 == 0:
+                    self._sweep(db)
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+
+    def incr(self, name: str, window_s: float, n: int = 1) -> Optional[int]:
+        """
+        Add n to the host-wide counter for the current fixed window of `window_s`
+        seconds and return its new value (None if the store is unavailable).
+        """
+        window = int(time.time() // window_s)
+        expires = (window + 1) * window_s
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return None
+            try:
+                count = db.execute(
+                    "INSERT INTO counters (name, window, count, expires) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (name, window) DO UPDATE SET count = count + excluded.count"
+                    " RETURNING count",
+                    (name, window, n, expires),
+                ).fetchone()[0]
+            except sqlite3.Error:
+                self.counters["errors"] += 1
+                return None
+            self.counters["incrs"] += 1
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._sweep(db)
+        return count
+
+    def _sweep(self, db: sqlite3.Connection) -> None:
+        now = time.time()
+        try:
+            db.execute("DELETE FROM kv WHERE expires <= ?", (now,))
+            db.execute("DELETE FROM counters WHERE expires <= ?", (now,))
+        except sqlite3.Error:
+            self.counters["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters)
+
+
+store = SharedStore()
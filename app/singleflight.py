@@ -0,0 +1,121 @@
+# app/singleflight.py
+# Request coalescing for identical persona requests that are already in flight.
+#
+# The first request for a key (the leader) starts the upstream call as its own task;
+# every identical request that arrives before it finishes attaches to that task and
+# gets the same result, or the same exception. Streams are broadcast: deltas are kept
+# in order and each subscriber replays from the start, so a late joiner still sees
+# the whole reply. The upstream task is not tied to any one client, so a leader that
+# disconnects does not cut off its followers.
+
+from __future__ import annotations
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class _Broadcast:
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        ev, self._changed = self._changed, asyncio.Event()
+        ev.set()
+
+    def publish(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        self.done, self.error = True, error
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._tasks: set = set()
+        self.counters = {"leaders": 0, "followers": 0, "stream_leaders": 0, "stream_followers": 0, "shared_errors": 0}
+
+    def _spawn(self, coro: Awaitable[Any]) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._reap)
+        return task
+
+    def _reap(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled():
+            task.exception()  # retrieved here; whoever awaited it has already seen it
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await fn() once per key across concurrent callers. Returns (result, shared),
+        where shared is True for callers that rode on someone else's call.
+        """
+        fut = self._calls.get(key)
+        if fut is not None:
+            self.counters["followers"] += 1
+            try:
+                return await asyncio.shield(fut), True
+            except Exception:
+                self.counters["shared_errors"] += 1
+                raise
+
+        self.counters["leaders"] += 1
+        fut = self._spawn(fn())
+        self._calls[key] = fut
+        fut.add_done_callback(lambda _: self._calls.pop(key, None))
+        # shield: a cancelled leader (client went away) leaves the call running for followers.
+        return await asyncio.shield(fut), False
+
+    def stream(self, key: str, source: Callable[[], AsyncIterator[str]]) -> Tuple[AsyncIterator[str], bool]:
+        """
+        Iterator over one shared upstream stream per key. Returns (deltas, shared).
+        """
+        bc = self._streams.get(key)
+        if bc is not None:
+            self.counters["stream_followers"] += 1
+            return bc.subscribe(), True
+
+        self.counters["stream_leaders"] += 1
+        bc = self._streams[key] = _Broadcast()
+
+        async def pump():
+            try:
+                async for chunk in source():
+                    bc.publish(chunk)
+            except Exception as e:
+                bc.close(e)
+            else:
+                bc.close()
+            finally:
+                self._streams.pop(key, None)
+
+        self._spawn(pump())
+        return bc.subscribe(), False
+
+    def running(self, key: str) -> bool:
+        """Whether a call or stream for `key` is in flight (a new caller would join it)."""
+        return key in self._calls or key in self._streams
+
+    def stats(self) -> Dict[str, int]:
+        out = dict(self.counters)
+        out["saved_upstream_calls"] = out["followers"] + out["stream_followers"]
+        out["inflight"] = len(self._calls) + len(self._streams)
+        return out
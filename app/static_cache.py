@@ -0,0 +1,174 @@
+# app/static_cache.py
+# The UI's HTML pages and /static assets, held in memory and precompressed.
+#
+# Each file is read once, hashed and compressed (gzip, plus brotli when the optional
+# `brotli` package is installed), then served from memory with a strong ETag per
+# encoding; a matching If-None-Match gets a bodyless 304. Files are stat()ed at most
+# once per STAT_INTERVAL and reloaded when their mtime or size changes, so edits on
+# the static bind mount show up without a restart.
+#
+# Caching: everything is `no-cache`, so browsers and the Cloudflare edge revalidate,
+# which costs a bodyless 304. The pages carry their CSS and JS inline, so there are no
+# asset URLs to fingerprint and no file is ever served as long-lived immutable.
+#
+# Imports only stdlib + starlette, so boot.py can serve from it before server.py loads.
+
+from __future__ import annotations
+import gzip, hashlib, mimetypes, os, stat, threading, time
+from email.utils import formatdate
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+STAT_INTERVAL = float(os.getenv("DUNSEL_STATIC_STAT_INTERVAL", "1.0"))
+# Bigger files are left to StaticFiles (streamed from disk, not held in memory).
+MAX_BYTES = int(os.getenv("DUNSEL_STATIC_MAX_BYTES", str(1 << 20)))
+MIN_COMPRESS_BYTES = 256
+
+REVALIDATE = "no-cache"
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+ENCODINGS = ("br", "gzip")  # preference order
+
+
+class Asset:
+    __slots__ = ("mtime", "size", "checked", "media_type", "last_modified", "bodies", "etags")
+
+    def __init__(self, path: str, st: os.stat_result):
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        self.mtime, self.size = st.st_mtime_ns, st.st_size
+        self.checked = time.monotonic()
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.bodies: Dict[str, bytes] = {"identity": data}
+        if len(data) >= MIN_COMPRESS_BYTES and self.media_type.startswith(COMPRESSIBLE):
+            packed = {"gzip": gzip.compress(data, 9, mtime=0)}
+            if brotli is not None:
+                packed["br"] = brotli.compress(data, quality=11)
+            self.bodies.update((enc, body) for enc, body in packed.items() if len(body) < len(data))
+        # Strong validators are per representation, so each encoding gets its own.
+        self.etags = {enc: f'"{digest[:32]}"' if enc == "identity" else f'"{digest[:32]}-{enc}"'
+                      for enc in self.bodies}
+
+
+def _accepted(header: str) -> set:
+    out = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        out.add(name.strip().lower())
+    return out
+
+
+class StaticCache:
+    def __init__(self, root: Path = STATIC_DIR):
+        self.root = os.path.realpath(root)
+        self._assets: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+        self._stats = {"loads": 0, "hits": 0, "not_modified": 0, "compressed": 0, "bytes_sent": 0, "bytes_saved": 0}
+
+    def get(self, rel: str) -> Optional[Asset]:
+        """Asset for a path relative to the root, or None (missing, not a regular file, too big)."""
+        cur = self._assets.get(rel)
+        now = time.monotonic()
+        if cur is not None and now - cur.checked < STAT_INTERVAL:
+            return cur
+        path = os.path.realpath(os.path.join(self.root, rel))
+        if not path.startswith(self.root + os.sep):
+            return None
+        try:
+            st = os.stat(path)
+        except (OSError, ValueError):
+            self._assets.pop(rel, None)
+            return None
+        if not stat.S_ISREG(st.st_mode) or st.st_size > MAX_BYTES:
+            return None
+        if cur is not None and (cur.mtime, cur.size) == (st.st_mtime_ns, st.st_size):
+            cur.checked = now
+            return cur
+        with self._lock:
+            try:
+                asset = Asset(path, st)
+            except OSError:
+                return None
+            self._assets[rel] = asset
+            self._stats["loads"] += 1
+        return asset
+
+    def preload(self) -> int:
+        """Load every file under the root (warm-up); returns how many are held."""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if not name.startswith("."):
+                    self.get(os.path.relpath(os.path.join(dirpath, name), self.root))
+        return len(self._assets)
+
+    def response(self, asset: Asset, headers: Headers) -> Response:
+        accepted = _accepted(headers.get("accept-encoding", ""))
+        enc = next((e for e in ENCODINGS if e in asset.bodies and e in accepted), "identity")
+        out = {
+            "etag": asset.etags[enc],
+            "cache-control": REVALIDATE,
+            "last-modified": asset.last_modified,
+        }
+        if len(asset.bodies) > 1:
+            out["vary"] = "Accept-Encoding"
+        inm = headers.get("if-none-match")
+        if inm and (inm.strip() == "*" or any(
+                tag.strip().removeprefix("W/") in asset.etags.values() for tag in inm.split(","))):
+            self._stats["not_modified"] += 1
+            return Response(status_code=304, headers=out)
+        body = asset.bodies[enc]
+        if enc != "identity":
+            out["content-encoding"] = enc
+            self._stats["compressed"] += 1
+        self._stats["hits"] += 1
+        self._stats["bytes_sent"] += len(body)
+        self._stats["bytes_saved"] += asset.size - len(body)
+        return Response(body, media_type=asset.media_type, headers=out)
+
+    def page(self, rel: str, headers: Headers, missing: str) -> Response:
+        """An HTML page from the root (no-cache + ETag), or `missing` as plain text."""
+        asset = self.get(rel)
+        if asset is None:
+            return PlainTextResponse(missing, status_code=200)
+        return self.response(asset, headers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "assets": len(self._assets), "bytes_held": sum(
+            sum(len(b) for b in a.bodies.values()) for a in self._assets.values()), "brotli": brotli is not None}
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles serving from a StaticCache; anything the cache doesn't hold falls through."""
+
+    def __init__(self, cache: StaticCache, **kwargs):
+        super().__init__(directory=cache.root, **kwargs)
+        self.cache = cache
+
+    async def get_response(self, path: str, scope) -> Response:
+        if scope["method"] in ("GET", "HEAD"):
+            asset = self.cache.get(path)
+            if asset is not None:
+                return self.cache.response(asset, Headers(scope=scope))
+        return await super().get_response(path, scope)
+
+
+STATIC = StaticCache()
@@ -0,0 +1,273 @@
+# app/story_index.py
+# Near-duplicate headline clustering (MinHash + LSH banding) over a rolling window.
+#
+# The same event arrives from several outlets with slightly different wording. Each
+# cleaned feed headline gets a MinHash signature over its words; signatures are split
+# into bands, and a headline that shares a band with a recent one is compared against
+# it. A candidate above THRESHOLD (estimated word Jaccard, set low for recall) is then
+# checked by same_story(), which rejects the pairs word overlap can't tell apart: a
+# name swapped for another, two names in the opposite order, or one word flipped to
+# its opposite ("Biden/Trump wins ...", "Iran strikes Israel" / "Israel strikes Iran",
+# "Stocks rise/fall ..."). Near-duplicates join that story's cluster and report its
+# representative headline: news.latest_items() shows one item per story and
+# /news/opine asks for one take per story.
+#
+# Everything lives in fixed-size NumPy arrays (a ring buffer of signatures and one
+# direct-mapped bucket table per band) plus one headline per ring slot, so memory and
+# lookup cost are bounded by max_items, not by traffic. The process-wide index
+# (stories()) is only allocated when the first feed is parsed.
+
+from __future__ import annotations
+import os, re, threading, time, zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+THRESHOLD = float(os.getenv("DUNSEL_STORY_THRESHOLD", "0.5"))          # estimated Jaccard
+WINDOW_SECONDS = float(os.getenv("DUNSEL_STORY_WINDOW_SECONDS", str(12 * 3600)))
+MAX_ITEMS = int(os.getenv("DUNSEL_STORY_MAX_ITEMS", "100000"))
+NUM_PERM = int(os.getenv("DUNSEL_STORY_PERMUTATIONS", "48"))
+
+_PRIME = np.uint64(4294967291)  # largest prime below 2**32
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# Words that say nothing about which story it is.
+STOPWORDS = frozenset(
+    "a an and as at by for from in into is it its of on or over the to up with after amid "
+    "about new says say said report reports".split()
+)
+
+
+def _bands_for(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bands, rows) with bands * rows == num_perm whose LSH S-curve midpoint
+    (1/bands) ** (1/rows) is the highest one not above the threshold. Erring low
+    trades a few extra candidate checks for recall; the signature comparison
+    filters them.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows == 0 and (rows / num_perm) ** (1 / rows) <= threshold:
+            best = (num_perm // rows, rows)
+    return best
+
+
+def _fold(w: str) -> str:
+    # Plural -s folded so "strike" / "strikes" count as one word.
+    return w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+
+
+# One word turned into its opposite; everything else in the headline can match.
+OPPOSED = frozenset(
+    frozenset(map(_fold, pair)) for pair in [
+        ("rise", "fall"), ("rises", "falls"), ("gain", "loss"), ("gains", "drops"),
+        ("win", "lose"), ("wins", "loses"), ("accepts", "rejects"), ("approves", "rejects"),
+        ("passes", "blocks"), ("passes", "fails"), ("backs", "opposes"), ("opens", "closes"),
+        ("lifts", "imposes"), ("raises", "cuts"), ("hikes", "cuts"), ("ends", "extends"),
+    ]
+)
+
+
+def _tokens(text: str) -> List[Tuple[str, bool]]:
+    # (folded lowercase word, written capitalized?) in headline order, stopwords dropped.
+    out = []
+    for w in _WORD_RE.findall(text or ""):
+        low = w.lower()
+        if low not in STOPWORDS:
+            out.append((_fold(low), w[0].isupper()))
+    return out
+
+
+def shingles(text: str) -> List[str]:
+    """Distinct words of a cleaned headline (lowercased, stopwords dropped, plural -s folded)."""
+    return sorted({w for w, _ in _tokens(text)})
+
+
+def same_story(a: str, b: str) -> bool:
+    """
+    Verification for a MinHash candidate pair, from the words alone: False if each side
+    has a name the other lacks, two names both sides share come in the opposite order,
+    or a word on one side is the opposite of a word only the other side has.
+    """
+    ta, tb = _tokens(a), _tokens(b)
+    wa, wb = {w for w, _ in ta}, {w for w, _ in tb}
+    only_a, only_b = wa - wb, wb - wa
+    if any(cap and w in only_a for w, cap in ta) and any(cap and w in only_b for w, cap in tb):
+        return False
+    names = {w for w, cap in ta if cap} & {w for w, cap in tb if cap}
+    order_a = [w for w in dict.fromkeys(w for w, _ in ta) if w in names]
+    order_b = [w for w in dict.fromkeys(w for w, _ in tb) if w in names]
+    if order_a != order_b:
+        return False
+    return not any(frozenset((x, y)) in OPPOSED for x in only_a for y in only_b)
+
+
+class StoryIndex:
+    def __init__(
+        self,
+        threshold: float = THRESHOLD,
+        window: float = WINDOW_SECONDS,
+        max_items: int = MAX_ITEMS,
+        num_perm: int = NUM_PERM,
+        seed: int = 1,
+    ):
+        self.threshold = threshold
+        self.window = window
+        self.max_items = max_items
+        self.num_perm = num_perm
+        self.bands, self.rows = _bands_for(threshold, num_perm)
+
+        rnd = np.random.default_rng(seed)
+        self._a = rnd.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rnd.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._band_mult = rnd.integers(1, 2**63, size=(self.bands, self.rows), dtype=np.uint64) | np.uint64(1)
+
+        # Ring buffer of recent headlines; slot (head - count) % max_items is the oldest.
+        self._sigs = np.zeros((max_items, num_perm), dtype=np.uint32)
+        self._ts = np.zeros(max_items, dtype=np.float64)
+        self._cluster = np.zeros(max_items, dtype=np.int64)
+        self._texts: List[str] = [""] * max_items
+        self._head = 0
+        self._count = 0
+        # Per band, bucket -> newest slot hashed there (-1 empty). Collisions just
+        # overwrite: any recent member leads to its cluster, and every candidate is
+        # verified against its signature, so nothing needs deleting on eviction.
+        self._nbuckets = 1 << max(10, (2 * max_items - 1).bit_length())
+        self._table = np.full((self.bands, self._nbuckets), -1, dtype=np.int32)
+        self._band_rows = np.arange(self.bands)
+        # cluster id -> [representative headline, live members, total members]
+        self._clusters: Dict[int, List[Any]] = {}
+        self._next_cluster = 1
+        self._lock = threading.Lock()
+        self.counters = {"lookups": 0, "joined": 0, "new": 0, "evicted": 0, "skipped": 0, "rejected": 0}
+
+    # -- signatures ---------------------------------------------------
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        words = shingles(text)
+        if not words:
+            return None
+        h = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+        # (a*h + b) mod p per permutation; a, h < 2**32 so the product fits in uint64.
+        return ((h[:, None] * self._a + self._b) % _PRIME).min(axis=0).astype(np.uint32)
+
+    def _buckets(self, sig: np.ndarray) -> np.ndarray:
+        v = (sig.reshape(self.bands, self.rows).astype(np.uint64) * self._band_mult).sum(axis=1)
+        return (v >> np.uint64(20)).astype(np.int64) & (self._nbuckets - 1)
+
+    # -- window maintenance --------------------------------------------
+
+    def _evict_oldest(self) -> None:
+        slot = (self._head - self._count) % self.max_items
+        cid = int(self._cluster[slot])
+        cluster = self._clusters.get(cid)
+        if cluster is not None:
+            cluster[1] -= 1
+            if cluster[1] <= 0:
+                del self._clusters[cid]
+        self._count -= 1
+        self.counters["evicted"] += 1
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._count and self._ts[(self._head - self._count) % self.max_items] < cutoff:
+            self._evict_oldest()
+
+    # -- public API ------------------------------------------------------
+
+    def assign(self, text: str, now: Optional[float] = None) -> Tuple[int, str, bool]:
+        """
+        Add one cleaned headline to the window. Returns (cluster id, the cluster's
+        representative headline, joined an existing cluster?). Headlines with no
+        usable words get cluster 0 and come back unchanged.
+        """
+        sig = self.signature(text)
+        now = time.time() if now is None else now
+        with self._lock:
+            self.counters["lookups"] += 1
+            if sig is None:
+                self.counters["skipped"] += 1
+                return 0, text, False
+            self._expire(now)
+            buckets = self._buckets(sig)
+
+            slots = np.unique(self._table[self._band_rows, buckets])
+            slots = slots[slots >= 0]
+            # Only slots still inside the window count (the table is never cleaned).
+            slots = slots[(self._head - 1 - slots) % self.max_items < self._count]
+            best_cid = 0
+            if len(slots):
+                sims = (self._sigs[slots] == sig).mean(axis=1)
+                for i in np.argsort(-sims, kind="stable"):
+                    if sims[i] < self.threshold:
+                        break
+                    if same_story(text, self._texts[slots[i]]):
+                        best_cid = int(self._cluster[slots[i]])
+                        break
+                    self.counters["rejected"] += 1
+
+            if self._count == self.max_items:
+                self._evict_oldest()
+            if best_cid and best_cid not in self._clusters:
+                best_cid = 0  # its last member was just evicted to make room
+            joined = bool(best_cid)
+            if joined:
+                cluster = self._clusters[best_cid]
+                cluster[1] += 1
+                cluster[2] += 1
+                self.counters["joined"] += 1
+            else:
+                best_cid = self._next_cluster
+                self._next_cluster += 1
+                cluster = self._clusters[best_cid] = [text, 1, 1]
+                self.counters["new"] += 1
+
+            slot = self._head
+            self._sigs[slot] = sig
+            self._ts[slot] = now
+            self._cluster[slot] = best_cid
+            self._texts[slot] = text
+            self._table[self._band_rows, buckets] = slot
+            self._head = (self._head + 1) % self.max_items
+            self._count += 1
+            return best_cid, cluster[0], joined
+
+    def canonical(self, text: str) -> str:
+        """Representative headline of the story `text` belongs to (adds it to the window)."""
+        return self.assign(text)[1]
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self.counters)
+        out.update({
+            "items": self._count,
+            "clusters": len(self._clusters),
+            "buckets_per_band": self._nbuckets,
+            "memory_bytes": self._sigs.nbytes + self._table.nbytes + self._ts.nbytes + self._cluster.nbytes,
+            "max_items": self.max_items,
+            "threshold": self.threshold,
+            "bands": self.bands,
+            "rows": self.rows,
+            "window_seconds": self.window,
+        })
+        return out
+
+
+_STORIES: Optional[StoryIndex] = None
+_STORIES_LOCK = threading.Lock()
+
+
+def stories() -> StoryIndex:
+    """The process-wide index, created on first use (its arrays are sized by MAX_ITEMS)."""
+    global _STORIES
+    if _STORIES is None:
+        with _STORIES_LOCK:
+            if _STORIES is None:
+                _STORIES = StoryIndex()
+    return _STORIES
+
+
+def stats() -> Dict[str, Any]:
+    """stories().stats() without allocating the index just to report it."""
+    if _STORIES is None:
+        return {"items": 0, "clusters": 0, "memory_bytes": 0, "allocated": False}
+    return {**_STORIES.stats(), "allocated": True}
@@ -1,6 +1,7 @@
 # app/utils/kosh_headline.py
 
 import re
+from typing import Any, Dict, Iterable, List
 
 # Words that add emotional color but not structure. We strip them.
 EMOTIONAL_ADJECTIVES = {
@@ -38,7 +39,7 @@ OUTLET_SUFFIX_RE = re.compile(
 
 HASHTAG_MENTION_RE = re.compile(r"([#@][\w_]+)")
 
-EMOJI_RE = re.compile(
+_EMOJI_CLASS = (
     "["                       # crude emoji strip
     "\U0001F300-\U0001F5FF"
     "\U0001F600-\U0001F64F"
@@ -49,25 +50,56 @@ EMOJI_RE = re.compile(
     "\U0001F900-\U0001F9FF"
     "\U0001FA00-\U0001FA6F"
     "\U0001FA70-\U0001FAFF"
-    "]+"
+    "]"
 )
+EMOJI_RE = re.compile(_EMOJI_CLASS + "+")
+
+# -------------------------------------------------------------------
+# Precompiled single-pass forms of the steps in preprocess_headline_for_kosh
+# -------------------------------------------------------------------
+
+# Emoji and #tags/@mentions in one sweep. Emoji used to be stripped first, which made
+# them invisible inside a tag ("#foo🔥bar" went as a whole), so the tag branch steps
+# over them the same way.
+_NOISE_RE = re.compile(
+    f"[#@]{_EMOJI_CLASS}*\\w(?:\\w|{_EMOJI_CLASS})*|{_EMOJI_CLASS}+"
+)
+
+# Loud verbs as one alternation; group number -> replacement. The patterns never
+# overlap and no replacement re-creates a match, so one left-to-right pass gives
+# what applying them one after another did. Every pattern is \b...\b, so the word
+# boundaries and a first-letter lookahead are hoisted out of the alternation.
+_VERB_WORDS = [p[2:-2] for p in VERB_NORMALIZATION]
+_VERB_RE = re.compile(
+    r"\b(?=[" + "".join(sorted({w[0] for w in _VERB_WORDS})) + r"])"
+    + "(?:" + "|".join(f"({w})" for w in _VERB_WORDS) + r")\b",
+    flags=re.IGNORECASE,
+)
+_VERB_REPL = list(VERB_NORMALIZATION.values())
+
+# Everything _remove_emotional_adjectives drops from a word to get its bare form,
+# except the spaces the words are joined with.
+_NOT_BARE_RE = re.compile(r"[^\w' ]")
+
+_QUESTION_RE = re.compile(r"^(why|how|what|is|are|does|do)\s+(.*)$", flags=re.IGNORECASE)
+
+_SEPARATORS = ("—", "–", ";")
+
+
+def _verb_sub(m: "re.Match") -> str:
+    return _VERB_REPL[m.lastindex - 1]
 
 
 def _normalize_verbs(text: str) -> str:
-    for pattern, replacement in VERB_NORMALIZATION.items():
-        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-    return text
+    return _VERB_RE.sub(_verb_sub, text)
 
 
 def _remove_emotional_adjectives(text: str) -> str:
     words = text.split()
-    cleaned = []
-    for w in words:
-        bare = re.sub(r"[^\w']", "", w).lower()
-        if bare in EMOTIONAL_ADJECTIVES:
-            continue
-        cleaned.append(w)
-    return " ".join(cleaned)
+    # Bare forms for all words at once: the words hold no whitespace, so the joined
+    # string splits back on single spaces one-to-one (empty bare forms included).
+    bare = _NOT_BARE_RE.sub("", " ".join(words)).lower().split(" ")
+    return " ".join([w for w, b in zip(words, bare) if b not in EMOTIONAL_ADJECTIVES])
 
 
 def _strip_question_wrapping(text: str) -> str:
@@ -75,7 +107,7 @@ def _strip_question_wrapping(text: str) -> str:
     if t.endswith("?"):
         t = t[:-1].strip()
     # e.g. "Why this election matters" -> "This election matters"
-    m = re.match(r"^(why|how|what|is|are|does|do)\s+(.*)$", t, flags=re.IGNORECASE)
+    m = _QUESTION_RE.match(t)
     if m:
         t = m.group(2).strip()
     return t
@@ -99,8 +131,7 @@ def preprocess_headline_for_kosh(raw: str) -> str:
     text = raw.strip()
 
     # Remove emojis and hashtags/@mentions
-    text = EMOJI_RE.sub("", text)
-    text = HASHTAG_MENTION_RE.sub("", text)
+    text = _NOISE_RE.sub("", text)
 
     # Remove outlet suffixes (e.g., "- The New York Times")
     text = OUTLET_SUFFIX_RE.sub("", text)
@@ -109,14 +140,15 @@ def preprocess_headline_for_kosh(raw: str) -> str:
     text = SECTION_PREFIX_RE.sub("", text)
 
     # Split on hard separators, keep the first meaningful chunk
-    for sep in ["—", "–", ";"]:
+    for sep in _SEPARATORS:
         if sep in text:
             parts = [p.strip() for p in text.split(sep) if p.strip()]
             if parts:
                 text = parts[0]
                 break
 
-    # Remove emotional adjectives/adverbs
+    # Remove emotional adjectives/adverbs; this also collapses whitespace, and
+    # nothing after it adds any, so there is no separate collapse pass.
     text = _remove_emotional_adjectives(text)
 
     # Normalize loaded verbs
@@ -125,41 +157,120 @@ def preprocess_headline_for_kosh(raw: str) -> str:
     # Clean question-style headlines
     text = _strip_question_wrapping(text)
 
-    # Collapse whitespace
-    text = re.sub(r"\s+", " ", text)
-
     # Final length control
-    text = _truncate_words(text, max_words=20)
-
-    return text.strip()
+    return _truncate_words(text, max_words=20)
 
 
-def infer_tag_from_text(text: str) -> str:
+def preprocess_many(headlines: Iterable[str]) -> List[str]:
     """
-    Fallback tag inference if the caller doesn't provide tags.
-    Very rough, but enough to choose Kosh mode.
+    preprocess_headline_for_kosh() over a whole feed pull, in order. Repeated
+    headlines (the same wire story in several feeds) are only processed once;
+    distinct ones cost the same as calling the single-item function.
     """
-    t = (text or "").lower()
-
-    if any(w in t for w in ["election", "vote", "ballot", "senate", "parliament", "congress", "supreme court"]):
-        return "politics_now"
+    seen: Dict[str, str] = {}
+    out = []
+    for raw in headlines:
+        clean = seen.get(raw)
+        if clean is None:
+            clean = seen[raw] = preprocess_headline_for_kosh(raw)
+        out.append(clean)
+    return out
+
+
+# -------------------------------------------------------------------
+# Tag scoring
+# -------------------------------------------------------------------
+
+# tag -> keywords. Order matters: it breaks ties between equal scores, so the
+# older "first list that matches wins" priority still holds on a tie.
+TAG_KEYWORDS: Dict[str, List[str]] = {
+    "politics_now": ["election", "vote", "ballot", "senate", "parliament", "congress", "supreme court"],
+    "war": ["war", "invasion", "strike", "missile", "shelling", "artillery", "bombing", "airstrike"],
+    "climate": ["climate", "heatwave", "heat wave", "wildfire", "wild fire", "flood", "hottest", "record temperatures", "drought"],
+    "economy": ["stock", "market", "inflation", "wage", "union", "strike", "layoff", "bank failure", "recession"],
+    "tech": ["ai", "artificial intelligence", "algorithm", "data breach", "surveillance", "neural network"],
+    "celebrity": ["singer", "actor", "actress", "rapper", "influencer", "celebrity", "pop star", "movie star"],
+    "viral": ["meme", "challenge", "trend", "tiktok", "goes viral", "viral video"],
+}
 
-    if any(w in t for w in ["war", "invasion", "strike", "missile", "shelling", "artillery", "bombing", "airstrike"]):
-        return "war"
+_WORD_RE = re.compile(r"[^\W_]+")
 
-    if any(w in t for w in ["climate", "heatwave", "heat wave", "wildfire", "wild fire", "flood", "hottest", "record temperatures", "drought"]):
-        return "climate"
 
-    if any(w in t for w in ["stock", "market", "inflation", "wage", "union", "strike", "layoff", "bank failure", "recession"]):
-        return "economy"
+class TagScorer:
+    """
+    Multi-pattern keyword matcher over word tokens, built once from a tag -> keywords
+    table. Keywords match whole words only ("ai" never fires inside "said"), and a
+    trailing plural -s/-es on a word is accepted ("wildfires", "heat waves").
 
-    if any(w in t for w in ["ai", "artificial intelligence", "algorithm", "data breach", "surveillance", "neural network"]):
-        return "tech"
+    The automaton is a trie keyed by word. Matches can only begin at a word start,
+    so the failure transition of a character-level Aho-Corasick machine reduces to
+    "restart at the next word"; every match is found in one left-to-right pass.
+    """
 
-    if any(w in t for w in ["singer", "actor", "actress", "rapper", "influencer", "celebrity", "pop star", "movie star"]):
-        return "celebrity"
+    def __init__(self, table: Dict[str, List[str]]):
+        self.tags = list(table)
+        self._root: Dict[str, Any] = {}
+        for tag in self.tags:
+            for kw in table[tag]:
+                node = self._root
+                for word in _WORD_RE.findall(kw.lower()):
+                    node = node.setdefault(word, {})
+                node.setdefault(None, []).append(tag)   # None key = terminal, tags it scores
+        self._add_plurals(self._root)
+
+    def _add_plurals(self, node: Dict[str, Any]) -> None:
+        # Edges for word+"s" / word+"es" point at the same child, so a scan step is a
+        # single dict lookup. Real keywords win over a plural alias of the same spelling.
+        words = [w for w in node if w is not None]
+        for word in words:
+            self._add_plurals(node[word])
+        for word in words:
+            node.setdefault(word + "s", node[word])
+            node.setdefault(word + "es", node[word])
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """Keyword hits per tag (every tag present, zero if nothing matched)."""
+        out = dict.fromkeys(self.tags, 0)
+        words = _WORD_RE.findall((text or "").lower())
+        root = self._root
+        n = len(words)
+        for i in [i for i, w in enumerate(words) if w in root]:
+            node = root[words[i]]
+            j = i + 1
+            while node is not None:
+                for tag in node.get(None, ()):
+                    out[tag] += 1
+                if j == n:
+                    break
+                node = node.get(words[j])
+                j += 1
+        return out
+
+    def rank(self, scores: Dict[str, int]) -> List[str]:
+        """Tags with a non-zero score, best first; ties keep table order."""
+        order = {t: i for i, t in enumerate(self.tags)}
+        return sorted((t for t, n in scores.items() if n > 0), key=lambda t: (-scores[t], order[t]))
+
+
+TAG_SCORER = TagScorer(TAG_KEYWORDS)
+
+
+def score_tags(text: str) -> Dict[str, int]:
+    """Keyword hits for every tag in TAG_KEYWORDS."""
+    return TAG_SCORER.scores(text)
+
+
+def infer_tags_from_text(text: str, max_tags: int = 2) -> List[str]:
+    """
+    Tags ordered by score, strongest first (Kosh treats the first one as primary).
+    Falls back to ["other"] when nothing matches.
+    """
+    return TAG_SCORER.rank(TAG_SCORER.scores(text))[:max_tags] or ["other"]
 
-    if any(w in t for w in ["meme", "challenge", "trend", "tiktok", "goes viral", "viral video"]):
-        return "viral"
 
-    return "other"
+def infer_tag_from_text(text: str) -> str:
+    """
+    Fallback tag inference if the caller doesn't provide tags.
+    Very rough, but enough to choose Kosh mode.
+    """
+    return infer_tags_from_text(text, max_tags=1)[0]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Micro-batching bench: concurrent Kosh headline requests with batching on vs off.
+
+Drives the real FastAPI app in-process (httpx ASGI transport) against a local fake
+chat-completions upstream with fixed latency. The fake answers multi-item requests
+with one reply per id, so the whole path runs: queueing, the batched prompt,
+parsing and fan-out. It reports upstream calls, prompt size (characters, and an
+estimate of tokens at 4 chars each) and wall time.
+--garble makes the fake return unparseable batch output to exercise the fallback.
+
+    python tools/bench_batcher.py [--requests 48] [--latency 0.3] [--garble]
+"""
+import argparse, asyncio, json, os, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+sys.path.insert(0, str(ROOT / "tools"))
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["DUNSEL_RESPONSE_CACHE"] = "0"  # every request must reach the upstream path
+
+import httpx  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+import llm  # noqa: E402
+import server  # noqa: E402
+from bench_kosh_headline import synth_headlines  # noqa: E402
+
+STATS = {"calls": 0, "prompt_chars": 0}
+
+
+def fake_upstream(latency: float, garble: bool):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        STATS["calls"] += 1
+        STATS["prompt_chars"] += sum(len(m["content"]) for m in body["messages"])
+        await asyncio.sleep(latency)
+        if body.get("response_format", {}).get("type") == "json_object":
+            items = json.loads(body["messages"][-1]["content"])
+            content = "not json" if garble else json.dumps(
+                {"replies": [{"id": it["id"], "reply": f"The pattern repeats. ({it['id']})"} for it in items]}
+            )
+        else:
+            content = "The pattern repeats."
+        return httpx.Response(200, json={
+            "id": "x", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+    return handler
+
+
+async def run(n: int, headlines, batch: bool):
+    server.BATCH_ENABLED = batch
+    STATS.update(calls=0, prompt_chars=0)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        rs = await asyncio.gather(*(
+            client.post("/dunsel/api/chat/dunsel_kosh_news", json={"message": h}) for h in headlines[:n]
+        ))
+        wall = time.perf_counter() - t0
+    assert all(r.status_code == 200 and r.json()["reply"] for r in rs), [r.text for r in rs if r.status_code != 200][:3]
+    return {
+        "batching": batch,
+        "requests": n,
+        "upstream_calls": STATS["calls"],
+        "prompt_chars": STATS["prompt_chars"],
+        "prompt_tokens_est": STATS["prompt_chars"] // 4,
+        "wall_s": round(wall, 3),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=48)
+    ap.add_argument("--latency", type=float, default=0.3)
+    ap.add_argument("--garble", action="store_true")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    llm._client = AsyncOpenAI(
+        api_key="bench", http_client=httpx.AsyncClient(transport=httpx.MockTransport(fake_upstream(args.latency, args.garble)))
+    )
+    headlines = [h for h in synth_headlines(4 * args.requests, seed=21) if len(h.split()) > 4]
+
+    async def both():
+        return [await run(args.requests, headlines, False), await run(args.requests, headlines, True)]
+
+    res = asyncio.run(both())
+    print(f"{'batching':>9} {'requests':>9} {'calls':>6} {'prompt tok~':>12} {'wall s':>7}")
+    for r in res:
+        print(f"{str(r['batching']):>9} {r['requests']:>9} {r['upstream_calls']:>6} {r['prompt_tokens_est']:>12,} {r['wall_s']:>7}")
+    off, on = res
+    print(f"prompt tokens cut {off['prompt_chars'] / max(on['prompt_chars'], 1):.1f}x, "
+          f"upstream calls cut {off['upstream_calls'] / max(on['upstream_calls'], 1):.1f}x")
+    print("batcher:", server.BATCHER.stats())
+    if args.json:
+        Path(args.json).write_text(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+BM25 retrieval benchmark over a synthetic index.
+
+Writes an index with N chunks straight from NumPy arrays (same on-disk format as
+build_index.py), reopens it through ShardIndex (mmap) and times bm25() queries.
+
+    python tools/bench_bm25.py [--chunks 1000000] [--terms-per-chunk 24] [--queries 300]
+"""
+import argparse, json, os, statistics, sys, tempfile, time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+import shard_index  # noqa: E402
+
+
+def synth_index(path, n_chunks, per_chunk, vocab_size, seed=7):
+    rnd = np.random.default_rng(seed)
+    # Zipf-ish term draws, de-duplicated per chunk into (term, chunk, tf) postings.
+    terms = (rnd.zipf(1.3, size=n_chunks * per_chunk) - 1) % vocab_size
+    chunks = np.repeat(np.arange(n_chunks, dtype=np.uint32), per_chunk)
+    pair = terms.astype(np.uint64) * n_chunks + chunks
+    pair, tfs = np.unique(pair, return_counts=True)
+    term_ids = (pair // n_chunks).astype(np.int64)
+    post_ids = (pair % n_chunks).astype("<u4")
+    post_tfs = tfs.astype("<u4")
+    post_off = np.zeros(vocab_size + 1, dtype="<u8")
+    np.cumsum(np.bincount(term_ids, minlength=vocab_size), out=post_off[1:])
+
+    words = [f"t{i:06d}".encode() for i in range(vocab_size)]  # zero-padded: sorted == id order
+    term_off = np.zeros(vocab_size + 1, dtype="<u8")
+    term_off[1:] = np.cumsum([len(w) for w in words])
+    lengths = np.full(n_chunks, per_chunk, dtype="<u4")
+    chunk_rows = np.zeros(n_chunks, dtype=[("doc", "<u4"), ("pad", "<u4"), ("off", "<u8"), ("len", "<u8")])
+    meta = {"docs": [{"kind": "archive", "persona": "kirk", "id": "synthetic", "title": "synthetic"}], "sources": []}
+    payloads = {
+        "docs": json.dumps(meta).encode(),
+        "chunks": chunk_rows,
+        "lengths": lengths,
+        "text": b"",
+        "term_off": term_off,
+        "term_text": b"".join(words),
+        "post_off": post_off,
+        "post_ids": post_ids,
+        "post_tfs": post_tfs,
+    }
+    shard_index.write_sections(path, payloads, 1, n_chunks, vocab_size, float(per_chunk))
+    return len(post_ids)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=1_000_000)
+    ap.add_argument("--terms-per-chunk", type=int, default=24)
+    ap.add_argument("--vocab", type=int, default=200_000)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.idx")
+        t0 = time.perf_counter()
+        n_post = synth_index(path, args.chunks, args.terms_per_chunk, args.vocab)
+        build_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        idx = shard_index.ShardIndex(path)
+        idx.bm25(["t000100"], k=args.k)  # first call builds the NumPy views
+        open_ms = (time.perf_counter() - t0) * 1000
+
+        rnd = np.random.default_rng(11)
+        lat = []
+        for _ in range(args.queries):
+            # 3-6 terms, mostly mid-frequency with the odd head term, like a chat message.
+            q = [f"t{int(x):06d}" for x in rnd.integers(5, 5000, size=rnd.integers(3, 7))]
+            t0 = time.perf_counter()
+            idx.bm25(q, k=args.k)
+            lat.append((time.perf_counter() - t0) * 1000)
+        idx.close()
+
+    lat.sort()
+    res = {
+        "chunks": args.chunks,
+        "postings": n_post,
+        "build_s": round(build_s, 2),
+        "open_ms": round(open_ms, 2),
+        "p50_ms": round(statistics.median(lat), 3),
+        "p95_ms": round(lat[int(len(lat) * 0.95) - 1], 3),
+        "max_ms": round(lat[-1], 3),
+    }
+    print(json.dumps(res, indent=2))
+    if args.json:
+        Path(args.json).write_text(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
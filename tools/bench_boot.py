@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how soon after `uvicorn ...` starts does the app answer?
+
+For each entrypoint (default: boot:app, the fast-start wrapper, and server:app, the
+app imported directly) starts uvicorn --runs times from a fresh process and measures,
+from the spawn:
+- static: first 200 for GET /static/<file> (the UI can render),
+- page:   first 200 for GET /,
+- chat:   first 200 for GET /metrics (a route only the full app serves),
+- ready:  first 200 for GET /readyz (warm-up finished),
+and collects the boot milestones and warm-up stage timings /readyz reports.
+The upstream is tools/fake_llm.py, so the warm-up pre-connect stays local.
+
+    python tools/bench_boot.py [--runs 5] [--apps boot:app,server:app] [--json out.json]
+"""
+import argparse, json, os, statistics, sys, tempfile, time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "tools"))
+from loadtest import free_port, spawn, wait_http  # noqa: E402
+
+PROBES = [("static", "/static/{static}"), ("page", "/"), ("chat", "/metrics"), ("ready", "/readyz")]
+
+
+def one_boot(app: str, args, tmp: str) -> Dict[str, Any]:
+    port = free_port()
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{args.llm_url}/v1",
+        "DUNSEL_RESPONSE_CACHE_PATH": os.path.join(tmp, "response_cache.sqlite3"),
+        "DUNSEL_NEWS_FEEDS_PATH": os.path.join(tmp, "news_feeds.json"),
+    }
+    if args.no_build:
+        env["DUNSEL_BUILD_ON_START"] = "0"
+    t0 = time.perf_counter()
+    proc = spawn([sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+                  "--log-level", "warning"], ROOT / "app", env)
+    url = f"http://127.0.0.1:{port}"
+    todo = {name: path.format(static=args.static) for name, path in PROBES}
+    row: Dict[str, Any] = {"app": app}
+    try:
+        with httpx.Client(base_url=url, timeout=2.0) as client:
+            while todo and time.perf_counter() - t0 < args.timeout:
+                if proc.poll() is not None:
+                    sys.exit(f"{app} exited with {proc.returncode}")
+                for name, path in list(todo.items()):
+                    try:
+                        r = client.get(path)
+                    except httpx.HTTPError:
+                        break  # not bound yet
+                    if r.status_code == 200:
+                        row[name] = (time.perf_counter() - t0) * 1000
+                        del todo[name]
+                        if name == "ready":
+                            row["readyz"] = r.json()
+                time.sleep(0.005)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    for name in todo:
+        row[name] = None
+    return row
+
+
+def med(rows: List[Dict[str, Any]], key: str):
+    xs = [r[key] for r in rows if r.get(key) is not None]
+    return round(statistics.median(xs), 1) if xs else None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--apps", default="boot:app,server:app")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--static", default="common.css", help="file under app/static to probe")
+    ap.add_argument("--timeout", type=float, default=60.0, help="seconds per boot")
+    ap.add_argument("--no-build", action="store_true", help="set DUNSEL_BUILD_ON_START=0")
+    ap.add_argument("--json", help="write per-run results here")
+    args = ap.parse_args()
+    if not (ROOT / "app" / "static" / args.static).exists():
+        sys.exit(f"app/static/{args.static} not found; pass --static")
+
+    llm_port = free_port()
+    fake = spawn([sys.executable, str(ROOT / "tools" / "fake_llm.py"), "--port", str(llm_port)], ROOT)
+    args.llm_url = f"http://127.0.0.1:{llm_port}"
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    try:
+        wait_http(f"{args.llm_url}/stats", fake)
+        with tempfile.TemporaryDirectory() as tmp:
+            for app in args.apps.split(","):
+                results[app] = [one_boot(app, args, tmp) for _ in range(args.runs)]
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+
+    print(f"median ms from spawn over {args.runs} runs")
+    print(f"{'app':<12} " + " ".join(f"{name:>9}" for name, _ in PROBES))
+    for app, rows in results.items():
+        print(f"{app:<12} " + " ".join(f"{str(med(rows, name)):>9}" for name, _ in PROBES))
+    for app, rows in results.items():
+        last = (rows[-1].get("readyz") or {})
+        print(f"\n{app}: boot milestones {last.get('boot')}")
+        print(f"{app}: warm-up stages ms {(last.get('warmup') or {}).get('stages')}")
+        errors = (last.get("warmup") or {}).get("errors")
+        if errors:
+            print(f"{app}: warm-up errors {errors}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Index build bench: full vs incremental builds of a synthetic archive corpus.
+
+Writes --files archive documents of --kb each into a temp tree and points
+build_index at it, then:
+
+1. full build with 1, 2, 4 ... --max-jobs worker processes (per-stage timings);
+2. no-change rebuild, which should only stat the tree;
+3. touch one file (same content): re-hash only, no re-processing;
+4. edit one file, add one and remove one: only those two are processed, the rest
+   is carried over from the previous index;
+5. a full rebuild of that same tree must produce a byte-identical index.
+
+The full-build speedup column is bounded by the cores available (os.cpu_count()).
+
+    python tools/bench_build_index.py [--files 64] [--kb 512] [--max-jobs 8]
+"""
+import argparse, json, os, random, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+import build_index  # noqa: E402
+import shard_index  # noqa: E402
+
+WORDS = ("captain helm phasers shields bridge starfleet klingon romulan vorlon shadow ambassador "
+         "station sector orbit warp crew transporter logic destiny truth order chaos").split()
+
+
+def write_doc(path: Path, i: int, kb: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    lines = [f"TITLE: Log {i}\nYEAR: {2260 + i % 10}\nTYPE: transcript\nTAGS: bench\nSOURCE_ID: log_{i}\n---\n"]
+    size = 0
+    while size < kb * 1024:
+        s = " ".join(rnd.choices(WORDS, k=rnd.randint(4, 20))).capitalize() + ". "
+        lines.append(s)
+        size += len(s)
+    path.write_text("".join(lines), encoding="utf-8")
+
+
+def sections(path: str):
+    idx = shard_index.ShardIndex(path)
+    try:
+        out = {name: bytes(idx._sec[name]) for name in shard_index.SECTIONS if name != "docs"}
+        out["docs"] = idx.docs
+        return out
+    finally:
+        idx.close()
+
+
+def run(out, label, rows, **kw):
+    st = build_index.build(out, verbose=False, **kw)
+    row = {"run": label, "processed": st.get("processed", 0), "written": st["written"],
+           "seconds": st["seconds"], **{f"{k}_s": v for k, v in st["timings"].items()}}
+    rows.append(row)
+    stages = "  ".join(f"{k} {v:.3f}" for k, v in st["timings"].items())
+    print(f"{label:<22} {row['processed']:>9} {st['seconds']:>8.3f}  {stages}")
+    return st
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=64)
+    ap.add_argument("--kb", type=int, default=512)
+    ap.add_argument("--max-jobs", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        arch = Path(tmp, "kirk_archive")
+        arch.mkdir()
+        for i in range(args.files):
+            write_doc(arch / f"log_{i:04d}.txt", i, args.kb, seed=i)
+        build_index.SOURCES = [("archive", "kirk", str(arch), True)]
+        out = os.path.join(tmp, "bench.idx")
+        rows = []
+        print(f"cpus: {os.cpu_count()}  corpus: {args.files} files x {args.kb} KB")
+        print(f"{'run':<22} {'processed':>9} {'total s':>8}  stages")
+
+        jobs, base = 1, None
+        while jobs <= args.max_jobs:
+            st = run(out, f"full, {jobs} job(s)", rows, full=True, jobs=jobs)
+            base = base or st["seconds"]
+            rows[-1]["speedup"] = round(base / st["seconds"], 2)
+            jobs *= 2
+
+        run(out, "no change", rows)
+        victim = arch / "log_0003.txt"
+        os.utime(victim, (1, 1))
+        run(out, "touch 1", rows)
+        write_doc(victim, 3, args.kb, seed=10_003)
+        write_doc(arch / "log_new.txt", 9999, args.kb, seed=9999)
+        (arch / "log_0005.txt").unlink()
+        run(out, "edit+add+remove", rows, jobs=args.max_jobs)
+
+        incremental = sections(out)
+        run(out, "full (check)", rows, full=True, jobs=args.max_jobs)
+        identical = incremental == sections(out)
+        print(f"incremental index identical to full rebuild: {identical}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"rows": rows, "identical": identical}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
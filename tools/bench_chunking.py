@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Archive chunker bench: streaming chunking.iter_chunks() vs the old load-everything
+chunk_text().
+
+1. Equivalence: with overlap=0 the streaming chunker must cut random documents,
+   fed in random block splits, exactly where the old one did (the old one ignored
+   overlap, so that is the only setting it really implemented). With overlap on,
+   consecutive chunks must share text.
+2. Scale: writes synthetic archive documents (header + transcript-like body) of
+   each size and chunks them in a fresh child process, reporting throughput and peak
+   RSS. Streaming RSS should stay flat as the file grows; the old path is only run
+   up to --legacy-max-mb because it holds several copies of the document.
+
+    python tools/bench_chunking.py [--sizes-mb 5,50,500] [--legacy-max-mb 50] [--dir /tmp]
+"""
+import argparse, json, os, random, resource, subprocess, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+import chunking  # noqa: E402
+
+WORDS = ("captain helm phasers shields bridge starfleet klingon romulan vorlon shadow "
+         "ambassador station sector orbit warp crew transporter logic destiny truth").split()
+
+
+def legacy_chunk_text(text, max_chars=1800, overlap=200):
+    # chunking.chunk_text() before streaming, verbatim.
+    import re
+    text = re.sub(r'\s+', ' ', text).strip()
+    chunks = []
+    i = 0
+    while i < len(text):
+        end = min(len(text), i + max_chars)
+        chunk = text[i:end]
+        last_period = chunk.rfind('. ')
+        if last_period > max_chars * 0.6:
+            end = i + last_period + 2
+            chunk = text[i:end]
+        chunks.append(chunk.strip())
+        i = max(end - overlap, end)
+    return chunks
+
+
+def legacy_parse_doc(path):
+    txt = path.read_text(encoding="utf-8", errors="ignore")
+    m = chunking.HEADER_RE.match(txt)
+    return txt[m.end():].strip()
+
+
+def synth_paragraph(rnd):
+    sents = []
+    for _ in range(rnd.randint(1, 6)):
+        sents.append(" ".join(rnd.choices(WORDS, k=rnd.randint(3, 25))).capitalize() + rnd.choice([".", ".", "?", "!"]))
+    speaker = rnd.choice(["KIRK", "SPOCK", "KOSH", "SHERIDAN", ""])
+    return (f"{speaker}:  " if speaker else "") + "  ".join(sents) + rnd.choice(["\n\n", "\n", "\r\n\t"])
+
+
+def write_corpus(path, mb, seed=5):
+    rnd = random.Random(seed)
+    target = mb * 2**20
+    paras = [synth_paragraph(rnd) for _ in range(5000)]  # reused so generation stays cheap
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"TITLE: Synthetic {mb} MB\nYEAR: 2267\nTYPE: transcript\nTAGS: bench, synthetic\nSOURCE_ID: synth_{mb}\n---\n")
+        written = 0
+        while written < target:
+            block = "".join(rnd.choices(paras, k=200))
+            f.write(block)
+            written += len(block)
+
+
+def equivalence(trials=2000, seed=11):
+    rnd = random.Random(seed)
+    pieces = WORDS + ["end.", "stop.", "\n\n", "\t", "  "]
+    mismatches = 0
+    for _ in range(trials):
+        text = "".join(rnd.choice(pieces) + rnd.choice([" ", "  ", "\n", ""]) for _ in range(rnd.randint(0, 600)))
+        max_chars = rnd.choice([40, 100, 300])
+        cuts = sorted(rnd.sample(range(len(text) + 1), min(len(text) + 1, rnd.randint(0, 10))))
+        blocks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        old = [c for c in legacy_chunk_text(text, max_chars) if c]
+        mismatches += old != list(chunking.iter_chunks(blocks, max_chars, 0))
+        overlap = max_chars // 5
+        ov = list(chunking.iter_chunks(blocks, max_chars, overlap))
+        # Each chunk must start inside the previous one's last `overlap` characters.
+        for a, b in zip(ov, ov[1:]):
+            if not any(b.startswith(a[k:]) for k in range(max(len(a) - overlap, 1), len(a))):
+                mismatches += 1
+                break
+    return {"trials": trials, "mismatches": mismatches}
+
+
+def child(path, mode):
+    t0 = time.perf_counter()
+    n = chars = 0
+    if mode == "streaming":
+        blocks, _ = chunking.parse_doc_stream(Path(path))
+        for c in chunking.iter_chunks(blocks):
+            n += 1
+            chars += len(c)
+    else:
+        for c in legacy_chunk_text(legacy_parse_doc(Path(path))):
+            n += 1
+            chars += len(c)
+    print(json.dumps({
+        "chunks": n, "chunk_chars": chars, "seconds": round(time.perf_counter() - t0, 2),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+    }))
+
+
+def scale(sizes, legacy_max, workdir):
+    rows = []
+    for mb in sizes:
+        path = os.path.join(workdir, f"dunsel_chunk_bench_{mb}mb.txt")
+        if not os.path.exists(path) or os.path.getsize(path) < mb * 2**20:
+            write_corpus(path, mb)
+        for mode in ("streaming", "legacy"):
+            if mode == "legacy" and mb > legacy_max:
+                continue
+            out = subprocess.run([sys.executable, __file__, "--child", path, mode],
+                                 capture_output=True, text=True, check=True).stdout
+            row = {"size_mb": mb, "mode": mode, **json.loads(out)}
+            row["mb_per_s"] = round(mb / max(row["seconds"], 1e-9), 1)
+            rows.append(row)
+            print(f"{mb:>8} {mode:>10} {row['chunks']:>9,} {row['seconds']:>8} {row['mb_per_s']:>7} {row['max_rss_mb']:>7}")
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes-mb", default="5,50,500")
+    ap.add_argument("--legacy-max-mb", type=int, default=50)
+    ap.add_argument("--dir", default="/tmp", help="where the synthetic corpora are written (kept for reruns)")
+    ap.add_argument("--child", nargs=2, metavar=("PATH", "MODE"), help=argparse.SUPPRESS)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    os.makedirs(args.dir, exist_ok=True)
+    eq = equivalence()
+    print(f"equivalence: {eq['mismatches']} mismatches in {eq['trials']} random documents")
+    print(f"{'size MB':>8} {'mode':>10} {'chunks':>9} {'secs':>8} {'MB/s':>7} {'rss MB':>7}")
+    rows = scale([int(x) for x in args.sizes_mb.split(",")], args.legacy_max_mb, args.dir)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"equivalence": eq, "scale": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
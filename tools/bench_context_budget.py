@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Context budget sweep: prompt tokens spent on retrieved material vs budget.
+
+For each budget, runs a fixed set of Kirk-style queries through the same retrieval
+and packing the chat endpoints use (retriever.retrieve + fit_hits), and through the
+style-block packer (pack_style_block), and reports average context tokens, hits
+kept/trimmed and the largest block seen. Use it next to time-to-first-token from
+the load tests to pick DUNSEL_CONTEXT_BUDGET[_<PERSONA>].
+
+Token counts are retriever.estimate_tokens() estimates; with --usage-file (JSON
+lines of {"context_tokens", "prompt_tokens"} collected from response meta) it also
+prints the estimate's average share of the provider-reported prompt.
+
+    python tools/bench_context_budget.py [--budgets 300,600,1200,2400,0] [--k 3]
+"""
+import argparse, json, statistics, sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+import retriever  # noqa: E402
+
+QUERIES = [
+    ("A Romulan ship decloaks off our port bow. What do you say to your crew?", ["command"]),
+    ("One of your officers defies orders to save civilians. How do you respond?", ["ethics"]),
+    ("How do you handle a computer that thinks it knows better than the crew?", []),
+    ("Tell me about the whales and the trip back to San Francisco.", ["humor"]),
+    ("What do you owe an enemy who fought with honor?", ["diplomacy"]),
+    ("Your first officer is dying. Do you break the rules?", []),
+    ("The tribbles are in the grain again.", ["humor"]),
+    ("You're on trial for the death of an officer. What's your defense?", ["command"]),
+]
+
+
+def sweep(budgets, k):
+    rows = []
+    for budget in budgets:
+        ctx, kept, trimmed, style, style_trim = [], [], 0, [], 0
+        for q, tags in QUERIES:
+            hits = retriever.retrieve(q, tags, k=k, persona="kirk")
+            packed = retriever.fit_hits(hits, budget or 10**9)
+            ctx.append(sum(h["tokens"] for h in packed))
+            kept.append(len(packed) / max(len(hits), 1))
+            trimmed += sum(1 for h in packed if h.get("trimmed"))
+            _, info = retriever.pack_style_block(words=tags or q.lower().split(), k=k, hint=q, budget=budget or 10**9)
+            style.append(info["tokens"])
+            style_trim += info["trimmed"]
+        row = {
+            "budget": budget or "none",
+            "context_tokens_avg": round(statistics.mean(ctx), 1),
+            "context_tokens_max": max(ctx),
+            "hits_kept": round(statistics.mean(kept), 2),
+            "hits_trimmed": trimmed,
+            "style_tokens_avg": round(statistics.mean(style), 1),
+            "style_shards_trimmed": style_trim,
+        }
+        rows.append(row)
+        print(f"{str(row['budget']):>7} {row['context_tokens_avg']:>9} {row['context_tokens_max']:>8} "
+              f"{row['hits_kept']:>6} {row['hits_trimmed']:>8} {row['style_tokens_avg']:>10} {row['style_shards_trimmed']:>9}")
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budgets", default="300,600,1200,2400,0", help="0 = no budget")
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--usage-file", help="JSON lines with context_tokens + prompt_tokens from response meta")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    if retriever.shard_index.open_index() is None:
+        sys.exit(f"no index: {retriever.shard_index.last_error()} (run app/build_index.py)")
+    print(f"{'budget':>7} {'ctx avg':>9} {'ctx max':>8} {'kept':>6} {'trimmed':>8} {'style avg':>10} {'style trm':>9}")
+    rows = sweep([int(b) for b in args.budgets.split(",")], args.k)
+
+    if args.usage_file:
+        recs = [json.loads(line) for line in Path(args.usage_file).read_text().splitlines() if line.strip()]
+        recs = [r for r in recs if r.get("prompt_tokens")]
+        if recs:
+            share = statistics.mean(r.get("context_tokens", 0) / r["prompt_tokens"] for r in recs)
+            print(f"context share of reported prompt tokens: {share:.1%} over {len(recs)} responses")
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
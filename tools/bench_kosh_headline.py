@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Kosh headline normalizer: golden-file check + throughput benchmark.
+
+The golden file (tools/fixtures/kosh_headlines.golden.jsonl) holds synthetic feed
+headlines and the output the original multi-pass normalizer gave for each. This
+script checks preprocess_headline_for_kosh() and preprocess_many() still produce
+exactly that, then prints headlines/sec for the original (copied below) and the
+current implementation on two sets: every golden headline once (distinct), and a
+simulated feed pull where each appears 4 times (repeats). preprocess_many() is the
+single-item path plus a dedupe, so it only pulls ahead on repeats; on distinct
+headlines it runs at the single-call rate.
+
+    python tools/bench_kosh_headline.py                 # check + bench
+    python tools/bench_kosh_headline.py --check-only    # exit 1 on any mismatch
+    python tools/bench_kosh_headline.py --write-golden  # regenerate from the original
+"""
+import argparse, json, random, re, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+from utils import kosh_headline  # noqa: E402
+
+GOLDEN = ROOT / "tools" / "fixtures" / "kosh_headlines.golden.jsonl"
+
+
+# -------------------------------------------------------------------
+# Original implementation (before the single-pass rewrite), verbatim
+# -------------------------------------------------------------------
+
+LEGACY_VERBS = {
+    r"\bslams\b": "criticizes",
+    r"\bblasts\b": "criticizes",
+    r"\btorches\b": "criticizes",
+    r"\brips into\b": "criticizes",
+    r"\bgoes off on\b": "criticizes",
+    r"\bdrags\b": "criticizes",
+    r"\bcancels\b": "rejects",
+    r"\bslapped down\b": "rebuked",
+    r"\btears into\b": "criticizes",
+    r"\broasts\b": "criticizes",
+}
+
+
+def legacy_preprocess(raw: str) -> str:
+    if not raw:
+        return ""
+    text = raw.strip()
+    text = kosh_headline.EMOJI_RE.sub("", text)
+    text = kosh_headline.HASHTAG_MENTION_RE.sub("", text)
+    text = kosh_headline.OUTLET_SUFFIX_RE.sub("", text)
+    text = kosh_headline.SECTION_PREFIX_RE.sub("", text)
+    for sep in ["—", "–", ";"]:
+        if sep in text:
+            parts = [p.strip() for p in text.split(sep) if p.strip()]
+            if parts:
+                text = parts[0]
+                break
+    cleaned = []
+    for w in text.split():
+        bare = re.sub(r"[^\w']", "", w).lower()
+        if bare in kosh_headline.EMOTIONAL_ADJECTIVES:
+            continue
+        cleaned.append(w)
+    text = " ".join(cleaned)
+    for pattern, replacement in LEGACY_VERBS.items():
+        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    t = text.strip()
+    if t.endswith("?"):
+        t = t[:-1].strip()
+    m = re.match(r"^(why|how|what|is|are|does|do)\s+(.*)$", t, flags=re.IGNORECASE)
+    if m:
+        t = m.group(2).strip()
+    text = re.sub(r"\s+", " ", t)
+    words = text.split()
+    if len(words) > 20:
+        text = " ".join(words[:20])
+    return text.strip()
+
+
+# -------------------------------------------------------------------
+# Synthetic feed headlines
+# -------------------------------------------------------------------
+
+SECTIONS = ["Politics", "war", "WORLD", "Opinion", "Analysis", "Tech", "Business", "Climate", "Breaking", "Sports"]
+SUBJECTS = [
+    "Senator Reyes", "The Prime Minister", "Union leaders", "OpenAI", "Local council", "Pop star Vela",
+    "The Fed", "NATO allies", "Tech giant", "Activists", "A rookie quarterback", "Parliament",
+]
+VERBS = [
+    "slams", "Blasts", "TORCHES", "rips into", "goes off on", "drags", "cancels", "slapped down",
+    "tears into", "roasts", "criticizes", "announces", "delays", "backs", "Slams", "rips  into",
+    "slamsung", "outblasts", "tears", "goes off",
+]
+OBJECTS = [
+    "new tariff plan", "budget deal", "missile strike on border town", "AI safety bill", "viral dance trend",
+    "wildfire response", "record temperatures in July", "layoff wave", "election recount", "bank failure",
+    "surveillance program", "ceasefire talks",
+]
+ADJECTIVES = sorted(kosh_headline.EMOTIONAL_ADJECTIVES) + ["Shocking!", '"brutal"', "(viral)", "insane,", "don't", "ICONIC"]
+TAILS = [
+    "— what it means for you", "– officials respond", "; markets slide", "as critics push back",
+    "after weeks of talks", "amid growing pressure from donors and rivals across the aisle this week",
+    "— — ", ";", "in a rare Sunday session",
+]
+OUTLETS = [" - The New York Times", " | CNN", " – Reuters", " - fox news", "  -  AP News ", " - The Guardian"]
+DECOR = ["🔥", "😱", "🚀", "🤯💥", "#breaking", "#AI_policy", "@nytimes", "#😀tag", "@", "#", "🇺🇸"]
+QUESTIONS = ["Why", "how", "What", "Is", "ARE", "Does", "do", "When"]
+SPACES = [" ", " ", " ", "  ", "\t", "\n", " ", " "]
+
+EDGE_CASES = [
+    "", " ", "?", "   \n ", "—", ";;;", "— ; –", "🔥🔥🔥", "#tag @user", "Politics: ", "Politics:  - CNN",
+    "Opinion: Why the Senate slams the door?", "why?", "Why  ?", "is it over", "Is",
+    "Shocking brutal insane viral", "slams slams slams", "SLAMS, blasts; torches", "rips shocking into the plan",
+    "goes\toff\non rivals", "ſlams the ſenate", "KELVIN K slams", "#foo😀bar stays", "@😀 mention",
+    "A very long headline " + " ".join(f"word{i}" for i in range(40)),
+    "Politics: Senator slams bill - The New York Times", "Tech: OpenAI cancels event | CNN  ",
+    "What does a ‘bombshell’ report say?", "Ministers don't slam; they drag — analysis",
+]
+
+
+def synth_headlines(n: int, seed: int = 9):
+    rnd = random.Random(seed)
+    out = list(EDGE_CASES)
+    while len(out) < n:
+        parts = []
+        if rnd.random() < 0.25:
+            parts.append(rnd.choice(DECOR))
+        if rnd.random() < 0.3:
+            sec = rnd.choice(SECTIONS)
+            parts.append(rnd.choice([sec, sec.lower(), sec.upper()]) + ":")
+        if rnd.random() < 0.2:
+            parts.append(rnd.choice(QUESTIONS))
+        if rnd.random() < 0.4:
+            parts.append(rnd.choice(ADJECTIVES))
+        parts.append(rnd.choice(SUBJECTS))
+        parts.append(rnd.choice(VERBS))
+        if rnd.random() < 0.3:
+            parts.append(rnd.choice(ADJECTIVES))
+        parts.append(rnd.choice(OBJECTS))
+        if rnd.random() < 0.35:
+            parts.append(rnd.choice(TAILS))
+        if rnd.random() < 0.25:
+            parts.append(rnd.choice(DECOR) + rnd.choice(["", "🔥", "x"]))
+        if rnd.random() < 0.1:
+            parts.append(" ".join(rnd.choice(OBJECTS) for _ in range(rnd.randint(3, 6))))
+        text = "".join(p + rnd.choice(SPACES) for p in parts).rstrip(" ")
+        if rnd.random() < 0.15:
+            text += "?"
+        if rnd.random() < 0.3:
+            text += rnd.choice(OUTLETS)
+        out.append(text)
+    return out[:n]
+
+
+# -------------------------------------------------------------------
+
+def load_golden():
+    with GOLDEN.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(rows) -> int:
+    bad = 0
+    single = [kosh_headline.preprocess_headline_for_kosh(r["raw"]) for r in rows]
+    batch = kosh_headline.preprocess_many([r["raw"] for r in rows])
+    for r, a, b in zip(rows, single, batch):
+        if a != r["clean"] or b != r["clean"]:
+            bad += 1
+            if bad <= 10:
+                print(f"MISMATCH {r['raw']!r}\n  want {r['clean']!r}\n  got  {a!r} / batch {b!r}")
+    print(f"golden: {len(rows) - bad}/{len(rows)} match")
+    return bad
+
+
+def rate(fn, items, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(items)
+        best = min(best, time.perf_counter() - t0)
+    return len(items) / best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--write-golden", action="store_true")
+    ap.add_argument("--check-only", action="store_true")
+    ap.add_argument("--n", type=int, default=1500, help="golden size when writing")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--json", help="write bench results to this file")
+    args = ap.parse_args()
+
+    if args.write_golden:
+        GOLDEN.parent.mkdir(parents=True, exist_ok=True)
+        with GOLDEN.open("w", encoding="utf-8") as f:
+            for raw in synth_headlines(args.n):
+                f.write(json.dumps({"raw": raw, "clean": legacy_preprocess(raw)}, ensure_ascii=False) + "\n")
+        print(f"wrote {args.n} rows to {GOLDEN}")
+        return
+
+    rows = load_golden()
+    if check(rows):
+        sys.exit(1)
+    if args.check_only:
+        return
+
+    distinct = [r["raw"] for r in rows]
+    # A feed pull repeats items across feeds (the same wire story in several outlets).
+    repeats = distinct * 4
+    random.Random(3).shuffle(repeats)
+    impls = [
+        ("original (multi-pass)", "legacy", lambda xs: [legacy_preprocess(x) for x in xs]),
+        ("preprocess_headline_for_kosh", "single", lambda xs: [kosh_headline.preprocess_headline_for_kosh(x) for x in xs]),
+        ("preprocess_many", "batch", kosh_headline.preprocess_many),
+    ]
+    res = {"distinct": len(distinct), "repeats": len(repeats)}
+    for _, name, fn in impls:
+        for set_name, items in (("distinct", distinct), ("repeats", repeats)):
+            res[f"{name}_{set_name}_per_s"] = round(rate(fn, items, args.repeat))
+    print(f"headlines/s; distinct = {len(distinct)} unique, repeats = each 4x ({len(repeats)})")
+    print(f"{'implementation':<28} {'distinct':>18} {'repeats':>18}")
+    for label, name, _ in impls:
+        cells = []
+        for set_name in ("distinct", "repeats"):
+            v = res[f"{name}_{set_name}_per_s"]
+            cells.append(f"{v:>10,} ({v / res[f'legacy_{set_name}_per_s']:.1f}x)")
+        print(f"{label:<28} " + " ".join(f"{c:>18}" for c in cells))
+    if args.json:
+        Path(args.json).write_text(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Kosh tag inference benchmark: TagScorer vs the old sequential substring scans.
+
+Runs batches of synthetic feed headlines through the original infer_tag_from_text
+(copied below) and through score_tags()/infer_tags_from_text(), printing
+headlines/sec per batch size and how often the two disagree on the primary tag.
+Disagreements are expected where the old scan hit a keyword inside another word.
+
+    python tools/bench_kosh_tags.py [--sizes 1000,5000,20000] [--show 8]
+"""
+import argparse, json, random, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+sys.path.insert(0, str(ROOT / "tools"))
+from utils import kosh_headline  # noqa: E402
+from bench_kosh_headline import synth_headlines  # noqa: E402
+
+
+def legacy_infer(text: str) -> str:
+    # infer_tag_from_text() before TagScorer, verbatim.
+    t = (text or "").lower()
+    if any(w in t for w in ["election", "vote", "ballot", "senate", "parliament", "congress", "supreme court"]):
+        return "politics_now"
+    if any(w in t for w in ["war", "invasion", "strike", "missile", "shelling", "artillery", "bombing", "airstrike"]):
+        return "war"
+    if any(w in t for w in ["climate", "heatwave", "heat wave", "wildfire", "wild fire", "flood", "hottest", "record temperatures", "drought"]):
+        return "climate"
+    if any(w in t for w in ["stock", "market", "inflation", "wage", "union", "strike", "layoff", "bank failure", "recession"]):
+        return "economy"
+    if any(w in t for w in ["ai", "artificial intelligence", "algorithm", "data breach", "surveillance", "neural network"]):
+        return "tech"
+    if any(w in t for w in ["singer", "actor", "actress", "rapper", "influencer", "celebrity", "pop star", "movie star"]):
+        return "celebrity"
+    if any(w in t for w in ["meme", "challenge", "trend", "tiktok", "goes viral", "viral video"]):
+        return "viral"
+    return "other"
+
+
+def rate(fn, items, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for x in items:
+            fn(x)
+        best = min(best, time.perf_counter() - t0)
+    return len(items) / best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,5000,20000")
+    ap.add_argument("--show", type=int, default=8, help="print this many disagreements")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",")]
+    pool = synth_headlines(max(sizes))
+    random.Random(5).shuffle(pool)
+
+    results = []
+    print(f"{'batch':>7} {'legacy/s':>10} {'scores/s':>10} {'ranked/s':>10} {'differ':>7}")
+    for n in sizes:
+        batch = pool[:n]
+        old = rate(legacy_infer, batch)
+        new = rate(kosh_headline.score_tags, batch)
+        ranked = rate(kosh_headline.infer_tags_from_text, batch)
+        differ = [h for h in batch if legacy_infer(h) != kosh_headline.infer_tag_from_text(h)]
+        results.append({
+            "batch": n, "legacy_per_s": round(old), "scores_per_s": round(new),
+            "ranked_per_s": round(ranked), "differ": len(differ),
+        })
+        print(f"{n:>7} {old:>10,.0f} {new:>10,.0f} {ranked:>10,.0f} {len(differ):>7}")
+
+    for h in differ[: args.show]:
+        print(f"  {legacy_infer(h):>12} -> {kosh_headline.infer_tag_from_text(h):<12} {h[:70]!r}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
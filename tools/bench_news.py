@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+News ingestion bench against a local stand-in for real feed servers.
+
+Serves the fixture feeds in tools/fixtures/feeds as N distinct feeds (/feed/<n>.xml)
+with ETag / Last-Modified and 304 support, then times news.FeedFetcher: one cold
+refresh (every feed downloaded and parsed) and several warm ones (every feed
+should answer 304 and nothing is re-parsed).
+
+    python tools/bench_news.py [--feeds 50] [--rounds 5]
+    python tools/bench_news.py --serve --port 8765   # stand-in only, for the app
+"""
+import argparse, asyncio, hashlib, json, re, statistics, sys, threading, time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+import news  # noqa: E402
+
+FIXTURES = sorted((ROOT / "tools" / "fixtures" / "feeds").glob("*.xml"))
+_FEED_RE = re.compile(r"^/feed/(\d+)\.xml$")
+_TITLE_RE = re.compile(rb"<title>(.*?)</title>")
+
+
+class StandIn:
+    """Fixture feeds over HTTP/1.1 keep-alive; feed n is fixture n % len, retitled."""
+
+    def __init__(self, port: int = 0):
+        bodies = [p.read_bytes() for p in FIXTURES]
+        last_modified = formatdate(1_760_000_000, usegmt=True)
+        outer = self
+        self.requests = {"200": 0, "304": 0}
+
+        def body_for(n):
+            raw = bodies[n % len(bodies)]
+            # Only the channel/feed title changes, so item titles repeat across feeds.
+            return _TITLE_RE.sub(lambda m: b"<title>" + m.group(1) + f" #{n}".encode() + b"</title>", raw, count=1)
+
+        cache = {}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                m = _FEED_RE.match(self.path)
+                if not m:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                n = int(m.group(1))
+                if n not in cache:
+                    body = body_for(n)
+                    cache[n] = (body, '"%s"' % hashlib.sha1(body).hexdigest()[:16])
+                body, etag = cache[n]
+                if self.headers.get("If-None-Match") == etag or self.headers.get("If-Modified-Since") == last_modified:
+                    outer.requests["304"] += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                outer.requests["200"] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/rss+xml; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def url(self, n: int) -> str:
+        return f"http://127.0.0.1:{self.port}/feed/{n}.xml"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+async def run(args):
+    standin = StandIn().start()
+    news.ALLOW_PRIVATE = True  # the stand-in serves on 127.0.0.1
+    urls = [standin.url(i) for i in range(args.feeds)]
+    fetcher = news.FeedFetcher(concurrency=args.concurrency)
+    try:
+        t0 = time.perf_counter()
+        states = await fetcher.refresh(urls)
+        cold_ms = (time.perf_counter() - t0) * 1000
+        assert all(s.status == "ok" and s.items for s in states), news.feed_summary(states)
+
+        warm = []
+        for _ in range(args.rounds):
+            t0 = time.perf_counter()
+            states = await fetcher.refresh(urls)
+            warm.append((time.perf_counter() - t0) * 1000)
+            assert all(s.status == "not_modified" for s in states), news.feed_summary(states)
+        assert fetcher.counters["parsed"] == args.feeds  # warm rounds parsed nothing
+
+        top = news.latest_items(states, 6)
+    finally:
+        await fetcher.aclose()
+        standin.stop()
+
+    res = {
+        "feeds": args.feeds,
+        "cold_ms": round(cold_ms, 1),
+        "warm_ms_median": round(statistics.median(warm), 1),
+        "warm_ms_max": round(max(warm), 1),
+        "server_200": standin.requests["200"],
+        "server_304": standin.requests["304"],
+    }
+    print(json.dumps(res, indent=2))
+    for it in top:
+        print(f"  {it['source']:<26} {it['clean'][:60]}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(res, indent=2))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--feeds", type=int, default=50)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--concurrency", type=int, default=news.CONCURRENCY)
+    ap.add_argument("--serve", action="store_true", help="only run the stand-in server")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    if args.serve:
+        standin = StandIn(args.port)
+        print(f"serving {len(FIXTURES)} fixture feeds as {standin.url(0)}, {standin.url(1)}, ...")
+        standin.server.serve_forever()
+        return
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
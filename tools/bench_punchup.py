@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Kirk punch-up filter: golden-file check + throughput benchmark.
+
+The golden file (tools/fixtures/punchup.golden.jsonl) holds synthetic Kirk replies
+(openers, hedges, line breaks, long comma sentences, politics tags, user names) and
+what the original multi-pass filter made of each, both as a whole reply
+(punch_up_kirk) and streamed delta by delta (KirkStreamRewriter). This script checks
+the current punchup module still produces exactly that, fuzzes it against the
+original copied below, then prints replies/sec and per-sentence cost.
+
+    python tools/bench_punchup.py                 # check + fuzz + bench
+    python tools/bench_punchup.py --check-only    # exit 1 on any mismatch
+    python tools/bench_punchup.py --write-golden  # regenerate from the original
+"""
+import argparse, json, random, re, sys, time
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+import punchup  # noqa: E402
+
+GOLDEN = ROOT / "tools" / "fixtures" / "punchup.golden.jsonl"
+
+
+# -------------------------------------------------------------------
+# Original implementation (before the rule-table engine), verbatim
+# -------------------------------------------------------------------
+
+KIRKISMS = {
+    r"\bno win\b": "no-win",
+    r"\breckless\b": "reckless—without a rope",
+    r"\bwe cannot\b": "we can’t",
+    r"\bdo not\b": "don’t",
+    r"\btherefore\b": "so",
+}
+BANNED_OPENERS = [
+    r"^as (?:an )?ai\b",
+    r"^as captain of the u\.?s\.?s\.? enterprise\b",
+    r"^in (?:this|that) context\b",
+    r"^ultimately\b",
+    r"^to be clear\b",
+    r"^in conclusion\b",
+]
+NEXT_MOVE = "  Next move: organize talent, protect facts, build lawful pressure—then act."
+
+def _ban_openers(text: str) -> str:
+    t = text.strip()
+    for pat in BANNED_OPENERS:
+        if re.search(pat, t, flags=re.I):
+            t = re.sub(r"^.*?[.!?]\s*", "", t, flags=re.S)
+            break
+    return t
+
+def _apply_kirkisms(text: str) -> str:
+    for pat, rep in KIRKISMS.items():
+        text = re.sub(pat, rep, text, flags=re.I)
+    return text
+
+def _tighten_sentence(s: str) -> str:
+    s = s.strip()
+    s = re.sub(r"\b(perhaps|maybe|it seems|it may be|one must)\b", "let’s", s, flags=re.I)
+    s = re.sub(r"\bI (?:would|might|would probably)\b", "I’ll", s, flags=re.I)
+    s = re.sub(r"\bbut\b", "—but", s, flags=re.I)
+    s = re.sub(r"^(In this context|Therefore|Ultimately|In conclusion),?\s*", "", s, flags=re.I)
+    if len(s) > 220:
+        s = re.sub(r",\s+", " — ", s, count=1)
+    return s
+
+def _tighten_sentences(text: str) -> str:
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    text = " ".join(lines)
+    parts = re.split(r"(?<=[.!?])\s+", text)
+    return " ".join(_tighten_sentence(s) for s in parts)
+
+def _politics(text: str) -> str:
+    return re.sub(r"\b(should|ought to)\b", "must", text, flags=re.I)
+
+def _address_user(text: str, user_name: Optional[str]) -> str:
+    if not user_name:
+        return text
+    if not re.search(rf"\b{re.escape(user_name)}\b", text, flags=re.I):
+        text = f"{user_name}— " + text.lstrip()
+    return text
+
+def legacy_punch_up_kirk(text: str, user_name: Optional[str], tags: List[str]) -> str:
+    t = _ban_openers(text)
+    t = _apply_kirkisms(t)
+    t = _tighten_sentences(t)
+    if "politics_now" in (tags or []):
+        t = _politics(t)
+        if not re.search(r"\bNext move:\b", t):
+            t = t.rstrip() + NEXT_MOVE
+    t = _address_user(t, user_name)
+    return t.strip()
+
+_BOUNDARY_RE = re.compile(r"[.!?]\s+")
+_OPENER_LOOKAHEAD = 64
+
+class LegacyKirkStreamRewriter:
+    def __init__(self, user_name: Optional[str] = None, tags: Optional[List[str]] = None):
+        self.user_name = user_name
+        self.politics = "politics_now" in (tags or [])
+        self._buf = ""
+        self._head_done = False
+        self._emitted = 0
+        self._next_move_seen = False
+
+    def _head(self, final: bool) -> bool:
+        self._buf = self._buf.lstrip()
+        if not final and len(self._buf) < _OPENER_LOOKAHEAD and not _BOUNDARY_RE.search(self._buf):
+            return False
+        if any(re.search(p, self._buf, flags=re.I) for p in BANNED_OPENERS):
+            m = re.search(r"[.!?]\s*", self._buf)
+            if m is None or (m.end() == len(self._buf) and not final):
+                return False
+            self._buf = self._buf[m.end():]
+        self._head_done = True
+        return True
+
+    def _sentence(self, raw: str) -> str:
+        s = _apply_kirkisms(raw)
+        s = " ".join(ln.strip() for ln in s.splitlines() if ln.strip())
+        s = _tighten_sentence(s)
+        if self.politics:
+            s = _politics(s)
+            if re.search(r"\bNext move:\b", s):
+                self._next_move_seen = True
+        if not s:
+            return ""
+        if self._emitted == 0:
+            s = _address_user(s, self.user_name)
+        out = s if self._emitted == 0 else " " + s
+        self._emitted += 1
+        return out
+
+    def feed(self, delta: str) -> str:
+        self._buf += delta
+        if not self._head_done and not self._head(final=False):
+            return ""
+        out: List[str] = []
+        start = 0
+        for m in _BOUNDARY_RE.finditer(self._buf):
+            out.append(self._sentence(self._buf[start:m.start() + 1]))
+            start = m.end()
+        self._buf = self._buf[start:]
+        return "".join(out)
+
+    def finish(self) -> str:
+        if not self._head_done:
+            self._head(final=True)
+        out = self._sentence(self._buf) if self._buf.strip() else ""
+        self._buf = ""
+        if self.politics and not self._next_move_seen:
+            out += NEXT_MOVE if self._emitted else NEXT_MOVE.lstrip()
+        return out
+
+
+# -------------------------------------------------------------------
+# Synthetic replies
+# -------------------------------------------------------------------
+
+OPENERS = [
+    "As an AI, I can't say.", "as ai I think so!", "As captain of the U.S.S. Enterprise, I order it.",
+    "As captain of the USS Enterprise I decide. ", "as captain of the u.s.s enterprise—", "In this context, ",
+    "In that context we move.", "Ultimately, ", "Ultimately.", "To be clear: we fight.", "In conclusion, ",
+    "In conclusion", "As anyone knows, ", "Asa ai", "Ultimatelyshould we? ",
+]
+HEDGES = [
+    "perhaps", "Maybe", "MAYBE", "it seems", "It Seems", "it may be", "one must", "I would", "i might",
+    "I would probably", "but", "But", "BUT", "therefore", "Therefore", "no win", "No Win", "reckless",
+    "we cannot", "We Cannot", "do not", "DO NOT", "should", "Should", "ought to", "Ought To",
+    "perhapsmaybe", "butter", "rebut", "oughtto", "shoulder", "no  win", "do\nnot", "I  would",
+    "ſhould", "ıt seems", "ﬁne", "buT",
+]
+WORDS = ("the crew ship helm phasers shields bridge klingons romulans risk chance lives order "
+         "orders captain admiral enemy federation treaty galaxy star stars engines course now").split()
+LEADS = ["In this context, ", "Therefore, ", "Ultimately ", "In conclusion,", "in conclusion ",
+         "Thereforeshould ", "Ultimatelybut ", "In this contextperhaps ", "THEREFORE,\t",
+         "Ultimatelyought to "]
+ENDS = [".", ".", "!", "?", "...", ".\n", "!\n\n", "?  ", ". ", "", ".\t", "?!"]
+NAMES = [None, None, "Jim", "Spock", "bones", "Dr. McCoy", "Uhura", "c++", "(Scotty)", "a.b", "Jim Kirk",
+         "Sulu", "", "Chekov?"]
+TAG_SETS = [[], [], ["politics_now"], ["politics_now", "command"], ["humor"], ["politics_now"]]
+SPACES = [" ", " ", " ", "  ", "\n", " \n ", "\t"]
+
+EDGE_CASES = [
+    "", " ", ".", "\n\n", "Next move: already planned.", "Next move:x", "next move: lower case.",
+    "As an AI", "As an AI.", "As captain of the U.S.S. Enterprise, we hold.", "Ultimately, we win. Jim knows.",
+    "We should go.\n\nWe ought to stay.", "Therefore, therefore.", "In conclusion, In conclusion.",
+    "But but but.", "I would. I might. I would probably.", "no win\nscenario. do not\nretreat.",
+    "Jim. Kirk here.", "Hello, " * 60 + "end.", "a, b " * 80, "Ultimatelyshould we go? Yes.",
+    "Perhaps.   Maybe!  It seems?", "One must act. One mustn't wait.", "Ship. Crew. Done.",
+    "Line one\nline two\n\nline three.", "   leading and trailing   ", "?!?!", "Mr. Spock, report.",
+]
+
+
+def synth_sentence(rnd: random.Random) -> str:
+    parts = []
+    if rnd.random() < 0.12:
+        parts.append(rnd.choice(LEADS))
+    for _ in range(rnd.randint(2, 14)):
+        parts.append(rnd.choice(HEDGES) if rnd.random() < 0.25 else rnd.choice(WORDS))
+        if rnd.random() < 0.08:
+            parts[-1] += ","
+    if rnd.random() < 0.1:  # long enough for the comma rule
+        parts += [rnd.choice(WORDS) + ("," if rnd.random() < 0.3 else "") for _ in range(rnd.randint(30, 60))]
+    s = "".join(p + rnd.choice(SPACES) for p in parts).rstrip()
+    if rnd.random() < 0.7:
+        s = s[:1].upper() + s[1:]
+    return s + rnd.choice(ENDS)
+
+
+def synth_replies(n: int, seed: int = 18):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        if i < len(EDGE_CASES):
+            text = EDGE_CASES[i]
+        else:
+            sents = [synth_sentence(rnd) for _ in range(rnd.randint(1, 8))]
+            if rnd.random() < 0.3:
+                sents.insert(0, rnd.choice(OPENERS))
+            if rnd.random() < 0.08:
+                sents.insert(rnd.randint(0, len(sents)), "Next move: hold the line.")
+            text = "".join(s + rnd.choice(["", " ", "\n"]) for s in sents)
+            if rnd.random() < 0.2:
+                text = rnd.choice(["  ", "\n", " \n"]) + text
+        name = rnd.choice(NAMES)
+        if name and rnd.random() < 0.3:
+            text = text + " " + rnd.choice([name, name.upper(), name + "!"])
+        rows.append({"text": text, "user_name": name, "tags": rnd.choice(TAG_SETS), "seed": i})
+    return rows
+
+
+def deltas(text: str, seed: int) -> List[str]:
+    # Token-sized pieces, as the upstream stream would deliver them.
+    rnd = random.Random(seed)
+    out, i = [], 0
+    while i < len(text):
+        step = rnd.choice([1, 1, 2, 3, 4, 6, 12])
+        out.append(text[i:i + step])
+        i += step
+    return out
+
+
+def run_stream(cls, row, pieces=None) -> str:
+    rw = cls(user_name=row["user_name"], tags=row["tags"])
+    pieces = deltas(row["text"], row["seed"]) if pieces is None else pieces
+    return "".join(rw.feed(d) for d in pieces) + rw.finish()
+
+
+# -------------------------------------------------------------------
+
+def load_golden():
+    with GOLDEN.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(rows) -> int:
+    bad = 0
+    for r in rows:
+        out = punchup.punch_up_kirk(r["text"], user_name=r["user_name"], tags=r["tags"])
+        stream_out = run_stream(punchup.KirkStreamRewriter, r)
+        if out != r["out"] or stream_out != r["stream_out"]:
+            bad += 1
+            if bad <= 10:
+                print(f"MISMATCH {r['text']!r} name={r['user_name']!r} tags={r['tags']}\n"
+                      f"  want {r['out']!r}\n  got  {out!r}\n"
+                      f"  want stream {r['stream_out']!r}\n  got  stream {stream_out!r}")
+    print(f"golden: {len(rows) - bad}/{len(rows)} match")
+    return bad
+
+
+def fuzz(n: int, seed: int) -> int:
+    bad = 0
+    for r in synth_replies(n, seed=seed)[len(EDGE_CASES):]:
+        want = legacy_punch_up_kirk(r["text"], r["user_name"], r["tags"])
+        got = punchup.punch_up_kirk(r["text"], user_name=r["user_name"], tags=r["tags"])
+        if want != got or run_stream(LegacyKirkStreamRewriter, r) != run_stream(punchup.KirkStreamRewriter, r):
+            bad += 1
+            if bad <= 5:
+                print(f"FUZZ MISMATCH {r['text']!r} name={r['user_name']!r} tags={r['tags']}")
+    print(f"fuzz: {n - len(EDGE_CASES) - bad}/{n - len(EDGE_CASES)} match (seed {seed})")
+    return bad
+
+
+def rate(fn, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for r in rows:
+            fn(r)
+        best = min(best, time.perf_counter() - t0)
+    return len(rows) / best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--write-golden", action="store_true")
+    ap.add_argument("--check-only", action="store_true")
+    ap.add_argument("--n", type=int, default=1200, help="golden size when writing")
+    ap.add_argument("--fuzz", type=int, default=5000, help="random replies compared against the original")
+    ap.add_argument("--seed", type=int, default=int(time.time()))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--json", help="write bench results to this file")
+    args = ap.parse_args()
+
+    if args.write_golden:
+        GOLDEN.parent.mkdir(parents=True, exist_ok=True)
+        with GOLDEN.open("w", encoding="utf-8") as f:
+            for r in synth_replies(args.n):
+                r["out"] = legacy_punch_up_kirk(r["text"], r["user_name"], r["tags"])
+                r["stream_out"] = run_stream(LegacyKirkStreamRewriter, r)
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        print(f"wrote {args.n} rows to {GOLDEN}")
+        return
+
+    rows = load_golden()
+    if check(rows) or fuzz(args.fuzz, args.seed):
+        sys.exit(1)
+    if args.check_only:
+        return
+
+    sentences = sum(len(_BOUNDARY_RE.split(r["text"])) for r in rows)
+    for r in rows:
+        r["deltas"] = deltas(r["text"], r["seed"])
+    res = {
+        "replies": len(rows),
+        "sentences": sentences,
+        "legacy_per_s": round(rate(lambda r: legacy_punch_up_kirk(r["text"], r["user_name"], r["tags"]), rows, args.repeat)),
+        "batch_per_s": round(rate(lambda r: punchup.punch_up_kirk(r["text"], r["user_name"], r["tags"]), rows, args.repeat)),
+        "legacy_stream_per_s": round(rate(lambda r: run_stream(LegacyKirkStreamRewriter, r, r["deltas"]), rows, args.repeat)),
+        "stream_per_s": round(rate(lambda r: run_stream(punchup.KirkStreamRewriter, r, r["deltas"]), rows, args.repeat)),
+    }
+    res["stream_us_per_sentence"] = round(len(rows) / res["stream_per_s"] / sentences * 1e6, 2)
+    print(f"{'implementation':<28} {'replies/s':>10}")
+    print(f"{'original punch_up_kirk':<28} {res['legacy_per_s']:>10,}")
+    print(f"{'punch_up_kirk':<28} {res['batch_per_s']:>10,}  ({res['batch_per_s'] / res['legacy_per_s']:.1f}x)")
+    print(f"{'original stream rewriter':<28} {res['legacy_stream_per_s']:>10,}")
+    print(f"{'KirkStreamRewriter':<28} {res['stream_per_s']:>10,}  ({res['stream_per_s'] / res['legacy_stream_per_s']:.1f}x)")
+    print(f"KirkStreamRewriter cost incl. delta feeding: {res['stream_us_per_sentence']} us/sentence")
+    if args.json:
+        Path(args.json).write_text(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Shard-selection benchmark: choose_shards_for_request() latency vs corpus size.
+
+Builds synthetic in-memory corpora (no files) from 10 to 100k shards and prints
+per-query latency for the indexed selection and the old full-scan + sort, for
+3-word queries of popular tags ("common") and for one rare word plus two popular
+tags ("rare+common", the usual episode-name-plus-tag request). "lists/q" is the
+total length of the query's posting lists, which grows with the corpus since tag
+popularity is Zipf-distributed; "read/q" is how many of those postings the
+stepped scan actually read before it could stop. Every checked query must return
+exactly what the full scan returns, ties included (asserted, "agree" is 100%).
+
+    python tools/bench_retriever.py [--sizes 10,100,1000,10000,100000] [--queries 200]
+"""
+import argparse, json, random, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+import retriever  # noqa: E402
+
+
+def legacy_choose(corpus, words, k):
+    # choose_shards_for_request() word path before the inverted index, verbatim.
+    words_norm = [w.lower() for w in (words or []) if w]
+    scored = []
+    for s in corpus:
+        kw = set(s.get("keywords", []))
+        overlap = len(kw & set(words_norm))
+        scored.append((overlap + 0.01 * s["priority"], s))
+    scored.sort(key=lambda x: (-x[0], -x[1]["priority"], -x[1]["mtime"]))
+    return [s for _, s in scored[:k]]
+
+
+def synth_corpus(n, vocab, cum_weights, rnd):
+    files = {}
+    for i in range(n):
+        kws = list(dict.fromkeys(rnd.choices(vocab, cum_weights=cum_weights, k=rnd.randint(4, 9))))
+        fp = f"/synthetic/shard_{i:06d}.txt"
+        mtime = 1_700_000_000 + rnd.randint(0, 50) * 3600  # coarse, so ties happen
+        shard = {
+            "id": f"shard_{i:06d}", "path": fp, "headers": {}, "body": "",
+            "priority": rnd.choice([5, 10, 10, 10, 20]), "keywords": kws, "mtime": float(mtime),
+        }
+        files[fp] = (float(mtime), 0, shard)
+    return retriever.ShardCorpus(files)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,100,1000,10000,100000")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    rnd = random.Random(7)
+    vocab = [f"w{i}" for i in range(20000)]
+    cum, acc = [], 0.0
+    for i in range(len(vocab)):
+        acc += 1.0 / (i + 1)  # zipf-ish tag popularity
+        cum.append(acc)
+    results = []
+    print(f"scan step {retriever.SCAN_STEP}; k={args.k}; 3-word queries")
+    print(f"{'shards':>8} {'queries':>11} {'lists/q':>9} {'read/q':>7} {'indexed us/q':>13} {'legacy us/q':>12}"
+          f" {'speedup':>8} {'agree':>7}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        snap = synth_corpus(n, vocab, cum, rnd)
+        retriever._swap(snap)
+        rare = [w for w in vocab[2000:] if 0 < len(snap.inverted.get(w, ())) <= 5] or vocab[2000:]
+        kinds = {
+            "common": [rnd.sample(vocab[:2000], 3) for _ in range(args.queries)],
+            "rare+common": [[rnd.choice(rare)] + rnd.sample(vocab[:50], 2) for _ in range(args.queries)],
+        }
+        for kind, queries in kinds.items():
+            checked = queries[: max(5, min(len(queries), 2_000_000 // max(n, 1)))]
+            for q in checked + [q[:1] for q in queries[:50]]:
+                got = [s["id"] for s in retriever.choose_shards_for_request(words=q, k=args.k)]
+                want = [s["id"] for s in legacy_choose(snap.shards, q, args.k)]
+                assert got == want, (n, q, got, want)
+
+            before = dict(retriever.SELECT_STATS)
+            t0 = time.perf_counter()
+            for q in queries:
+                retriever.choose_shards_for_request(words=q, k=args.k)
+            new_us = (time.perf_counter() - t0) / len(queries) * 1e6
+            read = (retriever.SELECT_STATS["postings_read"] - before["postings_read"]) / len(queries)
+
+            t0 = time.perf_counter()
+            for q in checked:
+                legacy_choose(snap.shards, q, args.k)
+            old_us = (time.perf_counter() - t0) / len(checked) * 1e6
+
+            touched = sum(len(snap.inverted.get(w, ())) for q in queries for w in q) / len(queries)
+            results.append({
+                "shards": n, "queries": kind, "postings_per_query": round(touched, 1),
+                "postings_read_per_query": round(read, 1), "indexed_us": round(new_us, 2),
+                "legacy_us": round(old_us, 2), "agreement": 1.0,
+            })
+            print(f"{n:>8} {kind:>11} {touched:>9.0f} {read:>7.0f} {new_us:>13.1f} {old_us:>12.1f}"
+                  f" {old_us / new_us:>7.1f}x {1:>6.0%}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
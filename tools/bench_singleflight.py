@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Single-flight bench: bursts of identical persona requests, coalescing on vs off.
+
+Drives the real FastAPI app in-process (httpx ASGI transport) against a local fake
+chat-completions upstream with fixed latency. The response cache is off so every
+request that is not coalesced reaches the upstream. Three cases:
+
+  json     N identical Kirk chats at once        -> 1 upstream call, N identical replies
+  stream   N identical Kirk streams at once      -> 1 upstream stream, N identical bodies
+  error    N identical chats, upstream 500s      -> 1 upstream call, N errors
+
+    python tools/bench_singleflight.py [--requests 32] [--latency 0.3]
+"""
+import argparse, asyncio, json, os, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["DUNSEL_RESPONSE_CACHE"] = "0"  # only coalescing may save upstream calls
+os.environ["DUNSEL_LLM_MAX_RETRIES"] = "0"
+
+import httpx  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+import llm  # noqa: E402
+import server  # noqa: E402
+from singleflight import SingleFlight  # noqa: E402
+
+REPLY = "The outcome was never in doubt. We proceed at warp six. Nobody is left behind."
+STATE = {"calls": 0, "fail": False, "latency": 0.3}
+MESSAGE = {"message": "Should we take the shuttle down to the planet?", "tags": ["strategy"]}
+
+
+async def fake_upstream(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    STATE["calls"] += 1
+    await asyncio.sleep(STATE["latency"])
+    if STATE["fail"]:
+        return httpx.Response(500, json={"error": {"message": "upstream down", "type": "server_error"}})
+    if body.get("stream"):
+        async def gen():
+            for i, w in enumerate(REPLY.split(" ")):
+                chunk = {"id": "x", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                         "choices": [{"index": 0, "delta": {"content": w if i == 0 else " " + w}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+                await asyncio.sleep(0.01)
+            yield b"data: [DONE]\n\n"
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=gen())
+    return httpx.Response(200, json={
+        "id": "x", "object": "chat.completion", "created": 0, "model": body["model"],
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": REPLY}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    })
+
+
+async def burst(client, n: int, path: str):
+    t0 = time.perf_counter()
+    rs = await asyncio.gather(*(client.post(path, json=MESSAGE) for _ in range(n)))
+    return rs, time.perf_counter() - t0
+
+
+async def run(n: int, coalesce: bool):
+    server.FLIGHTS = SingleFlight()
+    if not coalesce:
+        server.flight_key = lambda *a, **k: None
+    rows = []
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for case, path, fail in (
+            ("json", "/dunsel/api/chat/dunsel_kirk", False),
+            ("stream", "/dunsel/api/chat/dunsel_kirk/stream", False),
+            ("error", "/dunsel/api/chat/dunsel_kirk", True),
+        ):
+            STATE.update(calls=0, fail=fail)
+            rs, wall = await burst(client, n, path)
+            if case == "json":
+                bodies = {r.json()["reply"] for r in rs if r.status_code == 200}
+                ok = len(bodies) == 1 and all(r.status_code == 200 for r in rs)
+            elif case == "stream":
+                bodies = {r.text.split("event: citations")[0] for r in rs}
+                ok = len(bodies) == 1 and all("event: done" in r.text for r in rs)
+            else:
+                ok = all(r.status_code >= 500 for r in rs)
+            rows.append({"case": case, "coalesce": coalesce, "requests": n, "upstream_calls": STATE["calls"],
+                         "consistent": ok, "wall_s": round(wall, 3)})
+    return rows, server.FLIGHTS.stats()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=32)
+    ap.add_argument("--latency", type=float, default=0.3)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    STATE["latency"] = args.latency
+    llm._client = AsyncOpenAI(api_key="bench", max_retries=0,
+                              http_client=httpx.AsyncClient(transport=httpx.MockTransport(fake_upstream)))
+
+    async def both():
+        on, stats = await run(args.requests, True)
+        off, _ = await run(args.requests, False)
+        return on + off, stats
+
+    rows, stats = asyncio.run(both())
+    print(f"{'case':>7} {'coalesce':>9} {'requests':>9} {'calls':>6} {'consistent':>11} {'wall s':>7}")
+    for r in rows:
+        print(f"{r['case']:>7} {str(r['coalesce']):>9} {r['requests']:>9} {r['upstream_calls']:>6} "
+              f"{str(r['consistent']):>11} {r['wall_s']:>7}")
+    print("singleflight:", stats)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"rows": rows, "stats": stats}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Story clustering (story_index.StoryIndex) check + scaling bench.
+
+1. Quality: hand-written groups of the same event as different outlets word it,
+   plus unrelated stories that share words with them. Every variant should join its
+   group's cluster and no two groups should merge. Pairs that share nearly every
+   word but report opposite events (who won, which way markets moved, who struck
+   whom) must never merge.
+2. Scale: fills the window with 1k..100k synthetic headlines and times assign() at
+   each size. Per-lookup cost and array memory should stay flat once max_items is
+   reached, since the structures are fixed-size.
+
+Exits non-zero if any variant misses its story, or any distinct or opposite pair
+merges, so a recall or precision regression fails the run.
+
+    python tools/bench_stories.py [--sizes 1000,10000,100000] [--threshold 0.5]
+"""
+import argparse, json, random, resource, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+import story_index  # noqa: E402
+from utils.kosh_headline import preprocess_headline_for_kosh  # noqa: E402
+
+GROUPS = [
+    [
+        "Senate slams emergency budget deal after overnight vote - Reuters",
+        "Senate blasts emergency budget deal in overnight vote | CNN",
+        "US Senate criticizes emergency budget deal after late-night vote - AP News",
+    ],
+    [
+        "Missile strike hits border town as ceasefire talks stall",
+        "Border town hit by missile strike as ceasefire talks stall - BBC News",
+        "Ceasefire talks stall after missile strike on border town - Reuters",
+    ],
+    [
+        "Record temperatures fuel wildfires across southern Europe",
+        "Wildfires spread across southern Europe amid record temperatures - AP News",
+        "Southern Europe wildfires fueled by record temperatures | CNN",
+    ],
+    [
+        "Central bank cancels rate decision as markets slide",
+        "Markets slide as central bank cancels its rate decision - Reuters",
+    ],
+    [
+        "Data breach exposes millions of transit card records",
+        "Millions of transit card records exposed in data breach - BBC News",
+    ],
+    [
+        "Pop star's TikTok challenge crashes ticketing site",
+        "Ticketing site crashes after pop star's TikTok challenge - CNN",
+    ],
+]
+# Unrelated stories that reuse words from the groups above.
+DISTINCT = [
+    "Senate passes farm bill after overnight vote",
+    "Missile test over sea draws condemnation from neighbours",
+    "Record rainfall floods northern Europe towns",
+    "Central bank holds rates steady",
+    "Transit workers strike over pay",
+    "Pop star announces farewell tour",
+]
+
+# Same words, different story.
+OPPOSITES = [
+    ("Biden wins Michigan primary", "Trump wins Michigan primary"),
+    ("Stocks fall after Fed holds rates", "Stocks rise after Fed holds rates"),
+    ("Iran strikes Israel", "Israel strikes Iran"),
+    ("Union accepts contract offer from automakers", "Union rejects contract offer from automakers"),
+    ("Senate passes border bill after overnight vote", "Senate blocks border bill after overnight vote"),
+]
+
+
+def quality(threshold):
+    idx = story_index.StoryIndex(threshold=threshold, max_items=1000)
+    ok = total = 0
+    cids = []
+    for group in GROUPS:
+        first = idx.assign(preprocess_headline_for_kosh(group[0]))[0]
+        cids.append(first)
+        for h in group[1:]:
+            total += 1
+            cid, rep, joined = idx.assign(preprocess_headline_for_kosh(h))
+            ok += cid == first
+            if cid != first:
+                print(f"  missed: {h!r}")
+    merged = 0
+    for h in DISTINCT:
+        cid = idx.assign(preprocess_headline_for_kosh(h))[0]
+        if cid in cids:
+            merged += 1
+            print(f"  false merge: {h!r}")
+    opposite_merged = 0
+    for a, b in OPPOSITES:
+        if idx.assign(preprocess_headline_for_kosh(a))[0] == idx.assign(preprocess_headline_for_kosh(b))[0]:
+            opposite_merged += 1
+            print(f"  opposite merge: {a!r} / {b!r}")
+    return {"variants_joined": ok, "variants": total, "false_merges": merged, "distinct": len(DISTINCT),
+            "opposite_merges": opposite_merged, "opposites": len(OPPOSITES)}
+
+
+def scale(sizes, threshold, probes=2000):
+    rnd = random.Random(7)
+    vocab = [f"w{i}" for i in range(50_000)]
+    idx = story_index.StoryIndex(threshold=threshold, max_items=max(sizes))
+    rows, filled = [], 0
+    for n in sizes:
+        while filled < n:
+            idx.assign(" ".join(rnd.choices(vocab, k=rnd.randint(5, 12))), now=filled * 0.01)
+            filled += 1
+        probe = [" ".join(rnd.choices(vocab, k=8)) for _ in range(probes)]
+        t0 = time.perf_counter()
+        for i, h in enumerate(probe):
+            idx.assign(h, now=(filled + i) * 0.01)
+        us = (time.perf_counter() - t0) / probes * 1e6
+        filled += probes
+        st = idx.stats()
+        rows.append({
+            "window": st["items"], "assign_us": round(us, 1), "clusters": st["clusters"],
+            "array_mb": round(st["memory_bytes"] / 2**20, 1),
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+        })
+        print(f"{st['items']:>8} {us:>10.1f} {st['clusters']:>9} {rows[-1]['array_mb']:>9} {rows[-1]['max_rss_mb']:>8}")
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    ap.add_argument("--threshold", type=float, default=story_index.THRESHOLD)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    q = quality(args.threshold)
+    print(f"quality: {q['variants_joined']}/{q['variants']} variants joined, "
+          f"{q['false_merges']}/{q['distinct']} false merges, "
+          f"{q['opposite_merges']}/{q['opposites']} opposite pairs merged (threshold {args.threshold})")
+    failed = q["variants_joined"] < q["variants"] or q["false_merges"] or q["opposite_merges"]
+    print(f"{'window':>8} {'assign us':>10} {'clusters':>9} {'arrays MB':>9} {'rss MB':>8}")
+    rows = scale([int(x) for x in args.sizes.split(",")], args.threshold)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"quality": q, "scale": rows}, indent=2))
+    if failed:
+        sys.exit("story clustering quality regressed (see quality line)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Multi-worker benchmark: memory and throughput as workers are added.
+
+For each launcher (uvicorn: `uvicorn server:app --workers N`, fresh interpreters;
+prefork: `python serve.py --workers N`, workers forked from a preloaded parent) and
+each worker count, starts the app against tools/fake_llm.py with a throwaway data
+directory, waits until every worker reports ready, runs --concurrency closed-loop
+clients on the non-streaming Kirk endpoint for --duration seconds, then sums over the
+whole process tree (parent + workers) from /proc/<pid>/smaps_rollup:
+- RSS: resident pages, shared ones counted once per process,
+- PSS: each shared page split between the processes mapping it (the real total),
+- USS: pages private to one process.
+Throughput cannot scale past the machine's cores; the cpus line says how many.
+
+    python tools/bench_workers.py [--workers 1,2,4] [--launchers uvicorn,prefork]
+        [--duration 5] [--concurrency 32] [--latency-ms 20] [--json out.json]
+"""
+import argparse, asyncio, json, os, sys, tempfile, time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "tools"))
+from loadtest import free_port, kirk_body, spawn, wait_http  # noqa: E402
+
+LAUNCHERS = {
+    "uvicorn": [sys.executable, "-m", "uvicorn", "server:app"],
+    "prefork": [sys.executable, "serve.py"],
+}
+
+
+def tree(pid: int) -> List[int]:
+    out, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        out.append(p)
+        try:
+            todo += [int(c) for c in Path(f"/proc/{p}/task/{p}/children").read_text().split()]
+        except OSError:
+            pass
+    return out
+
+
+def memory(pid: int) -> Dict[str, float]:
+    total = {"rss_mb": 0.0, "pss_mb": 0.0, "uss_mb": 0.0, "processes": 0}
+    for p in tree(pid):
+        try:
+            lines = Path(f"/proc/{p}/smaps_rollup").read_text().splitlines()
+        except OSError:
+            continue
+        kb = {k: int(v.split()[0]) for k, _, v in (line.partition(":") for line in lines[1:]) if v.strip()}
+        total["rss_mb"] += kb.get("Rss", 0) / 1024
+        total["pss_mb"] += kb.get("Pss", 0) / 1024
+        total["uss_mb"] += (kb.get("Private_Clean", 0) + kb.get("Private_Dirty", 0)) / 1024
+        total["processes"] += 1
+    return {k: round(v, 1) for k, v in total.items()}
+
+
+def wait_workers(url: str, proc, n: int, timeout: float) -> None:
+    """Poll /healthz on fresh connections until n distinct worker pids report ready."""
+    ready, deadline = set(), time.time() + timeout
+    while len(ready) < n and time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"{' '.join(proc.args)} exited with {proc.returncode}")
+        try:
+            body = httpx.get(f"{url}/healthz", timeout=2.0).json()
+            if body.get("ready"):
+                ready.add(body["pid"])
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.05)
+    if len(ready) < n:
+        sys.exit(f"only {len(ready)}/{n} workers ready after {timeout}s")
+
+
+async def load(url: str, args) -> Dict[str, Any]:
+    done, errors = 0, 0
+    counter = iter(range(10**9))
+    deadline = time.perf_counter() + args.duration
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal done, errors
+        while time.perf_counter() < deadline:
+            try:
+                r = await client.post("/dunsel/api/chat/dunsel_kirk", json=kirk_body(next(counter), args))
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            done += ok
+            errors += not ok
+
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(args.concurrency)))
+    return {"requests": done, "errors": errors, "rps": round(done / (time.perf_counter() - t0), 1)}
+
+
+def one(launcher: str, workers: int, args, tmp: str) -> Dict[str, Any]:
+    port = free_port()
+    data = tempfile.mkdtemp(dir=tmp)
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{args.llm_url}/v1",
+        "DUNSEL_BUILD_ON_START": "0",
+        "DUNSEL_RESPONSE_CACHE": "0",
+        "DUNSEL_RESPONSE_CACHE_PATH": os.path.join(data, "response_cache.sqlite3"),
+        "DUNSEL_SESSIONS_PATH": os.path.join(data, "sessions.sqlite3"),
+        "DUNSEL_SHARED_PATH": os.path.join(data, "shared.sqlite3"),
+        "DUNSEL_NEWS_FEEDS_PATH": os.path.join(data, "news_feeds.json"),
+    }
+    proc = spawn(LAUNCHERS[launcher] + ["--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+                                        "--log-level", "warning"], ROOT / "app", env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_workers(url, proc, workers, args.timeout)
+        idle = memory(proc.pid)
+        res = asyncio.run(load(url, args))
+        busy = memory(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=15)
+    return {"launcher": launcher, "workers": workers, **res,
+            "idle": idle, "loaded": busy}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--launchers", default="uvicorn,prefork")
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--latency-ms", type=float, default=20)
+    ap.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for all workers")
+    ap.add_argument("--json", help="write results here")
+    args = ap.parse_args()
+    args.distinct = 0
+
+    llm_port = free_port()
+    fake = spawn([sys.executable, str(ROOT / "tools" / "fake_llm.py"), "--port", str(llm_port),
+                  "--latency-ms", str(args.latency_ms), "--jitter-ms", "0", "--tokens-per-s", "0"], ROOT)
+    args.llm_url = f"http://127.0.0.1:{llm_port}"
+    rows = []
+    try:
+        wait_http(f"{args.llm_url}/stats", fake)
+        with tempfile.TemporaryDirectory() as tmp:
+            for launcher in args.launchers.split(","):
+                for n in (int(w) for w in args.workers.split(",")):
+                    rows.append(one(launcher, n, args, tmp))
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+
+    print(f"cpus {os.cpu_count()}; concurrency {args.concurrency}; {args.duration:g}s per run; memory in MB, whole tree")
+    print(f"{'launcher':<9} {'workers':>7} {'req/s':>8} {'errs':>5} {'RSS idle':>9} {'PSS idle':>9} "
+          f"{'RSS load':>9} {'PSS load':>9} {'PSS/wkr':>8}")
+    for r in rows:
+        print(f"{r['launcher']:<9} {r['workers']:>7} {r['rps']:>8} {r['errors']:>5} {r['idle']['rss_mb']:>9} "
+              f"{r['idle']['pss_mb']:>9} {r['loaded']['rss_mb']:>9} {r['loaded']['pss_mb']:>9} "
+              f"{r['loaded']['pss_mb'] / r['workers']:>8.1f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
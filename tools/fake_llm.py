@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an OpenAI-compatible chat-completions API, for load tests.
+
+Serves POST /v1/chat/completions with configurable time-to-first-byte, jitter,
+streaming speed and error rate, so the app can be driven without a provider key:
+
+    python tools/fake_llm.py --port 8901 --latency-ms 400 --jitter-ms 150 \
+        --tokens-per-s 40 --error-rate 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:8901/v1 OPENAI_API_KEY=fake uvicorn server:app
+
+- stream=true: SSE chunks one word at a time at --tokens-per-s, plus the final
+  usage chunk when stream_options.include_usage is set;
+- response_format json_object (the micro-batcher's multi-item calls): one reply per
+  id in the JSON list sent as the last message;
+- a request fails with --error-status (default 500) at --error-rate, after the
+  latency, so client retries see the same delay a real outage would add.
+
+GET /stats returns request counters; POST /stats/reset zeroes them.
+"""
+import argparse, asyncio, json, random, time
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLIES = [
+    "Risk is our business. That is what this starship is all about. We hold this course.",
+    "I don't believe in the no-win scenario. We change the conditions of the test.",
+    "Perhaps we should wait. No. The crew is ready, the shields are up, and the enemy does not expect us.",
+    "There is a way out of every box, a solution to every puzzle. It is just a matter of finding it.",
+    "We cannot hide from what we are. But we can decide what we do next.",
+    "In this context, the law is clear. I would still ask the admiral for one more hour.",
+]
+KOSH_REPLIES = [
+    "The avalanche has already started. It is too late for the pebbles to vote.",
+    "They are not ready for the truth.",
+    "Understanding is a three-edged sword.",
+]
+
+
+class FakeLLM:
+    def __init__(self, latency_ms=400.0, jitter_ms=100.0, tokens_per_s=40.0, error_rate=0.0,
+                 error_status=500, reply_words=0, seed=None):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.token_gap = 1.0 / tokens_per_s if tokens_per_s > 0 else 0.0
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.reply_words = reply_words
+        self.rnd = random.Random(seed)
+        self.reset()
+
+    def reset(self) -> None:
+        self.counters = {"requests": 0, "streams": 0, "batches": 0, "batched_items": 0, "errors": 0,
+                         "active": 0, "max_active": 0, "prompt_chars": 0}
+        self.started = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "uptime_s": round(time.time() - self.started, 1)}
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self.rnd.uniform(-self.jitter, self.jitter))
+
+    def _reply(self, messages: List[dict]) -> str:
+        system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+        pool = KOSH_REPLIES if "kosh" in system.lower() else REPLIES
+        text = self.rnd.choice(pool)
+        if self.reply_words:
+            words = text.split()
+            while len(words) < self.reply_words:
+                words += self.rnd.choice(pool).split()
+            text = " ".join(words[:self.reply_words]).rstrip(".") + "."
+        return text
+
+    def _content(self, body: dict) -> str:
+        messages = body.get("messages") or []
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            try:
+                items = json.loads(messages[-1]["content"])
+            except (ValueError, KeyError, IndexError):
+                items = []
+            self.counters["batches"] += 1
+            self.counters["batched_items"] += len(items)
+            return json.dumps({"replies": [{"id": it.get("id"), "reply": self._reply(messages)} for it in items]})
+        return self._reply(messages)
+
+    @staticmethod
+    def _usage(body: dict, content: str) -> dict:
+        prompt = sum(len(m.get("content") or "") for m in body.get("messages") or []) // 4
+        completion = max(1, len(content) // 4)
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion,
+                "prompt_tokens_details": {"cached_tokens": prompt // 2}}
+
+    def _error(self) -> JSONResponse:
+        self.counters["errors"] += 1
+        return JSONResponse({"error": {"message": "fake upstream failure", "type": "server_error"}},
+                            status_code=self.error_status)
+
+    async def completions(self, request: Request):
+        body = await request.json()
+        self.counters["requests"] += 1
+        self.counters["prompt_chars"] += sum(len(m.get("content") or "") for m in body.get("messages") or [])
+        self.counters["active"] += 1
+        self.counters["max_active"] = max(self.counters["max_active"], self.counters["active"])
+        try:
+            await asyncio.sleep(self._delay())
+            if self.error_rate and self.rnd.random() < self.error_rate:
+                return self._error()
+            content = self._content(body)
+        finally:
+            if not body.get("stream"):
+                self.counters["active"] -= 1
+        base = {"id": f"fake-{self.counters['requests']}", "created": int(time.time()), "model": body.get("model", "fake")}
+        if not body.get("stream"):
+            return JSONResponse({**base, "object": "chat.completion",
+                                 "choices": [{"index": 0, "finish_reason": "stop",
+                                              "message": {"role": "assistant", "content": content}}],
+                                 "usage": self._usage(body, content)})
+
+        self.counters["streams"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        def chunk(delta: dict, finish=None) -> bytes:
+            c = {**base, "object": "chat.completion.chunk",
+                 "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            return f"data: {json.dumps(c)}\n\n".encode()
+
+        async def events():
+            try:
+                yield chunk({"role": "assistant", "content": ""})
+                for i, word in enumerate(content.split(" ")):
+                    if i and self.token_gap:
+                        await asyncio.sleep(self.token_gap)
+                    yield chunk({"content": word if i == 0 else " " + word})
+                yield chunk({}, "stop")
+                if include_usage:
+                    u = {**base, "object": "chat.completion.chunk", "choices": [], "usage": self._usage(body, content)}
+                    yield f"data: {json.dumps(u)}\n\n".encode()
+                yield b"data: [DONE]\n\n"
+            finally:
+                self.counters["active"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def make_app(fake: FakeLLM) -> FastAPI:
+    app = FastAPI()
+    app.add_api_route("/v1/chat/completions", fake.completions, methods=["POST"])
+    app.add_api_route("/stats", fake.stats, methods=["GET"])
+    app.add_api_route("/stats/reset", lambda: fake.reset() or fake.stats(), methods=["POST"])
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8901)
+    ap.add_argument("--latency-ms", type=float, default=400, help="time to first byte")
+    ap.add_argument("--jitter-ms", type=float, default=100, help="latency is uniform in +/- this")
+    ap.add_argument("--tokens-per-s", type=float, default=40, help="streaming speed; 0 = all at once")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    ap.add_argument("--error-status", type=int, default=500)
+    ap.add_argument("--reply-words", type=int, default=0, help="pad/trim replies to this many words")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args()
+    fake = FakeLLM(args.latency_ms, args.jitter_ms, args.tokens_per_s, args.error_rate,
+                   args.error_status, args.reply_words, args.seed)
+    uvicorn.run(make_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
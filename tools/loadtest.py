@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Load test: drive every chat and news endpoint at increasing concurrency.
+
+Starts, in child processes, tools/fake_llm.py (OpenAI-compatible stand-in), the
+fixture feed server from tools/bench_news.py and the app under uvicorn pointed at
+both, with a throwaway data directory. Then, for each endpoint and each concurrency
+level, runs that many closed-loop async clients for --duration seconds and reports
+throughput, p50/p95/p99 latency and, for the SSE endpoints, time to first delta.
+--url skips the startup and targets a running app instead (its upstream is then
+whatever it is configured with).
+
+Every chat message is unique unless --distinct is set (Kosh messages lead with the
+request number, so they stay unique after the headline cleaner), so by default
+requests reach the upstream path; the response cache is off unless --cache is given.
+Replies served by joining an identical in-flight request or from the cache (JSON
+endpoints report it in meta) are counted in "shared" and left out of "up/s", the
+rate of requests that made their own upstream call. Results go to
+--json (default loadtest-<commit>.json) with the commit, settings and the stand-in's
+counters; --compare A.json B.json prints the change per endpoint and level.
+
+    python tools/loadtest.py [--concurrency 1,4,16,64] [--duration 10] [--workers 1] [--prefork]
+        [--latency-ms 400 --jitter-ms 100 --tokens-per-s 40 --error-rate 0]
+        [--endpoints kirk,kirk_stream,kosh,kosh_stream,news_opine,news_feeds]
+    python tools/loadtest.py --compare loadtest-abc1234.json loadtest-def5678.json
+"""
+import argparse, asyncio, json, os, platform, socket, subprocess, sys, tempfile, time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "tools"))
+from bench_context_budget import QUERIES  # noqa: E402
+from bench_kosh_headline import synth_headlines  # noqa: E402
+from utils.kosh_headline import preprocess_headline_for_kosh  # noqa: E402
+
+# Skip the edge cases the cleaner empties out; a load test wants real headlines.
+HEADLINES = [h for h in synth_headlines(600) if len(preprocess_headline_for_kosh(h).split()) >= 3][:400]
+FEEDS = 8
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# -------------------------------------------------------------------
+# Endpoints
+# -------------------------------------------------------------------
+
+def kirk_body(n: int, args) -> dict:
+    q, tags = QUERIES[n % len(QUERIES)]
+    return {"message": q if args.distinct else f"{q} (#{n})", "tags": tags, "user_name": "Jim"}
+
+
+def kosh_body(n: int, args) -> dict:
+    h = HEADLINES[n % len(HEADLINES)]
+    # The number goes first: the cleaner drops tails after a dash and cuts at 20 words.
+    return {"message": h if args.distinct else f"Item {n}: {h}", "tags": []}
+
+
+def opine_body(n: int, args) -> dict:
+    return {"feeds": args.feed_urls, "max_items": 6}
+
+
+# name -> (method, path, body factory, streams SSE)
+ENDPOINTS = {
+    "kirk": ("POST", "/dunsel/api/chat/dunsel_kirk", kirk_body, False),
+    "kirk_stream": ("POST", "/dunsel/api/chat/dunsel_kirk/stream", kirk_body, True),
+    "kosh": ("POST", "/dunsel/api/chat/dunsel_kosh_news", kosh_body, False),
+    "kosh_stream": ("POST", "/dunsel/api/chat/dunsel_kosh_news/stream", kosh_body, True),
+    "news_opine": ("POST", "/dunsel/api/news/opine", opine_body, False),
+    "news_feeds": ("GET", "/dunsel/api/news/feeds", None, False),
+}
+
+
+async def one(client: httpx.AsyncClient, name: str, n: int, args) -> Dict[str, Any]:
+    method, path, body, sse = ENDPOINTS[name]
+    if body is not None:
+        payload = body(n % args.distinct if args.distinct else n, args)
+    t0 = time.perf_counter()
+    ttft, shared = None, False
+    try:
+        async with client.stream(method, path, json=payload if body else None) as r:
+            if sse and r.status_code == 200:
+                event, ok = None, True
+                async for line in r.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[7:]
+                        if event == "delta" and ttft is None:
+                            ttft = time.perf_counter() - t0
+                        elif event == "error":
+                            ok = False
+            else:
+                await r.aread()
+                ok = r.status_code == 200
+                if ok and r.headers.get("content-type", "").startswith("application/json"):
+                    meta = r.json().get("meta") or {}
+                    shared = bool(meta.get("coalesced")) or meta.get("cache") == "hit"
+            status = r.status_code
+    except httpx.HTTPError as e:
+        status, ok = type(e).__name__, False
+    return {"latency": time.perf_counter() - t0, "ttft": ttft, "ok": ok, "status": status, "shared": shared}
+
+
+def pct(xs: List[float], q: float) -> Optional[float]:
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, max(0, int(round(q / 100 * len(xs) + 0.5)) - 1))]
+
+
+def ms(x: Optional[float]) -> Optional[float]:
+    return None if x is None else round(x * 1000, 1)
+
+
+async def level(client: httpx.AsyncClient, name: str, conc: int, args) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    counter = iter(range(10**9))
+    deadline = time.perf_counter() + args.duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            results.append(await one(client, name, next(counter), args))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(conc)))
+    elapsed = time.perf_counter() - t0
+    ok = [r for r in results if r["ok"]]
+    shared = sum(r["shared"] for r in ok)
+    lat = [r["latency"] for r in ok]
+    ttft = [r["ttft"] for r in ok if r["ttft"] is not None]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    return {
+        "endpoint": name, "concurrency": conc, "requests": len(results), "ok": len(ok),
+        "errors": len(results) - len(ok), "status": statuses, "seconds": round(elapsed, 2),
+        "rps": round(len(ok) / elapsed, 2), "shared": shared,
+        "upstream_rps": round((len(ok) - shared) / elapsed, 2),
+        "p50_ms": ms(pct(lat, 50)), "p95_ms": ms(pct(lat, 95)), "p99_ms": ms(pct(lat, 99)),
+        "mean_ms": ms(sum(lat) / len(lat)) if lat else None,
+        "ttft_p50_ms": ms(pct(ttft, 50)), "ttft_p95_ms": ms(pct(ttft, 95)), "ttft_p99_ms": ms(pct(ttft, 99)),
+    }
+
+
+def fmt(x) -> str:
+    return "-" if x is None else f"{x:,.1f}" if isinstance(x, float) else str(x)
+
+
+def print_row(row: Dict[str, Any]) -> None:
+    print(f"{row['endpoint']:<12} {row['concurrency']:>5} {row['requests']:>6} {row['errors']:>5} {fmt(row['rps']):>8} "
+          f"{row['shared']:>6} {fmt(row['upstream_rps']):>8} "
+          f"{fmt(row['p50_ms']):>9} {fmt(row['p95_ms']):>9} {fmt(row['p99_ms']):>9} "
+          f"{fmt(row['ttft_p50_ms']):>9} {fmt(row['ttft_p95_ms']):>9}")
+
+
+# -------------------------------------------------------------------
+# Processes
+# -------------------------------------------------------------------
+
+def spawn(cmd: List[str], cwd: Path, env: Optional[dict] = None, log=None) -> subprocess.Popen:
+    return subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log or subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def wait_http(url: str, proc: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"{' '.join(proc.args)} exited with {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    sys.exit(f"timed out waiting for {url}")
+
+
+def start_stack(args, tmp: str) -> List[subprocess.Popen]:
+    llm_port, feed_port, app_port = free_port(), free_port(), free_port()
+    procs = [
+        spawn([sys.executable, str(ROOT / "tools" / "fake_llm.py"), "--port", str(llm_port),
+               "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+               "--tokens-per-s", str(args.tokens_per_s), "--error-rate", str(args.error_rate),
+               "--reply-words", str(args.reply_words), "--seed", "19"], ROOT),
+        spawn([sys.executable, str(ROOT / "tools" / "bench_news.py"), "--serve", "--port", str(feed_port)], ROOT),
+    ]
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "loadtest",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "DUNSEL_RESPONSE_CACHE": "1" if args.cache else "0",
+        "DUNSEL_RESPONSE_CACHE_PATH": os.path.join(tmp, "response_cache.sqlite3"),
+        "DUNSEL_NEWS_FEEDS_PATH": os.path.join(tmp, "news_feeds.json"),
+        "DUNSEL_NEWS_ALLOW_PRIVATE": "1",  # the fixture feeds are on 127.0.0.1
+    }
+    log = open(os.path.join(tmp, "app.log"), "wb")
+    if args.prefork:
+        cmd = [sys.executable, "serve.py"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "server:app"]
+    procs.append(spawn(cmd + ["--host", "127.0.0.1", "--port", str(app_port),
+                              "--workers", str(args.workers), "--log-level", "warning"], ROOT / "app", env, log))
+    args.llm_url = f"http://127.0.0.1:{llm_port}"
+    args.feed_urls = [f"http://127.0.0.1:{feed_port}/feed/{i}.xml" for i in range(FEEDS)]
+    args.url = f"http://127.0.0.1:{app_port}"
+    wait_http(f"{args.llm_url}/stats", procs[0])
+    wait_http(args.feed_urls[0], procs[1])
+    wait_http(f"{args.url}/readyz", procs[2])
+    return procs
+
+
+# -------------------------------------------------------------------
+
+async def run(args) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    rows = []
+    print(f"{'endpoint':<12} {'conc':>5} {'reqs':>6} {'errs':>5} {'req/s':>8} {'shared':>6} {'up/s':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ttft p50':>9} {'ttft p95':>9}")
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        for name in args.endpoints:
+            for conc in args.concurrency:
+                row = await level(client, name, conc, args)
+                rows.append(row)
+                print_row(row)
+        upstream = None
+        if args.llm_url:
+            try:
+                upstream = (await client.get(f"{args.llm_url}/stats")).json()
+            except httpx.HTTPError:
+                pass
+        try:
+            health = (await client.get("/healthz")).json()
+        except (httpx.HTTPError, ValueError):
+            health = None
+    return {"rows": rows, "upstream": upstream, "healthz": health}
+
+
+def compare(a_path: str, b_path: str) -> None:
+    a, b = (json.loads(Path(p).read_text()) for p in (a_path, b_path))
+    base = {(r["endpoint"], r["concurrency"]): r for r in a["rows"]}
+    print(f"{a['meta']['commit']} -> {b['meta']['commit']}")
+    print(f"{'endpoint':<12} {'conc':>5} {'req/s':>16} {'p95 ms':>20} {'ttft p95':>20}")
+
+    def delta(old, new):
+        if old is None or new is None:
+            return f"{fmt(old)} -> {fmt(new)}"
+        change = (new - old) / old * 100 if old else 0.0
+        return f"{new:,.1f} ({change:+.0f}%)"
+
+    for r in b["rows"]:
+        o = base.get((r["endpoint"], r["concurrency"]))
+        if o is None:
+            continue
+        print(f"{r['endpoint']:<12} {r['concurrency']:>5} {delta(o['rps'], r['rps']):>16} "
+              f"{delta(o['p95_ms'], r['p95_ms']):>20} {delta(o['ttft_p95_ms'], r['ttft_p95_ms']):>20}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", help="target a running app instead of starting one")
+    ap.add_argument("--feeds", help="comma-separated feed URLs for news_opine (with --url)")
+    ap.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    ap.add_argument("--concurrency", default="1,4,16,64")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint and level")
+    ap.add_argument("--distinct", type=int, default=0, help="cycle through this many messages (0 = all unique)")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers for the started app")
+    ap.add_argument("--prefork", action="store_true", help="start the app with app/serve.py instead of uvicorn")
+    ap.add_argument("--cache", action="store_true", help="leave the response cache on")
+    ap.add_argument("--latency-ms", type=float, default=400)
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--tokens-per-s", type=float, default=40)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--reply-words", type=int, default=0)
+    ap.add_argument("--json", help="results file (default loadtest-<commit>.json)")
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="diff two results files and exit")
+    args = ap.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    args.endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        sys.exit(f"unknown endpoint(s): {', '.join(sorted(unknown))}")
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.llm_url = None
+    args.feed_urls = args.feeds.split(",") if args.feeds else None
+
+    meta = {
+        "commit": git_commit(), "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(), "cpus": os.cpu_count(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("compare", "json")},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        procs = [] if args.url else start_stack(args, tmp)
+        if args.feed_urls is None and "news_opine" in args.endpoints:
+            args.endpoints.remove("news_opine")  # a live app would opine on its saved feeds
+            print("news_opine skipped: pass --feeds with --url")
+        try:
+            res = asyncio.run(run(args))
+        finally:
+            for p in procs:
+                p.terminate()
+            for p in procs:
+                try:
+                    p.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    p.kill()
+    meta["settings"].update(url=args.url, feed_urls=args.feed_urls)
+    out = args.json or f"loadtest-{meta['commit']}.json"
+    Path(out).write_text(json.dumps({"meta": meta, **res}, indent=2))
+    print(f"results written to {out}")
+
+
+if __name__ == "__main__":
+    main()